@@ -1,14 +1,21 @@
 from datetime import datetime, timedelta
 from airflow import DAG
 from airflow.operators.postgres_operator import PostgresOperator
-from airflow.operators.python_operator import PythonOperator
+from airflow.operators.python_operator import PythonOperator, ShortCircuitOperator
 from airflow.operators.bash_operator import BashOperator
 from airflow.sensors.filesystem import FileSensor
 from airflow.hooks.postgres_hook import PostgresHook
 from airflow.models import Variable
-import pandas as pd
 import os
 import logging
+import psycopg2
+
+from ecommerce_etl.dbt_manifest import load_manifest, manifest_fingerprint, model_graph, models_to_run
+from ecommerce_etl.instrumentation import CountingCursor, collect_dbt_metrics, measure_stage, publish_metrics
+from ecommerce_etl.parallel_load import DEFAULT_WORKERS, load_tables_parallel
+from ecommerce_etl.quality import CROSS_TABLE_CHECKS, run_quality_checks
+from ecommerce_etl.sources import sensor_pattern, source_files
+from ecommerce_etl.stream import DEFAULT_MEMORY_LIMIT_MB
 
 # Default arguments
 default_args = {
@@ -32,73 +39,134 @@ dag = DAG(
     tags=['ecommerce', 'etl', 'analytics']
 )
 
-def load_csv_to_postgres(table_name, file_path, postgres_conn_id='warehouse_db'):
+DATA_DIR = '/opt/airflow/data'
+
+# dbt has no --vars-file flag, so the vars written by generate_dbt_vars are passed inline
+DBT_VARS_ARG = ' --vars "$(cat vars.yml)"'
+
+# Trigger a run with {"full_refresh": true} to rebuild incremental models from scratch
+DBT_FULL_REFRESH_ARG = "{{ ' --full-refresh' if dag_run and (dag_run.conf or {}).get('full_refresh') else '' }}"
+
+DBT_DIR = '/opt/airflow/dbt'
+DBT_PROJECT_NAME = 'ecommerce_analytics'
+DBT_LAYERS = ['staging', 'warehouse', 'marts']
+
+# Concurrent model tasks are bounded by this Airflow pool (created by deploy.sh); its
+# slot count is the dbt thread count
+DBT_POOL = 'dbt'
+DBT_THREADS = "{{ var.value.get('dbt_threads', 4) }}"
+
+# Fingerprint of the project the docs site was last generated for
+DOCS_FINGERPRINT_FILE = 'target/docs_fingerprint'
+
+def dbt_model_command(model_name):
+    """dbt run for a single model, with its own target and log paths
+    
+    Concurrent dbt invocations would overwrite each other's run artifacts, so
+    each model writes them to a directory of its own, seeded with the partial
+    parse cache dbt_parse left in target/.
+    """
+    target_path = f'target/models/{model_name}'
+    return (
+        f'cd {DBT_DIR} && mkdir -p {target_path} '
+        f'&& cp target/partial_parse.msgpack {target_path}/ 2>/dev/null; '
+        f'dbt run --select {model_name} --threads 1 '
+        f'--target-path {target_path} --log-path logs/models/{model_name}'
+    )
+
+def warehouse_connect_kwargs(postgres_conn_id='warehouse_db'):
+    """psycopg2 connection arguments for an Airflow connection"""
+    connection = PostgresHook.get_connection(postgres_conn_id)
+    return {
+        'host': connection.host,
+        'port': connection.port or 5432,
+        'user': connection.login,
+        'password': connection.password,
+        'dbname': connection.schema,
+        # Counts the statements each stage sends, for the stage metrics
+        'cursor_factory': CountingCursor
+    }
+
+def load_csv_to_postgres(table_name, data_dir=DATA_DIR, postgres_conn_id='warehouse_db', **context):
     """Load CSV data into PostgreSQL raw tables"""
     
-    # Read CSV file
-    df = pd.read_csv(file_path)
+    # A single <table>.csv or the part files of a sharded generator run
+    file_paths = source_files(data_dir, table_name)
+    if not file_paths:
+        raise FileNotFoundError(f"No source files for {table_name} in {data_dir}")
     
-    # Add metadata columns
-    df['loaded_at'] = datetime.now()
-    df['file_name'] = os.path.basename(file_path)
+    # Memory ceiling and COPY workers per load task, tunable without redeploying the DAG
+    memory_limit_mb = int(Variable.get('load_memory_limit_mb', default_var=DEFAULT_MEMORY_LIMIT_MB))
+    load_workers = int(Variable.get('load_workers', default_var=DEFAULT_WORKERS))
     
-    # Get PostgreSQL connection
-    postgres_hook = PostgresHook(postgres_conn_id=postgres_conn_id)
+    # 'incremental' upserts rows past each table's watermark, 'full' truncates and reloads
+    load_mode = Variable.get('raw_load_mode', default_var='incremental')
     
-    # Truncate and load data (for demo purposes - in production use incremental)
-    postgres_hook.run(f"TRUNCATE TABLE raw.{table_name}")
+    # Files unchanged since their last load (per the load manifest) are skipped and grown
+    # CSV files only load their appended tail; 'false' loads every file again
+    skip_unchanged = Variable.get('skip_unchanged_sources', default_var='true').lower() == 'true'
     
-    # Insert data in chunks
-    chunk_size = 10000
-    for i in range(0, len(df), chunk_size):
-        chunk = df.iloc[i:i+chunk_size]
-        postgres_hook.insert_rows(
-            table=f"raw.{table_name}",
-            rows=chunk.values.tolist(),
-            target_fields=chunk.columns.tolist(),
-            commit_every=1000
-        )
+    # Load everything up to and including the run's end_date (see generate_dbt_manifest)
+    upper_bound = context['execution_date'] + timedelta(days=1)
     
-    logging.info(f"Loaded {len(df)} rows into raw.{table_name}")
+    # Large files are split into byte ranges loaded over a bounded connection pool
+    connect_kwargs = warehouse_connect_kwargs(postgres_conn_id)
+    with measure_stage(connect_kwargs, context['run_id'], 'load', table_name) as timer:
+        stats = load_tables_parallel(
+            connect_kwargs,
+            {table_name: file_paths},
+            workers=load_workers,
+            mode=load_mode,
+            memory_limit_mb=memory_limit_mb,
+            upper_bound=upper_bound,
+            skip_unchanged=skip_unchanged
+        )[0]
+        timer.add(rows=stats['rows'], bytes=stats['bytes'])
+    
+    logging.info(f"Loaded {stats['rows']} rows into raw.{table_name} "
+                 f"({stats['rows_per_sec']} rows/sec, {stats['rows_rejected']} rejected, "
+                 f"{stats['files_skipped']} unchanged files skipped, "
+                 f"peak RSS {stats['peak_rss_mb']} MB)")
+    return stats
 
-def validate_data_quality(**context):
+def validate_data_quality(postgres_conn_id='warehouse_db', **context):
     """Run data quality checks on raw data"""
     
-    postgres_hook = PostgresHook(postgres_conn_id='warehouse_db')
+    # 'incremental' only checks rows loaded since each table's last clean check, 'full' rescans
+    mode = Variable.get('quality_check_mode', default_var='incremental')
     
-    quality_checks = [
-        {
-            'name': 'customers_no_nulls',
-            'sql': "SELECT COUNT(*) FROM raw.customers WHERE customer_id IS NULL OR email IS NULL",
-            'expected': 0
-        },
-        {
-            'name': 'orders_valid_dates',
-            'sql': "SELECT COUNT(*) FROM raw.orders WHERE order_date > CURRENT_DATE",
-            'expected': 0
-        },
-        {
-            'name': 'products_positive_prices',
-            'sql': "SELECT COUNT(*) FROM raw.products WHERE price <= 0",
-            'expected': 0
-        },
-        {
-            'name': 'order_items_referential_integrity',
-            'sql': """
-                SELECT COUNT(*) FROM raw.order_items oi 
-                LEFT JOIN raw.orders o ON oi.order_id = o.order_id 
-                WHERE o.order_id IS NULL
-            """,
-            'expected': 0
-        }
+    # Loads already quarantine rows failing single-table rules, so by default only
+    # cross-table checks scan the warehouse; 'all' re-runs every check
+    scope = Variable.get('quality_check_scope', default_var='cross_table')
+    check_tables = CROSS_TABLE_CHECKS if scope == 'cross_table' else None
+    
+    # Rejection counts reported by the load tasks are recorded alongside the checks
+    load_stats = [
+        stats for stats in context['ti'].xcom_pull(task_ids=[f'load_{table}' for table in tables])
+        if stats
     ]
+    for stats in load_stats:
+        if stats['rows_rejected']:
+            logging.warning(f"{stats['rows_rejected']} rows of raw.{stats['table']} quarantined on load: "
+                            f"{stats['rejected_by_rule']} ({', '.join(stats['quarantine_files'])})")
     
-    failed_checks = []
+    # One scan per table evaluates all of its checks; tables are scanned concurrently
+    connect_kwargs = warehouse_connect_kwargs(postgres_conn_id)
+    with measure_stage(connect_kwargs, context['run_id'], 'quality') as timer:
+        results = run_quality_checks(
+            connect_kwargs,
+            context['run_id'],
+            tables=check_tables,
+            mode=mode,
+            load_stats=load_stats
+        )
+        # Checks of a table share its scan
+        timer.add(rows=sum({r['table_name']: r['rows_checked'] for r in results}.values()))
     
-    for check in quality_checks:
-        result = postgres_hook.get_first(check['sql'])[0]
-        if result != check['expected']:
-            failed_checks.append(f"{check['name']}: expected {check['expected']}, got {result}")
+    failed_checks = [
+        f"{r['check_name']}: expected 0, got {r['failed_rows']}"
+        for r in results if not r['passed']
+    ]
     
     if failed_checks:
         raise ValueError(f"Data quality checks failed: {', '.join(failed_checks)}")
@@ -110,19 +178,67 @@ def generate_dbt_manifest(**context):
     execution_date = context['execution_date']
     
     # Create dbt vars file with execution date
+    dag_run = context.get('dag_run')
     dbt_vars = {
         'execution_date': execution_date.strftime('%Y-%m-%d'),
         'start_date': (execution_date - timedelta(days=1)).strftime('%Y-%m-%d'),
-        'end_date': execution_date.strftime('%Y-%m-%d')
+        'end_date': execution_date.strftime('%Y-%m-%d'),
+        # Partitioned models cannot be fully refreshed, so they reload every row instead
+        'full_reload': bool(dag_run and (dag_run.conf or {}).get('full_refresh'))
     }
     
-    vars_file_path = '/opt/airflow/dbt/vars.yml'
+    vars_file_path = os.path.join(DBT_DIR, 'vars.yml')
     with open(vars_file_path, 'w') as f:
         import yaml
         yaml.dump(dbt_vars, f)
     
     logging.info(f"Generated dbt vars for {execution_date}")
 
+def plan_dbt_models(**context):
+    """Pick the dbt models whose upstream raw tables received rows in this run"""
+    manifest = load_manifest(os.path.join(DBT_DIR, 'target', 'manifest.json'))
+    graph = model_graph(manifest, DBT_PROJECT_NAME)
+    
+    changed_tables = []
+    for table in tables:
+        stats = context['ti'].xcom_pull(task_ids=f'load_{table}')
+        if stats and stats.get('rows_upserted', stats['rows']):
+            changed_tables.append(table)
+    context['ti'].xcom_push(key='changed_tables', value=changed_tables)
+    
+    # A full refresh rebuilds everything regardless of what was loaded
+    dag_run = context.get('dag_run')
+    run_all = bool(dag_run and (dag_run.conf or {}).get('full_refresh'))
+    
+    selected = models_to_run(graph, changed_tables, run_all)
+    logging.info(f"Raw tables changed: {changed_tables or 'none'}; running {len(selected)} "
+                 f"of {len(graph)} dbt models")
+    return selected
+
+def dbt_docs_stale(**context):
+    """Return the project fingerprint if the docs site predates it, False otherwise"""
+    manifest = load_manifest(os.path.join(DBT_DIR, 'target', 'manifest.json'))
+    fingerprint = manifest_fingerprint(manifest)
+    
+    fingerprint_path = os.path.join(DBT_DIR, DOCS_FINGERPRINT_FILE)
+    if os.path.isfile(fingerprint_path):
+        with open(fingerprint_path) as f:
+            if f.read().strip() == fingerprint:
+                logging.info("dbt project unchanged since the docs were generated")
+                return False
+    return fingerprint
+
+def record_dbt_metrics(postgres_conn_id='warehouse_db', **context):
+    """Record per-model timings from the run_results.json files dbt wrote during this run"""
+    metrics = collect_dbt_metrics(DBT_DIR, since=context['dag_run'].start_date)
+    
+    conn = psycopg2.connect(**warehouse_connect_kwargs(postgres_conn_id))
+    try:
+        publish_metrics(conn, context['run_id'], metrics)
+    finally:
+        conn.close()
+    return len(metrics)
+
 # File sensors to check for new data
 file_sensors = []
 tables = ['customers', 'products', 'orders', 'order_items', 'web_events']
@@ -130,7 +246,7 @@ tables = ['customers', 'products', 'orders', 'order_items', 'web_events']
 for table in tables:
     sensor = FileSensor(
         task_id=f'sense_{table}_file',
-        filepath=f'/opt/airflow/data/{table}.csv',
+        filepath=sensor_pattern(DATA_DIR, table),
         poke_interval=60,
         timeout=300,
         dag=dag
@@ -145,7 +261,7 @@ for table in tables:
         python_callable=load_csv_to_postgres,
         op_kwargs={
             'table_name': table,
-            'file_path': f'/opt/airflow/data/{table}.csv'
+            'data_dir': DATA_DIR
         },
         dag=dag
     )
@@ -165,38 +281,93 @@ dbt_vars_task = PythonOperator(
     dag=dag
 )
 
-# dbt staging models
-dbt_staging = BashOperator(
-    task_id='dbt_staging',
-    bash_command='cd /opt/airflow/dbt && dbt run --models staging --vars-file vars.yml',
-    dag=dag
-)
+# Models are rendered as one task each from the manifest written by `dbt parse`; before
+# the project was first parsed the DAG falls back to one task per layer
+dbt_manifest = load_manifest(os.path.join(DBT_DIR, 'target', 'manifest.json'))
+dbt_graph = model_graph(dbt_manifest, DBT_PROJECT_NAME) if dbt_manifest else None
 
-# dbt warehouse models
-dbt_warehouse = BashOperator(
-    task_id='dbt_warehouse',
-    bash_command='cd /opt/airflow/dbt && dbt run --models warehouse --vars-file vars.yml',
+# Refresh the manifest (and dbt's partial parse cache) with this run's vars
+dbt_parse = BashOperator(
+    task_id='dbt_parse',
+    bash_command=f'cd {DBT_DIR} && dbt parse' + DBT_VARS_ARG,
     dag=dag
 )
 
-# dbt marts models
-dbt_marts = BashOperator(
-    task_id='dbt_marts',
-    bash_command='cd /opt/airflow/dbt && dbt run --models marts --vars-file vars.yml',
+# Decide which models this run's loads made stale
+dbt_plan = PythonOperator(
+    task_id='plan_dbt_models',
+    python_callable=plan_dbt_models,
     dag=dag
 )
 
-# dbt tests
+dbt_model_tasks = {}
+if dbt_graph:
+    for model_name, model in dbt_graph.items():
+        full_refresh_arg = '' if model['layer'] == 'staging' else DBT_FULL_REFRESH_ARG
+        dbt_model_tasks[model_name] = BashOperator(
+            task_id=f'dbt_run_{model_name}',
+            bash_command=(
+                f"{{% if '{model_name}' in ti.xcom_pull(task_ids='plan_dbt_models') %}}"
+                + dbt_model_command(model_name) + DBT_VARS_ARG + full_refresh_arg
+                + f"{{% else %}}echo 'No upstream source of {model_name} changed' && exit 99{{% endif %}}"
+            ),
+            pool=DBT_POOL,
+            # Run even when a parent was skipped, each model checks its own sources
+            trigger_rule='none_failed',
+            dag=dag
+        )
+    for model_name, model in dbt_graph.items():
+        for parent in model['parents']:
+            dbt_model_tasks[parent] >> dbt_model_tasks[model_name]
+else:
+    previous_layer = None
+    for layer in DBT_LAYERS:
+        full_refresh_arg = '' if layer == 'staging' else DBT_FULL_REFRESH_ARG
+        dbt_model_tasks[layer] = BashOperator(
+            task_id=f'dbt_{layer}',
+            bash_command=(f'cd {DBT_DIR} && dbt run --models {layer} --threads {DBT_THREADS}'
+                          + DBT_VARS_ARG + full_refresh_arg),
+            dag=dag
+        )
+        if previous_layer:
+            dbt_model_tasks[previous_layer] >> dbt_model_tasks[layer]
+        previous_layer = layer
+
+# dbt tests, limited to the models that ran and the sources that were loaded
 dbt_test = BashOperator(
     task_id='dbt_test',
-    bash_command='cd /opt/airflow/dbt && dbt test --vars-file vars.yml',
+    bash_command=(
+        "{% set selected = ti.xcom_pull(task_ids='plan_dbt_models') %}"
+        "{% if selected %}"
+        f"cd {DBT_DIR} && dbt test --threads {DBT_THREADS} --select "
+        "{{ selected | join(' ') }}{% for table in ti.xcom_pull(task_ids='plan_dbt_models', key='changed_tables') %}"
+        " source:raw.{{ table }}{% endfor %}" + DBT_VARS_ARG +
+        "{% else %}echo 'No models ran' && exit 99{% endif %}"
+    ),
+    trigger_rule='none_failed',
+    dag=dag
+)
+
+# Documentation only needs regenerating when the project changed
+dbt_docs_check = ShortCircuitOperator(
+    task_id='check_dbt_docs',
+    python_callable=dbt_docs_stale,
+    trigger_rule='none_failed',
     dag=dag
 )
 
-# Generate documentation
 dbt_docs = BashOperator(
     task_id='dbt_docs_generate',
-    bash_command='cd /opt/airflow/dbt && dbt docs generate',
+    bash_command=(f'cd {DBT_DIR} && dbt docs generate' + DBT_VARS_ARG +
+                  " && echo {{ ti.xcom_pull(task_ids='check_dbt_docs') }} > " + DOCS_FINGERPRINT_FILE),
+    dag=dag
+)
+
+# Stage metrics of every dbt model that ran, whatever the outcome
+dbt_metrics = PythonOperator(
+    task_id='record_dbt_metrics',
+    python_callable=record_dbt_metrics,
+    trigger_rule='all_done',
     dag=dag
 )
 
@@ -222,6 +393,7 @@ quality_report = PostgresOperator(
             EXTRACT(EPOCH FROM (CURRENT_TIMESTAMP - MAX(loaded_at)))/3600
         FROM raw.orders;
     """,
+    trigger_rule='none_failed',
     dag=dag
 )
 
@@ -236,8 +408,11 @@ load_tasks >> data_quality_task
 # Generate dbt vars after quality check
 data_quality_task >> dbt_vars_task
 
-# dbt pipeline
-dbt_vars_task >> dbt_staging >> dbt_warehouse >> dbt_marts >> dbt_test
+# dbt pipeline: independent models run concurrently, up to the dbt pool's slots
+dbt_vars_task >> dbt_parse >> dbt_plan
+dbt_plan >> [task for task in dbt_model_tasks.values() if not task.upstream_list]
+list(dbt_model_tasks.values()) >> dbt_test
 
 # Documentation and reporting
-dbt_test >> [dbt_docs, quality_report]
\ No newline at end of file
+dbt_test >> [dbt_docs_check, quality_report, dbt_metrics]
+dbt_docs_check >> dbt_docs
\ No newline at end of file
@@ -0,0 +1,7 @@
+"""
+Shared loading utilities for the e-commerce analytics pipeline
+
+Used by the Airflow DAG (the plugins folder is on the Airflow sys.path) and by
+the standalone load_data.py script. The data generator imports schema for the
+typed layout of the raw tables.
+"""
@@ -0,0 +1,153 @@
+"""
+COPY-based bulk loading of source CSV files into the raw schema
+"""
+import csv
+import io
+import logging
+import os
+import time
+from datetime import datetime
+
+from ecommerce_etl.columnar import copy_parquet, is_parquet
+from ecommerce_etl.stream import (
+    iter_row_batches, open_byte_range, peak_rss_mb, plan_batches, read_header
+)
+from ecommerce_etl.validation import (
+    DEFAULT_QUARANTINE_DIR, NO_REJECTIONS, make_validator, quarantine_path
+)
+
+logger = logging.getLogger(__name__)
+
+
+class MetadataCsvStream:
+    """File-like object that re-emits a CSV with loaded_at/file_name appended to every row"""
+
+    def __init__(self, file_obj, loaded_at, file_name, batch_rows, buffer_size, row_filter=None,
+                 header=None, validator=None):
+        reader = csv.reader(file_obj)
+        if header is None:
+            # file_obj starts at the beginning of the file rather than mid-way through a range
+            header = next(reader, None)
+        if not header:
+            raise ValueError(f"{file_name} is empty, expected a CSV header")
+
+        self.columns = header + ['loaded_at', 'file_name']
+        self.rows = 0
+        self.rows_skipped = 0
+        self.bytes = 0
+
+        self._batches = iter_row_batches(reader, batch_rows)
+        self._buffer_size = buffer_size
+        self._row_filter = row_filter
+        self._validator = validator
+        self._extra = [loaded_at.isoformat(sep=' '), file_name]
+        self._buffer = io.StringIO()
+        self._writer = csv.writer(self._buffer, lineterminator='\n')
+        self._pending = ''
+        self._exhausted = False
+
+    def _refill(self):
+        """Re-encode the next batch of source rows into the pending buffer"""
+        batch = next(self._batches, None)
+        if batch is None:
+            self._exhausted = True
+            return
+
+        if self._row_filter is not None:
+            kept = [row for row in batch if self._row_filter(row)]
+            self.rows_skipped += len(batch) - len(kept)
+            batch = kept
+        if self._validator is not None:
+            batch = self._validator.filter_rows(batch)
+
+        extra = self._extra
+        self._writer.writerows(row + extra for row in batch)
+        self.rows += len(batch)
+
+        self._pending += self._buffer.getvalue()
+        self._buffer.seek(0)
+        self._buffer.truncate()
+
+    def read(self, size=-1):
+        """Return up to size characters of CSV, as expected by cursor.copy_expert"""
+        if size is None or size < 0:
+            size = self._buffer_size
+
+        while len(self._pending) < size and not self._exhausted:
+            self._refill()
+
+        chunk, self._pending = self._pending[:size], self._pending[size:]
+        self.bytes += len(chunk)
+        return chunk
+
+
+def copy_csv(cursor, target_table, file_path, loaded_at=None, memory_limit_mb=None,
+             row_filter=None, byte_range=None, rule_set=None, quarantine_dir=DEFAULT_QUARANTINE_DIR):
+    """Stream a CSV file into target_table through COPY ... FROM STDIN on an open cursor
+
+    Rows are never materialized as a DataFrame; loaded_at and file_name are
+    appended while the file is streamed to the server in batches sized to stay
+    under memory_limit_mb. Rows for which row_filter returns False are dropped
+    client-side. byte_range=(start, end) restricts the load to one slice of the
+    file as produced by stream.split_csv_ranges. Rows passing row_filter are
+    then checked against the validation.VALIDATION_RULES of rule_set (a raw
+    table name); failing rows go to a quarantine CSV under quarantine_dir
+    rather than to the server. Returns a dict of load statistics; committing
+    is left to the caller.
+    """
+    loaded_at = loaded_at or datetime.now()
+    file_name = os.path.basename(file_path)
+    plan = plan_batches(file_path, memory_limit_mb)
+    start = time.monotonic()
+
+    if byte_range is None:
+        source, header = open(file_path, newline='', encoding='utf-8'), None
+    else:
+        source, header = open_byte_range(file_path, *byte_range), read_header(file_path)
+
+    validator = make_validator(
+        rule_set, header or read_header(file_path),
+        quarantine_path(quarantine_dir, rule_set, file_name, loaded_at, byte_range)
+        if rule_set and quarantine_dir else None
+    )
+    with source as f:
+        stream = MetadataCsvStream(
+            f, loaded_at, file_name, plan['batch_rows'], plan['copy_buffer_size'], row_filter,
+            header, validator
+        )
+        columns = ', '.join(stream.columns)
+        try:
+            cursor.copy_expert(
+                f'COPY {target_table} ({columns}) FROM STDIN WITH (FORMAT csv)',
+                stream,
+                size=plan['copy_buffer_size']
+            )
+        finally:
+            if validator is not None:
+                validator.close()
+
+    elapsed = time.monotonic() - start
+    return {
+        'file_name': file_name,
+        'rows': stream.rows,
+        'rows_skipped': stream.rows_skipped,
+        **(validator.stats() if validator else NO_REJECTIONS),
+        'bytes': stream.bytes,
+        'seconds': round(elapsed, 3),
+        'rows_per_sec': round(stream.rows / elapsed, 1) if elapsed > 0 else None,
+        'memory_limit_mb': plan['memory_limit_mb'],
+        'peak_rss_mb': peak_rss_mb()
+    }
+
+
+def copy_file(cursor, target_table, file_path, loaded_at=None, memory_limit_mb=None,
+              byte_range=None, rule_set=None):
+    """COPY a CSV or Parquet file into target_table, picking the reader from the extension
+
+    byte_range only applies to CSV; Parquet files are always loaded whole.
+    """
+    if is_parquet(file_path):
+        return copy_parquet(cursor, target_table, file_path, loaded_at, memory_limit_mb,
+                            rule_set=rule_set)
+    return copy_csv(cursor, target_table, file_path, loaded_at, memory_limit_mb,
+                    byte_range=byte_range, rule_set=rule_set)
@@ -0,0 +1,261 @@
+"""
+Columnar (Parquet) ingestion: record batches re-encoded as CSV and streamed to COPY
+"""
+import io
+import os
+import re
+import time
+from datetime import datetime
+
+try:
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    import pyarrow.csv as pa_csv
+    import pyarrow.parquet as pq
+except ImportError:  # CSV loading works without pyarrow
+    pa = None
+
+from ecommerce_etl.schema import TABLE_SCHEMAS, arrow_schema
+from ecommerce_etl.stream import peak_rss_mb, plan_for_row_bytes
+from ecommerce_etl.validation import (
+    DEFAULT_QUARANTINE_DIR, NO_REJECTIONS, make_validator, quarantine_path
+)
+
+PARQUET_SUFFIX = '.parquet'
+
+# A record batch plus its CSV encoding held at once
+ARROW_ROW_OVERHEAD = 2
+
+# Hive-style month partition written by the generator, e.g. .../month=2023-04/part-00000.parquet
+PARTITION_PATTERN = re.compile(r'month=(\d{4}-\d{2})')
+
+
+def is_parquet(file_path):
+    return file_path.endswith(PARQUET_SUFFIX)
+
+
+def require_pyarrow():
+    if pa is None:
+        raise ImportError("Loading Parquet files requires pyarrow (pip install pyarrow)")
+
+
+def parquet_columns(file_path):
+    """Return the column names stored in a Parquet file"""
+    require_pyarrow()
+    return pq.read_schema(file_path).names
+
+
+def plan_parquet_batches(file_path, memory_limit_mb=None):
+    """Size record batches from the uncompressed row width in the file's metadata"""
+    require_pyarrow()
+    metadata = pq.ParquetFile(file_path).metadata
+    uncompressed = sum(
+        metadata.row_group(i).total_byte_size for i in range(metadata.num_row_groups)
+    )
+    row_bytes = max(uncompressed // max(metadata.num_rows, 1), 1)
+    return plan_for_row_bytes(row_bytes, memory_limit_mb, ARROW_ROW_OVERHEAD)
+
+
+def partition_month(file_path):
+    """Return the YYYY-MM partition a generator Parquet file belongs to, if any"""
+    match = PARTITION_PATTERN.search(file_path)
+    return match.group(1) if match else None
+
+
+def partition_in_window(file_path, lower=None, upper=None):
+    """Whether a month partition can hold values in [lower, upper), both datetimes"""
+    month = partition_month(file_path)
+    if month is None:
+        return True
+    if lower is not None and month < lower.strftime('%Y-%m'):
+        return False
+    if upper is not None and month > upper.strftime('%Y-%m'):
+        return False
+    return True
+
+
+def is_text_type(arrow_type):
+    """Whether values of an Arrow type are strings, plain or dictionary-encoded"""
+    if pa.types.is_dictionary(arrow_type):
+        arrow_type = arrow_type.value_type
+    return pa.types.is_string(arrow_type) or pa.types.is_large_string(arrow_type)
+
+
+def load_schema(file_schema, table_name):
+    """Arrow schema the record batches of a raw table's file are cast to before encoding
+
+    The file must hold exactly the table's columns of schema.TABLE_SCHEMAS,
+    in any order; missing or unexpected columns raise ValueError. Values are
+    cast to the table's types, so a file written with looser ones (int64 ids,
+    timestamps for dates) loads like the generator's own output, and values
+    that do not fit fail before reaching COPY. Categoricals stored as plain
+    strings are kept as they are. Returns None for tables without a layout.
+    """
+    if table_name not in TABLE_SCHEMAS:
+        return None
+    expected = arrow_schema(table_name)
+    missing = [name for name in expected.names if name not in file_schema.names]
+    unexpected = [name for name in file_schema.names if name not in expected.names]
+    if missing or unexpected:
+        raise ValueError(
+            f"Columns do not match raw.{table_name}: missing {missing}, unexpected {unexpected}"
+        )
+    fields = []
+    for field in file_schema:
+        target = expected.field(field.name)
+        if pa.types.is_dictionary(target.type) and is_text_type(field.type):
+            target = field
+        fields.append(target)
+    return pa.schema(fields)
+
+
+def arrow_watermark_filter(column, lower=None, upper=None):
+    """Build a record batch filter keeping rows with lower <= column < upper
+
+    The columnar counterpart of incremental.watermark_filter: bounds are naive
+    datetimes, date columns are compared as midnight timestamps, and rows
+    without a value are only kept when there is no lower bound. Returns None
+    when there are no bounds at all.
+    """
+    if lower is None and upper is None:
+        return None
+
+    def keep(batch):
+        values = pc.cast(batch.column(batch.schema.get_field_index(column)), pa.timestamp('us'))
+        conditions = []
+        if lower is not None:
+            conditions.append(pc.greater_equal(values, pa.scalar(lower, pa.timestamp('us'))))
+        if upper is not None:
+            conditions.append(pc.less(values, pa.scalar(upper, pa.timestamp('us'))))
+        mask = conditions[0] if len(conditions) == 1 else pc.and_kleene(*conditions)
+        # Comparisons against missing values come out null
+        return pc.fill_null(mask, lower is None)
+
+    return keep
+
+
+class ArrowCsvStream:
+    """File-like object that encodes record batches as CSV, with loaded_at/file_name appended"""
+
+    def __init__(self, parquet_file, loaded_at, file_name, batch_rows, buffer_size,
+                 batch_filter=None, validator=None, schema=None):
+        self.columns = parquet_file.schema_arrow.names + ['loaded_at', 'file_name']
+        self.rows = 0
+        self.rows_skipped = 0
+        self.bytes = 0
+
+        self._batches = parquet_file.iter_batches(batch_size=batch_rows)
+        self._buffer_size = buffer_size
+        self._batch_filter = batch_filter
+        self._validator = validator
+        self._schema = None if schema is None or schema.equals(parquet_file.schema_arrow) else schema
+        self._loaded_at = pa.scalar(loaded_at, pa.timestamp('us'))
+        self._file_name = pa.scalar(file_name)
+        self._write_options = pa_csv.WriteOptions(include_header=False)
+        self._pending = b''
+        self._exhausted = False
+
+    def _refill(self):
+        """Encode the next record batch into the pending buffer"""
+        batch = next(self._batches, None)
+        if batch is None:
+            self._exhausted = True
+            return
+
+        if self._schema is not None:
+            batch = pa.RecordBatch.from_arrays(
+                [pc.cast(column, field.type) for column, field in zip(batch.columns, self._schema)],
+                schema=self._schema
+            )
+        if self._batch_filter is not None:
+            kept = batch.filter(self._batch_filter(batch))
+            self.rows_skipped += batch.num_rows - kept.num_rows
+            batch = kept
+        if self._validator is not None:
+            batch = self._validator.filter_batch(batch)
+        if batch.num_rows == 0:
+            return
+
+        batch = pa.RecordBatch.from_arrays(
+            batch.columns + [
+                pa.repeat(self._loaded_at, batch.num_rows),
+                pa.repeat(self._file_name, batch.num_rows)
+            ],
+            names=self.columns
+        )
+        encoded = io.BytesIO()
+        pa_csv.write_csv(batch, encoded, self._write_options)
+        self.rows += batch.num_rows
+        self._pending += encoded.getvalue()
+
+    def read(self, size=-1):
+        """Return up to size bytes of CSV, as expected by cursor.copy_expert"""
+        if size is None or size < 0:
+            size = self._buffer_size
+
+        while len(self._pending) < size and not self._exhausted:
+            self._refill()
+
+        chunk, self._pending = self._pending[:size], self._pending[size:]
+        self.bytes += len(chunk)
+        return chunk
+
+
+def copy_parquet(cursor, target_table, file_path, loaded_at=None, memory_limit_mb=None,
+                 batch_filter=None, rule_set=None, quarantine_dir=DEFAULT_QUARANTINE_DIR):
+    """Stream a Parquet file into target_table through COPY ... FROM STDIN on an open cursor
+
+    Column batches are read with pyarrow and encoded to CSV in C++, so values
+    are never parsed or type-inferred in Python. Rows for which batch_filter's
+    boolean mask is False are dropped client-side. rule_set names the raw
+    table the file belongs to: batches are cast to its layout (see
+    load_schema) and rows failing its validation rules are quarantined as in
+    bulk_load.copy_csv. Returns the same load statistics as copy_csv;
+    committing is left to the caller.
+    """
+    require_pyarrow()
+    loaded_at = loaded_at or datetime.now()
+    file_name = os.path.basename(file_path)
+    if partition_month(file_path):
+        # Part names repeat in every partition directory
+        file_name = os.path.join(os.path.basename(os.path.dirname(file_path)), file_name)
+    plan = plan_parquet_batches(file_path, memory_limit_mb)
+    start = time.monotonic()
+
+    parquet_file = pq.ParquetFile(file_path)
+    try:
+        schema = load_schema(parquet_file.schema_arrow, rule_set)
+    except ValueError as e:
+        raise ValueError(f"{file_path}: {e}") from None
+    validator = make_validator(
+        rule_set, parquet_file.schema_arrow.names,
+        quarantine_path(quarantine_dir, rule_set, file_name, loaded_at)
+        if rule_set and quarantine_dir else None
+    )
+    stream = ArrowCsvStream(
+        parquet_file, loaded_at, file_name, plan['batch_rows'], plan['copy_buffer_size'],
+        batch_filter, validator, schema
+    )
+    columns = ', '.join(stream.columns)
+    try:
+        cursor.copy_expert(
+            f'COPY {target_table} ({columns}) FROM STDIN WITH (FORMAT csv)',
+            stream,
+            size=plan['copy_buffer_size']
+        )
+    finally:
+        if validator is not None:
+            validator.close()
+
+    elapsed = time.monotonic() - start
+    return {
+        'file_name': file_name,
+        'rows': stream.rows,
+        'rows_skipped': stream.rows_skipped,
+        **(validator.stats() if validator else NO_REJECTIONS),
+        'bytes': stream.bytes,
+        'seconds': round(elapsed, 3),
+        'rows_per_sec': round(stream.rows / elapsed, 1) if elapsed > 0 else None,
+        'memory_limit_mb': plan['memory_limit_mb'],
+        'peak_rss_mb': peak_rss_mb()
+    }
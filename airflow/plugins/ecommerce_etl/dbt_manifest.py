@@ -0,0 +1,84 @@
+"""
+dbt manifest helpers for rendering one Airflow task per dbt model
+"""
+import hashlib
+import json
+import os
+
+
+def load_manifest(manifest_path):
+    """Return the parsed target/manifest.json, or None before the project was first parsed"""
+    if not os.path.isfile(manifest_path):
+        return None
+    with open(manifest_path) as f:
+        return json.load(f)
+
+
+def model_graph(manifest, package_name):
+    """Map each model of a package to its layer, parent models and upstream raw tables
+
+    Returns {model_name: {'layer', 'parents', 'sources'}} in dependency order:
+    parents are the models it selects from directly, sources every source
+    table it reads from directly or through other models. The layer is the
+    models/ subdirectory (staging, warehouse, marts).
+    """
+    nodes = {
+        unique_id: node for unique_id, node in manifest['nodes'].items()
+        if node['resource_type'] == 'model' and node['package_name'] == package_name
+    }
+    source_names = {
+        unique_id: source['name'] for unique_id, source in manifest['sources'].items()
+    }
+
+    graph = {}
+
+    def visit(unique_id):
+        node = nodes[unique_id]
+        if node['name'] in graph:
+            return graph[node['name']]
+        parents, sources = [], set()
+        for parent_id in node['depends_on']['nodes']:
+            if parent_id in nodes:
+                parent = visit(parent_id)
+                parents.append(nodes[parent_id]['name'])
+                sources |= parent['sources']
+            elif parent_id in source_names:
+                sources.add(source_names[parent_id])
+        graph[node['name']] = {
+            'layer': node['fqn'][1] if len(node['fqn']) > 2 else None,
+            'parents': parents,
+            'sources': sources
+        }
+        return graph[node['name']]
+
+    for unique_id in sorted(nodes):
+        visit(unique_id)
+    return graph
+
+
+def models_to_run(graph, changed_tables, run_all=False):
+    """Models whose upstream raw tables changed, in dependency order
+
+    Models reading no source table (such as dim_date) always run, since
+    nothing tells whether they are stale.
+    """
+    changed_tables = set(changed_tables)
+    return [
+        name for name, model in graph.items()
+        if run_all or not model['sources'] or model['sources'] & changed_tables
+    ]
+
+
+def manifest_fingerprint(manifest):
+    """Hash of the project's nodes, sources and macros, stable across re-parses
+
+    Parse timestamps are left out, so the fingerprint only changes when the
+    project itself does (which is when the docs site needs regenerating).
+    """
+    digest = hashlib.sha256()
+    for section in ('nodes', 'sources', 'macros'):
+        for unique_id, node in sorted(manifest.get(section, {}).items()):
+            definition = {key: value for key, value in node.items() if key != 'created_at'}
+            digest.update(unique_id.encode())
+            digest.update(json.dumps(definition, sort_keys=True, default=str).encode())
+    return digest.hexdigest()
@@ -0,0 +1,188 @@
+"""
+Watermark-based incremental loading of raw tables
+"""
+import logging
+from datetime import datetime
+
+from ecommerce_etl.bulk_load import copy_csv
+from ecommerce_etl.columnar import (
+    arrow_watermark_filter, copy_parquet, is_parquet, parquet_columns, partition_in_window
+)
+from ecommerce_etl.manifest import record_manifest
+from ecommerce_etl.partitions import (
+    PARTITIONED_TABLES, ensure_future_partitions, partition_bounds, split_default_partition
+)
+from ecommerce_etl.stream import read_header
+from ecommerce_etl.validation import merge_validation_stats
+
+logger = logging.getLogger(__name__)
+
+# Business key and high-water-mark column per raw table
+INCREMENTAL_TABLES = {
+    'customers': {'key': 'customer_id', 'watermark': 'registration_date'},
+    'products': {'key': 'product_id', 'watermark': 'created_date'},
+    'orders': {'key': 'order_id', 'watermark': 'updated_at'},
+    'order_items': {'key': 'order_item_id', 'watermark': 'created_at'},
+    'web_events': {'key': 'event_id', 'watermark': 'event_timestamp'}
+}
+
+WATERMARK_TABLE = 'raw.load_watermarks'
+
+
+def get_watermark(cursor, table_name):
+    """Return the stored high-water mark for a raw table, or None before the first load"""
+    cursor.execute(
+        f"SELECT high_water_mark FROM {WATERMARK_TABLE} WHERE table_name = %s",
+        (table_name,)
+    )
+    row = cursor.fetchone()
+    return row[0] if row else None
+
+
+def format_watermark(mark):
+    """Render a stored watermark as ISO-8601 text comparable with CSV values"""
+    if mark.time() == datetime.min.time():
+        # Date watermarks must still match every timestamp on that day
+        return mark.strftime('%Y-%m-%d')
+    return mark.isoformat(sep=' ')
+
+
+def watermark_filter(column_index, lower=None, upper=None):
+    """Build a row filter keeping rows with lower <= watermark < upper
+
+    Values are compared as ISO-8601 text, which orders the same way as the
+    dates and timestamps pandas writes. lower is the last loaded value and is
+    inclusive, so rows sharing the boundary value are re-upserted rather than
+    missed; upper is an exclusive date bound for the load window.
+    """
+    def keep(row):
+        value = row[column_index]
+        if not value:
+            # Rows without a watermark can only be picked up by an initial load
+            return lower is None
+        return (lower is None or value >= lower) and (upper is None or value < upper)
+
+    return keep
+
+
+def incremental_load(conn, table_name, file_paths, upper_bound=None, loaded_at=None,
+                     memory_limit_mb=None, byte_ranges=None, manifest_files=None):
+    """Upsert rows newer than the table's high-water mark into raw.<table_name>
+
+    Rows with a watermark at or after the stored mark (and before upper_bound, a date)
+    are streamed from every file in file_paths (a path or list of CSV or
+    Parquet part files) into a temporary table, merged into the raw table on
+    the business key and the mark advanced, all in one transaction. Parquet
+    month partitions entirely outside the window are not read, and rows in the
+    window failing the table's validation rules are quarantined. byte_ranges
+    maps CSV files to the (start, end) range to read, such as the appended
+    tail of a file; manifest_files (see manifest.plan_table_load) are recorded
+    as loaded in the same transaction. Returns a dict of load statistics
+    including the new watermark.
+    """
+    config = INCREMENTAL_TABLES[table_name]
+    key, watermark_column = config['key'], config['watermark']
+    if isinstance(file_paths, str):
+        file_paths = [file_paths]
+
+    staging_table = f'incremental_{table_name}'
+    upper = upper_bound.strftime('%Y-%m-%d') if upper_bound else None
+    upper_mark = datetime.strptime(upper, '%Y-%m-%d') if upper else None
+
+    with conn.cursor() as cursor:
+        previous_mark = get_watermark(cursor, table_name)
+        lower = format_watermark(previous_mark) if previous_mark else None
+        ensure_future_partitions(cursor, table_name, upper_bound)
+
+        cursor.execute(
+            f"CREATE TEMP TABLE {staging_table} (LIKE raw.{table_name} INCLUDING DEFAULTS) "
+            f"ON COMMIT DROP"
+        )
+        part_stats, files_pruned = [], 0
+        for file_path in file_paths:
+            if is_parquet(file_path):
+                if not partition_in_window(file_path, previous_mark, upper_mark):
+                    files_pruned += 1
+                    continue
+                if watermark_column not in parquet_columns(file_path):
+                    raise ValueError(f"{file_path} has no {watermark_column} column for incremental loading")
+                part_stats.append(copy_parquet(
+                    cursor, staging_table, file_path, loaded_at, memory_limit_mb,
+                    batch_filter=arrow_watermark_filter(watermark_column, previous_mark, upper_mark),
+                    rule_set=table_name
+                ))
+                continue
+
+            header = read_header(file_path)
+            if watermark_column not in header:
+                raise ValueError(f"{file_path} has no {watermark_column} column for incremental loading")
+            part_stats.append(copy_csv(
+                cursor, staging_table, file_path, loaded_at, memory_limit_mb,
+                row_filter=watermark_filter(header.index(watermark_column), lower, upper),
+                byte_range=(byte_ranges or {}).get(file_path), rule_set=table_name
+            ))
+        cursor.execute(f"ANALYZE {staging_table}")
+
+        # Merge on the business key; the latest version of a duplicated key wins.
+        # Partitioned tables only scan the partitions the new rows fall in.
+        bounds = partition_bounds(cursor, staging_table, table_name)
+        prune = f" AND r.{PARTITIONED_TABLES[table_name]} BETWEEN %s AND %s" if bounds else ''
+        cursor.execute(
+            f"DELETE FROM raw.{table_name} r USING {staging_table} s WHERE r.{key} = s.{key}{prune}",
+            bounds
+        )
+        replaced = cursor.rowcount
+        cursor.execute(
+            f"""
+            INSERT INTO raw.{table_name}
+            SELECT DISTINCT ON ({key}) * FROM {staging_table}
+            ORDER BY {key}, {watermark_column} DESC NULLS LAST
+            """
+        )
+        inserted = cursor.rowcount
+        split_default_partition(cursor, table_name)
+
+        cursor.execute(f"SELECT MAX({watermark_column})::TIMESTAMP FROM {staging_table}")
+        new_mark = cursor.fetchone()[0] or previous_mark
+        cursor.execute(
+            f"""
+            INSERT INTO {WATERMARK_TABLE} (table_name, watermark_column, high_water_mark, rows_loaded, updated_at)
+            VALUES (%s, %s, %s, %s, %s)
+            ON CONFLICT (table_name) DO UPDATE SET
+                high_water_mark = EXCLUDED.high_water_mark,
+                rows_loaded = EXCLUDED.rows_loaded,
+                updated_at = EXCLUDED.updated_at
+            """,
+            (table_name, watermark_column, new_mark, inserted, datetime.now())
+        )
+        if manifest_files is not None:
+            record_manifest(cursor, table_name, manifest_files, loaded_at, upper_bound, prune=True)
+    conn.commit()
+
+    rows = sum(s['rows'] for s in part_stats)
+    seconds = sum(s['seconds'] for s in part_stats)
+    stats = {
+        'table': table_name,
+        'mode': 'incremental',
+        'files': len(part_stats),
+        'files_pruned': files_pruned,
+        'rows': rows,
+        'rows_skipped': sum(s['rows_skipped'] for s in part_stats),
+        **merge_validation_stats(part_stats),
+        'bytes': sum(s['bytes'] for s in part_stats),
+        'seconds': round(seconds, 3),
+        'rows_per_sec': round(rows / seconds, 1) if seconds > 0 else None,
+        'memory_limit_mb': max((s['memory_limit_mb'] for s in part_stats), default=None),
+        'peak_rss_mb': max((s['peak_rss_mb'] for s in part_stats), default=None),
+        'rows_upserted': inserted,
+        'rows_replaced': replaced,
+        'previous_watermark': previous_mark,
+        'watermark': new_mark
+    }
+    logger.info(
+        "Upserted %s rows into raw.%s (%s replaced, %s outside the window skipped, %s rejected), "
+        "watermark %s -> %s",
+        inserted, table_name, replaced, stats['rows_skipped'], stats['rows_rejected'],
+        previous_mark, new_mark
+    )
+    return stats
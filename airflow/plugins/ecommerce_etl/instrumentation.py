@@ -0,0 +1,253 @@
+"""
+Per-stage timing, throughput and database round-trip metrics for pipeline runs
+"""
+import glob
+import json
+import logging
+import os
+import re
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+
+import psycopg2
+from psycopg2.extensions import cursor as base_cursor
+from psycopg2.extras import execute_values
+
+from ecommerce_etl.stream import peak_rss_mb
+
+logger = logging.getLogger(__name__)
+
+METRICS_TABLE = 'monitoring.pipeline_stage_metrics'
+
+# One JSON Lines report per run is appended here alongside the metrics table
+DEFAULT_REPORT_DIR = os.environ.get('METRICS_REPORT_DIR', '/opt/airflow/logs/metrics')
+
+METRIC_FIELDS = [
+    'stage', 'table_name', 'status', 'started_at', 'seconds', 'rows', 'bytes',
+    'rows_per_sec', 'peak_rss_mb', 'round_trips'
+]
+
+_round_trips = 0
+_round_trips_lock = threading.Lock()
+
+
+def round_trips():
+    """Statements sent through CountingCursor cursors by this process so far"""
+    return _round_trips
+
+
+def _count_round_trip():
+    global _round_trips
+    with _round_trips_lock:
+        _round_trips += 1
+
+
+class CountingCursor(base_cursor):
+    """psycopg2 cursor counting every statement it sends to the server
+
+    Pass cursor_factory=CountingCursor when connecting (connection pools pass
+    it through) and StageTimer reports the statements each stage issued.
+    """
+
+    def execute(self, query, vars=None):
+        _count_round_trip()
+        return super().execute(query, vars)
+
+    def executemany(self, query, vars_list):
+        _count_round_trip()
+        return super().executemany(query, vars_list)
+
+    def copy_expert(self, sql, file, size=8192):
+        _count_round_trip()
+        return super().copy_expert(sql, file, size)
+
+    def callproc(self, procname, parameters=None):
+        _count_round_trip()
+        return super().callproc(procname, parameters)
+
+
+class StageTimer:
+    """Context manager measuring one pipeline stage
+
+    Wall time and round trips cover the with block; rows and bytes are added
+    by the caller. Peak RSS is the process's high-water mark when the stage
+    ends. A stage leaving through an exception is recorded as failed.
+    """
+
+    def __init__(self, stage, table_name=None):
+        self.stage = stage
+        self.table_name = table_name
+        self.rows = 0
+        self.bytes = 0
+        self.metrics = None
+        self._started_at = None
+        self._start = None
+        self._round_trips = None
+
+    def add(self, rows=0, bytes=0):
+        self.rows += rows or 0
+        self.bytes += bytes or 0
+
+    def __enter__(self):
+        self._started_at = datetime.now()
+        self._start = time.monotonic()
+        self._round_trips = round_trips()
+        return self
+
+    def __exit__(self, exc_type, exc, traceback):
+        seconds = time.monotonic() - self._start
+        self.metrics = {
+            'stage': self.stage,
+            'table_name': self.table_name,
+            'status': 'failed' if exc_type else 'success',
+            'started_at': self._started_at,
+            'seconds': round(seconds, 3),
+            'rows': self.rows,
+            'bytes': self.bytes,
+            'rows_per_sec': round(self.rows / seconds, 1) if seconds > 0 else None,
+            'peak_rss_mb': peak_rss_mb(),
+            'round_trips': round_trips() - self._round_trips
+        }
+        return False
+
+
+def stats_metrics(stage, stats, started_at=None):
+    """Stage metrics from the load statistics returned by the loaders"""
+    return {
+        'stage': stage,
+        'table_name': stats.get('table'),
+        'status': 'success',
+        'started_at': started_at,
+        'seconds': stats['seconds'],
+        'rows': stats['rows'],
+        'bytes': stats['bytes'],
+        'rows_per_sec': stats['rows_per_sec'],
+        'peak_rss_mb': stats['peak_rss_mb'],
+        'round_trips': None
+    }
+
+
+def dbt_model_metrics(run_results_path, since=None):
+    """Per-model metrics from a dbt run_results.json written at or after `since` (UTC-aware)"""
+    with open(run_results_path) as f:
+        run_results = json.load(f)
+
+    generated_at = datetime.fromisoformat(run_results['metadata']['generated_at'].replace('Z', '+00:00'))
+    if since is not None and generated_at < since:
+        return []
+
+    metrics = []
+    for result in run_results['results']:
+        if not result['unique_id'].startswith('model.'):
+            continue
+        execute = next((t for t in result.get('timing', []) if t['name'] == 'execute'), None)
+        rows = (result.get('adapter_response') or {}).get('rows_affected')
+        seconds = round(result['execution_time'], 3)
+        metrics.append({
+            'stage': 'dbt',
+            'table_name': result['unique_id'].split('.')[-1],
+            'status': result['status'],
+            'started_at': (
+                datetime.fromisoformat(execute['started_at'].replace('Z', '+00:00'))
+                .astimezone().replace(tzinfo=None)
+                if execute and execute.get('started_at') else None
+            ),
+            'seconds': seconds,
+            'rows': rows,
+            'bytes': None,
+            'rows_per_sec': round(rows / seconds, 1) if rows and seconds > 0 else None,
+            'peak_rss_mb': None,
+            'round_trips': None
+        })
+    return metrics
+
+
+def collect_dbt_metrics(dbt_dir, since=None):
+    """Model metrics from every run_results.json under target/ written since `since`"""
+    paths = [os.path.join(dbt_dir, 'target', 'run_results.json')]
+    paths += sorted(glob.glob(os.path.join(dbt_dir, 'target', 'models', '*', 'run_results.json')))
+    metrics = []
+    for path in paths:
+        if os.path.isfile(path):
+            metrics.extend(dbt_model_metrics(path, since))
+    return metrics
+
+
+def record_stage_metrics(conn, run_id, metrics):
+    """Append stage metrics for a run to the metrics table"""
+    if not metrics:
+        return
+    recorded_at = datetime.now()
+    with conn.cursor() as cursor:
+        execute_values(
+            cursor,
+            f"""
+            INSERT INTO {METRICS_TABLE} (run_id, {', '.join(METRIC_FIELDS)}, recorded_at)
+            VALUES %s
+            """,
+            [(run_id, *(m[field] for field in METRIC_FIELDS), recorded_at) for m in metrics]
+        )
+    conn.commit()
+
+
+def report_path(run_id, report_dir=DEFAULT_REPORT_DIR):
+    """JSON Lines report file of a run"""
+    return os.path.join(report_dir, re.sub(r'[^\w.-]+', '_', run_id) + '.jsonl')
+
+
+def append_json_report(run_id, metrics, report_dir=DEFAULT_REPORT_DIR):
+    """Append stage metrics to the run's local JSON Lines report and return its path"""
+    path = report_path(run_id, report_dir)
+    os.makedirs(report_dir, exist_ok=True)
+    with open(path, 'a', encoding='utf-8') as f:
+        for m in metrics:
+            f.write(json.dumps({'run_id': run_id, **m}, default=str) + '\n')
+    return path
+
+
+def publish_metrics(conn, run_id, metrics, report_dir=DEFAULT_REPORT_DIR):
+    """Persist stage metrics to the metrics table and the JSON report, and log them
+
+    Metrics are diagnostics: failing to persist them is logged, never raised.
+    Without a connection only the JSON report is written.
+    """
+    for m in metrics:
+        logger.info(
+            "Stage %s%s %s in %ss: %s rows (%s rows/sec), %s bytes, %s round trips, peak RSS %s MB",
+            m['stage'], f"[{m['table_name']}]" if m['table_name'] else '', m['status'],
+            m['seconds'], m['rows'], m['rows_per_sec'], m['bytes'], m['round_trips'], m['peak_rss_mb']
+        )
+    try:
+        append_json_report(run_id, metrics, report_dir)
+    except OSError as e:
+        logger.warning("Could not write metrics report: %s", e)
+    if conn is None:
+        return
+    try:
+        record_stage_metrics(conn, run_id, metrics)
+    except psycopg2.Error as e:
+        conn.rollback()
+        logger.warning("Could not record stage metrics: %s", e)
+
+
+@contextmanager
+def measure_stage(connect_kwargs, run_id, stage, table_name=None, report_dir=DEFAULT_REPORT_DIR):
+    """Time a stage with a StageTimer and publish its metrics when it ends, failed or not"""
+    timer = StageTimer(stage, table_name)
+    try:
+        with timer:
+            yield timer
+    finally:
+        try:
+            conn = psycopg2.connect(**connect_kwargs)
+        except psycopg2.Error as e:
+            logger.warning("Could not connect to record stage metrics: %s", e)
+            conn = None
+        try:
+            publish_metrics(conn, run_id, [timer.metrics], report_dir)
+        finally:
+            if conn is not None:
+                conn.close()
+
@@ -0,0 +1,205 @@
+"""
+Content-fingerprint manifest of loaded source files, so unchanged files are not reloaded
+"""
+import hashlib
+import logging
+import os
+from datetime import datetime
+
+from ecommerce_etl.columnar import is_parquet
+from ecommerce_etl.stream import SCAN_BLOCK_BYTES
+
+logger = logging.getLogger(__name__)
+
+MANIFEST_TABLE = 'raw.load_manifest'
+
+# Files needing no load: 'unchanged' matches size and mtime, 'identical' was rewritten with the same bytes
+SKIPPED_STATUSES = ('unchanged', 'identical')
+
+
+def get_manifest(cursor, table_name):
+    """Return the manifest entries of a raw table's source files, keyed by file path"""
+    cursor.execute(
+        f"""
+        SELECT file_path, file_size, file_mtime_ns, content_hash, loaded_through
+        FROM {MANIFEST_TABLE}
+        WHERE table_name = %s
+        """,
+        (table_name,)
+    )
+    columns = ['file_path', 'file_size', 'file_mtime_ns', 'content_hash', 'loaded_through']
+    return {row[0]: dict(zip(columns, row)) for row in cursor.fetchall()}
+
+
+def fingerprint_file(file_path, prefix_bytes=None):
+    """Hash a file in one streaming pass
+
+    Returns its size, mtime and SHA-256. With prefix_bytes, the hash of the
+    file's first prefix_bytes bytes is also returned (as prefix_hash), which
+    tells whether the file only grew since it was that long.
+    """
+    stat = os.stat(file_path)
+    content = hashlib.sha256()
+    prefix_hash = None
+    pos = 0
+
+    with open(file_path, 'rb') as f:
+        while True:
+            block = f.read(SCAN_BLOCK_BYTES)
+            if not block:
+                break
+            if prefix_bytes is not None and pos < prefix_bytes < pos + len(block):
+                # Split the block at the prefix end
+                view = memoryview(block)
+                content.update(view[:prefix_bytes - pos])
+                prefix_hash = content.copy().hexdigest()
+                content.update(view[prefix_bytes - pos:])
+            else:
+                content.update(block)
+            pos += len(block)
+            if pos == prefix_bytes:
+                prefix_hash = content.copy().hexdigest()
+
+    return {
+        'file_path': file_path,
+        'file_size': pos,
+        'file_mtime_ns': stat.st_mtime_ns,
+        'content_hash': content.hexdigest(),
+        'prefix_hash': prefix_hash
+    }
+
+
+def ends_with_newline(file_path, offset):
+    """Whether the byte just before offset is a newline, i.e. offset starts a CSV record"""
+    with open(file_path, 'rb') as f:
+        f.seek(offset - 1)
+        return f.read(1) == b'\n'
+
+
+def bound_date(upper_bound):
+    """The date of a load's upper bound, which incremental loads apply per day"""
+    return upper_bound.date() if isinstance(upper_bound, datetime) else upper_bound
+
+
+def covers(loaded_through, upper_bound):
+    """Whether rows loaded below loaded_through include every row below upper_bound
+
+    None means no bound: every row of the file was loaded, or is to be.
+    """
+    if loaded_through is None:
+        return True
+    return upper_bound is not None and loaded_through >= bound_date(upper_bound)
+
+
+def classify_file(file_path, previous, upper_bound=None):
+    """Compare a source file with its manifest entry and decide how much of it to load
+
+    Returns a dict with the file's fingerprint, a status and the byte range to
+    load (None for the whole file):
+      new        no manifest entry, load the whole file
+      unchanged  same size and mtime as recorded; not even read
+      identical  rewritten with the same bytes; only the manifest is updated
+      appended   the recorded content is an unchanged prefix of a CSV file;
+                 only the new tail (a range of whole records) is loaded
+      changed    anything else, load the whole file
+      extended   unchanged content of which rows past the last load's upper
+                 bound were left out; load the whole file again
+    """
+    if previous is None:
+        return {'file_path': file_path, 'status': 'new', 'byte_range': None,
+                'fingerprint': fingerprint_file(file_path)}
+
+    stat = os.stat(file_path)
+    if stat.st_size == previous['file_size'] and stat.st_mtime_ns == previous['file_mtime_ns']:
+        status, byte_range, fingerprint = 'unchanged', None, dict(previous, prefix_hash=None)
+    else:
+        old_size = previous['file_size']
+        fingerprint = fingerprint_file(
+            file_path, prefix_bytes=old_size if stat.st_size > old_size else None
+        )
+        if fingerprint['content_hash'] == previous['content_hash']:
+            status, byte_range = 'identical', None
+        elif (fingerprint['prefix_hash'] == previous['content_hash'] and not is_parquet(file_path)
+              and old_size > 0 and ends_with_newline(file_path, old_size)):
+            status, byte_range = 'appended', (old_size, fingerprint['file_size'])
+        else:
+            status, byte_range = 'changed', None
+
+    if status != 'changed' and not covers(previous['loaded_through'], upper_bound):
+        status, byte_range = 'extended', None
+    return {'file_path': file_path, 'status': status, 'byte_range': byte_range, 'fingerprint': fingerprint}
+
+
+def plan_table_load(cursor, table_name, file_paths, upper_bound=None):
+    """Decide which of a raw table's source files need loading, and how much of each
+
+    Returns a dict with the per-file plans (see classify_file) and 'reload',
+    which is True when appending to the table cannot reproduce its files: it
+    has no manifest yet, a recorded file changed, was not fully loaded or is
+    gone. Full loads then truncate and reload the table; incremental loads
+    upsert, so they only ever load the files that need it.
+    """
+    manifest = get_manifest(cursor, table_name)
+    files = [classify_file(file_path, manifest.get(file_path), upper_bound) for file_path in file_paths]
+    removed = set(manifest) - set(file_paths)
+    reload = (
+        not manifest or bool(removed)
+        or any(f['status'] in ('changed', 'extended') for f in files)
+    )
+    counts = {}
+    for f in files:
+        counts[f['status']] = counts.get(f['status'], 0) + 1
+    logger.info(
+        "Source files of raw.%s: %s%s", table_name,
+        ', '.join(f"{count} {status}" for status, count in sorted(counts.items())),
+        f", {len(removed)} removed" if removed else ''
+    )
+    return {'table': table_name, 'reload': reload, 'files': files}
+
+
+def files_to_load(plan, reload=False):
+    """Per-file plans that need rows loaded; a reload takes every file whole"""
+    if reload:
+        return [dict(f, byte_range=None) for f in plan['files']]
+    return [f for f in plan['files'] if f['status'] not in SKIPPED_STATUSES]
+
+
+def record_manifest(cursor, table_name, files, loaded_at=None, loaded_through=None, prune=False):
+    """Record the fingerprints of loaded (or checked) source files, in the caller's transaction
+
+    loaded_through is the exclusive upper bound of the rows loaded from files
+    (None if none were filtered out); files that were not loaded keep their
+    recorded bound. With prune, entries of files no longer among a table's
+    sources are dropped.
+    """
+    for f in files:
+        fingerprint = f['fingerprint']
+        loaded = f['status'] not in SKIPPED_STATUSES
+        cursor.execute(
+            f"""
+            INSERT INTO {MANIFEST_TABLE} AS m (
+                table_name, file_path, file_size, file_mtime_ns, content_hash, loaded_through,
+                loaded_at, updated_at
+            )
+            VALUES (%s, %s, %s, %s, %s, %s, %s, CURRENT_TIMESTAMP)
+            ON CONFLICT (table_name, file_path) DO UPDATE SET
+                file_size = EXCLUDED.file_size,
+                file_mtime_ns = EXCLUDED.file_mtime_ns,
+                content_hash = EXCLUDED.content_hash,
+                loaded_through = {'EXCLUDED' if loaded else 'm'}.loaded_through,
+                loaded_at = {'EXCLUDED' if loaded else 'm'}.loaded_at,
+                updated_at = EXCLUDED.updated_at
+            """,
+            (table_name, f['file_path'], fingerprint['file_size'], fingerprint['file_mtime_ns'],
+             fingerprint['content_hash'], bound_date(loaded_through), loaded_at)
+        )
+    if prune:
+        cursor.execute(
+            f"DELETE FROM {MANIFEST_TABLE} WHERE table_name = %s AND NOT (file_path = ANY(%s))",
+            (table_name, [f['file_path'] for f in files])
+        )
+
+
+def clear_manifest(cursor, table_names):
+    """Forget the loaded files of tables about to be truncated, in the caller's transaction"""
+    cursor.execute(f"DELETE FROM {MANIFEST_TABLE} WHERE table_name = ANY(%s)", (list(table_names),))
@@ -0,0 +1,285 @@
+"""
+Parallel multi-table and intra-table loading over a bounded connection pool
+"""
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+from psycopg2.pool import ThreadedConnectionPool
+
+from ecommerce_etl.bulk_load import copy_file
+from ecommerce_etl.columnar import is_parquet
+from ecommerce_etl.incremental import incremental_load
+from ecommerce_etl.manifest import clear_manifest, files_to_load, plan_table_load, record_manifest
+from ecommerce_etl.partitions import ensure_future_partitions, split_default_partition
+from ecommerce_etl.stream import DEFAULT_MEMORY_LIMIT_MB, peak_rss_mb, split_csv_ranges
+from ecommerce_etl.validation import merge_validation_stats
+
+logger = logging.getLogger(__name__)
+
+# Concurrent COPY streams (and pooled connections) per load
+DEFAULT_WORKERS = int(os.environ.get('LOAD_WORKERS', os.cpu_count() or 4))
+
+
+def run_pooled(pool, func, *args):
+    """Run func(conn, *args) on a connection borrowed from the pool"""
+    conn = pool.getconn()
+    try:
+        return func(conn, *args)
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        pool.putconn(conn)
+
+
+def truncate_tables(conn, table_names):
+    """Empty several raw tables in one statement, making sure upcoming partitions exist
+
+    The tables' load manifests are cleared in the same transaction.
+    """
+    with conn.cursor() as cursor:
+        cursor.execute(f"TRUNCATE TABLE {', '.join(f'raw.{t}' for t in table_names)}")
+        clear_manifest(cursor, table_names)
+        for table_name in table_names:
+            ensure_future_partitions(cursor, table_name)
+    conn.commit()
+
+
+def split_table_defaults(conn, table_name, manifest_files=None, loaded_at=None):
+    """Give rows a full load routed to a table's default partition monthly partitions
+
+    manifest_files are recorded in the load manifest in the same transaction.
+    """
+    with conn.cursor() as cursor:
+        split_default_partition(cursor, table_name)
+        if manifest_files:
+            record_manifest(cursor, table_name, manifest_files, loaded_at)
+    conn.commit()
+
+
+def plan_load(conn, table_name, file_paths, upper_bound=None):
+    """Compare a table's source files with its load manifest (see manifest.plan_table_load)"""
+    with conn.cursor() as cursor:
+        plan = plan_table_load(cursor, table_name, file_paths, upper_bound)
+    conn.rollback()
+    return plan
+
+
+def record_checked(conn, table_name, manifest_files):
+    """Record source files that needed no load, such as ones rewritten with the same bytes"""
+    with conn.cursor() as cursor:
+        record_manifest(cursor, table_name, manifest_files, prune=True)
+    conn.commit()
+
+
+def file_ranges(file_path, parts):
+    """Byte ranges to load a file in; Parquet files are already split by partition"""
+    if is_parquet(file_path):
+        return [None]
+    return split_csv_ranges(file_path, parts)
+
+
+def copy_range(conn, table_name, file_path, byte_range, loaded_at, memory_limit_mb):
+    """COPY one byte range of a file (or all of it) into raw.<table_name> in its own transaction"""
+    with conn.cursor() as cursor:
+        stats = copy_file(
+            cursor, f'raw.{table_name}', file_path, loaded_at, memory_limit_mb,
+            byte_range=byte_range, rule_set=table_name
+        )
+    conn.commit()
+    return stats
+
+
+def copy_changed_file(conn, table_name, manifest_file, loaded_at, memory_limit_mb):
+    """COPY a new file, or the appended tail of a loaded one, and record it in one transaction"""
+    with conn.cursor() as cursor:
+        stats = copy_file(
+            cursor, f'raw.{table_name}', manifest_file['file_path'], loaded_at, memory_limit_mb,
+            byte_range=manifest_file['byte_range'], rule_set=table_name
+        )
+        record_manifest(cursor, table_name, [manifest_file], loaded_at)
+    conn.commit()
+    return stats
+
+
+def combine_range_stats(table_name, file_paths, range_stats, files_skipped=0):
+    """Fold per-range load statistics into one entry per table"""
+    rows = sum(s['rows'] for s in range_stats)
+    seconds = max((s['seconds'] for s in range_stats), default=0)
+    return {
+        'table': table_name,
+        'files': len(file_paths),
+        'files_skipped': files_skipped,
+        'ranges': len(range_stats),
+        'rows': rows,
+        'rows_skipped': sum(s['rows_skipped'] for s in range_stats),
+        **merge_validation_stats(range_stats),
+        'bytes': sum(s['bytes'] for s in range_stats),
+        'seconds': seconds,
+        'rows_per_sec': round(rows / seconds, 1) if seconds > 0 else None,
+        'peak_rss_mb': peak_rss_mb()
+    }
+
+
+def skipped_stats(table_name, file_paths):
+    """Load statistics of a table none of whose source files needed loading"""
+    return {
+        'table': table_name,
+        'files': len(file_paths),
+        'files_skipped': len(file_paths),
+        'rows': 0,
+        'rows_skipped': 0,
+        **merge_validation_stats([]),
+        'bytes': 0,
+        'seconds': 0,
+        'rows_per_sec': None,
+        'peak_rss_mb': peak_rss_mb()
+    }
+
+
+def load_tables_parallel(connect_kwargs, files, workers=None, mode='full', memory_limit_mb=None,
+                         upper_bound=None, skip_unchanged=True):
+    """Load several raw tables concurrently, splitting large files into byte ranges
+
+    files maps table name to a CSV path or a list of CSV/Parquet part files (see
+    sources.source_files). All work shares one pool of at most
+    `workers` connections, so the warehouse parses and inserts up to that many
+    COPY streams at once. Full loads truncate every table up front and COPY
+    each range in its own transaction; incremental loads run one watermark
+    merge per table. Rows failing the table's validation rules are quarantined
+    during the COPY (see validation.py). The memory ceiling is split evenly
+    between workers.
+    Upcoming monthly partitions are created before loading, and rows routed
+    to a partitioned table's default partition get partitions of their own
+    once the table is loaded.
+
+    With skip_unchanged, files are first compared with the load manifest (see
+    manifest.py): byte-identical files are not loaded again and grown CSV
+    files only have their appended tail loaded. Full loads then only truncate
+    tables whose loaded files changed or went away, and append new files and
+    tails to the others, each in one transaction with its manifest entry.
+    Tables with nothing to load report zero rows.
+
+    Returns a list of per-table stats. If any table fails, the remaining
+    tables still finish and a RuntimeError naming the failures is raised.
+    """
+    workers = workers or DEFAULT_WORKERS
+    files = {
+        table_name: [paths] if isinstance(paths, str) else list(paths)
+        for table_name, paths in files.items()
+    }
+    worker_memory_mb = (memory_limit_mb or DEFAULT_MEMORY_LIMIT_MB) / workers
+    loaded_at = datetime.now()
+
+    pool = ThreadedConnectionPool(1, workers, **connect_kwargs)
+    results, failures = [], []
+    try:
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            plans = {}
+            if skip_unchanged:
+                # Files of every table are fingerprinted concurrently; full loads take every row
+                plan_futures = {
+                    table_name: executor.submit(
+                        run_pooled, pool, plan_load, table_name, file_paths,
+                        None if mode == 'full' else upper_bound
+                    )
+                    for table_name, file_paths in files.items()
+                }
+                for table_name, future in plan_futures.items():
+                    try:
+                        plans[table_name] = future.result()
+                    except Exception as e:
+                        logger.error("Checking the source files of raw.%s failed: %s", table_name, e)
+                        failures.append(table_name)
+                files = {t: file_paths for t, file_paths in files.items() if t not in failures}
+
+            reloads = [t for t in files if mode == 'full' and (t not in plans or plans[t]['reload'])]
+            changed = {
+                table_name: files_to_load(plans[table_name], table_name in reloads)
+                for table_name in plans
+            }
+
+            futures = {}
+            if mode == 'full':
+                if reloads:
+                    run_pooled(pool, truncate_tables, reloads)
+                for table_name, file_paths in files.items():
+                    if table_name in reloads:
+                        futures[table_name] = [
+                            executor.submit(
+                                run_pooled, pool, copy_range, table_name, file_path,
+                                byte_range, loaded_at, worker_memory_mb
+                            )
+                            for file_path in file_paths
+                            for byte_range in file_ranges(file_path, workers)
+                        ]
+                    else:
+                        # New files and appended tails, each recorded as it commits
+                        futures[table_name] = [
+                            executor.submit(
+                                run_pooled, pool, copy_changed_file, table_name, manifest_file,
+                                loaded_at, worker_memory_mb
+                            )
+                            for manifest_file in changed[table_name]
+                        ]
+            else:
+                # One merge per table so every part is filtered against the same watermark
+                for table_name, file_paths in files.items():
+                    if table_name in plans:
+                        if not changed[table_name]:
+                            futures[table_name] = []
+                            continue
+                        file_paths = [f['file_path'] for f in changed[table_name]]
+                    futures[table_name] = [
+                        executor.submit(
+                            run_pooled, pool, incremental_load, table_name, file_paths,
+                            upper_bound, loaded_at, worker_memory_mb,
+                            {f['file_path']: f['byte_range'] for f in changed.get(table_name, [])
+                             if f['byte_range']},
+                            plans[table_name]['files'] if table_name in plans else None
+                        )
+                    ]
+
+            for table_name, table_futures in futures.items():
+                plan = plans.get(table_name)
+                try:
+                    range_stats = [future.result() for future in table_futures]
+                    if not table_futures:
+                        # Nothing to load, though files rewritten with the same bytes get new mtimes
+                        executor.submit(run_pooled, pool, record_checked, table_name, plan['files']).result()
+                    elif mode == 'full':
+                        # Through the executor, since every pooled connection may be busy
+                        recorded = plan['files'] if plan and table_name in reloads else [
+                            f for f in (plan['files'] if plan else []) if f['status'] == 'identical'
+                        ]
+                        executor.submit(
+                            run_pooled, pool, split_table_defaults, table_name, recorded, loaded_at
+                        ).result()
+                except Exception as e:
+                    logger.error("Loading raw.%s failed: %s", table_name, e)
+                    failures.append(table_name)
+                    continue
+
+                files_skipped = len(files[table_name]) - len(changed[table_name]) if plan else 0
+                if not table_futures:
+                    stats = skipped_stats(table_name, files[table_name])
+                    logger.info("Source files of raw.%s are unchanged since they were loaded", table_name)
+                    results.append(stats)
+                    continue
+                if mode == 'full':
+                    stats = combine_range_stats(table_name, files[table_name], range_stats, files_skipped)
+                else:
+                    stats = dict(range_stats[0], files_skipped=files_skipped)
+                results.append(stats)
+                logger.info(
+                    "Loaded %s rows into raw.%s with %s workers (%s rows/sec, %s rejected)",
+                    stats['rows'], table_name, workers, stats['rows_per_sec'], stats['rows_rejected']
+                )
+    finally:
+        pool.closeall()
+
+    if failures:
+        raise RuntimeError(f"Parallel load failed for: {', '.join(failures)}")
+    return results
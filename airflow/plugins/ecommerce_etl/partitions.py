@@ -0,0 +1,61 @@
+"""
+Monthly range partition maintenance for partitioned raw tables
+"""
+import logging
+from datetime import date, datetime, timedelta
+
+logger = logging.getLogger(__name__)
+
+# Partition key of each raw table that is range-partitioned by month (see warehouse-init.sql)
+PARTITIONED_TABLES = {
+    'orders': 'order_date',
+    'web_events': 'event_timestamp'
+}
+
+# Months created ahead of the data so loads rarely land in the default partition
+FUTURE_PARTITION_DAYS = 90
+
+
+def ensure_future_partitions(cursor, table_name, through=None):
+    """Create missing monthly partitions from this month until FUTURE_PARTITION_DAYS past `through`
+
+    through may be a date or a datetime (such as a DAG run's upper bound);
+    ensure_monthly_partitions takes dates, so datetimes are cut to their day.
+    """
+    if table_name not in PARTITIONED_TABLES:
+        return 0
+    through = through or date.today()
+    if isinstance(through, datetime):
+        through = through.date()
+    cursor.execute(
+        "SELECT public.ensure_monthly_partitions(%s, %s, %s)",
+        (f'raw.{table_name}', date.today().replace(day=1), through + timedelta(days=FUTURE_PARTITION_DAYS))
+    )
+    return cursor.fetchone()[0]
+
+
+def split_default_partition(cursor, table_name):
+    """Move rows that fell into the default partition into monthly partitions of their own"""
+    if table_name not in PARTITIONED_TABLES:
+        return 0
+    cursor.execute("SELECT public.split_default_partition(%s)", (f'raw.{table_name}',))
+    created = cursor.fetchone()[0]
+    if created:
+        logger.info("Created %s monthly partitions of raw.%s from its default partition",
+                    created, table_name)
+    return created
+
+
+def partition_bounds(cursor, relation, table_name):
+    """Return the (min, max) partition key of a relation holding rows bound for a partitioned table
+
+    The bounds are passed back as literals so the planner can prune
+    partitions, which Postgres 13 does not do at run time for DELETE.
+    Returns None for tables that are not partitioned or relations without rows.
+    """
+    column = PARTITIONED_TABLES.get(table_name)
+    if column is None:
+        return None
+    cursor.execute(f"SELECT MIN({column}), MAX({column}) FROM {relation}")
+    low, high = cursor.fetchone()
+    return None if low is None else (low, high)
@@ -0,0 +1,186 @@
+"""
+Raw data quality checks, one scan per table, with table groups run in parallel
+"""
+import logging
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+from psycopg2.extras import execute_values
+from psycopg2.pool import ThreadedConnectionPool
+
+from ecommerce_etl.parallel_load import run_pooled
+
+logger = logging.getLogger(__name__)
+
+RESULTS_TABLE = 'monitoring.data_quality_results'
+
+# Checks grouped by the raw table they scan. Each condition flags a failing row of
+# raw.<table> (aliased t); `joins` are added to that table's single scan.
+QUALITY_CHECKS = {
+    'customers': {
+        'checks': {
+            'customers_no_nulls': "t.customer_id IS NULL OR t.email IS NULL"
+        }
+    },
+    'orders': {
+        'checks': {
+            'orders_valid_dates': "t.order_date > CURRENT_DATE"
+        }
+    },
+    'products': {
+        'checks': {
+            'products_positive_prices': "t.price <= 0"
+        }
+    },
+    'order_items': {
+        'joins': "LEFT JOIN raw.orders o ON t.order_id = o.order_id",
+        'checks': {
+            'order_items_referential_integrity': "o.order_id IS NULL"
+        }
+    }
+}
+
+# Single-table checks are also enforced row by row during loads (validation.VALIDATION_RULES),
+# so after a validated load only these need a scan
+CROSS_TABLE_CHECKS = [table_name for table_name, group in QUALITY_CHECKS.items() if 'joins' in group]
+
+# Table groups checked concurrently (and pooled connections)
+DEFAULT_WORKERS = int(os.environ.get('QUALITY_WORKERS', len(QUALITY_CHECKS)))
+
+
+def checked_through(cursor, table_name):
+    """Return the newest loaded_at covered by a clean check of a table, or None"""
+    cursor.execute(
+        f"""
+        SELECT MAX(checked_through) FROM {RESULTS_TABLE}
+        WHERE table_name = %s AND scope <> 'load'
+        GROUP BY run_id
+        HAVING BOOL_AND(passed)
+        ORDER BY MAX(checked_at) DESC
+        LIMIT 1
+        """,
+        (table_name,)
+    )
+    row = cursor.fetchone()
+    return row[0] if row else None
+
+
+def scan_table(conn, table_name, mode='incremental'):
+    """Evaluate every check on a table in one scan
+
+    Incremental checks only read rows loaded after the last clean check of
+    the table; a table without one is checked in full. Returns a list of
+    per-check results sharing the scan's row count and timing.
+    """
+    group = QUALITY_CHECKS[table_name]
+    checks = group['checks']
+
+    with conn.cursor() as cursor:
+        since = checked_through(cursor, table_name) if mode == 'incremental' else None
+        failure_counts = ',\n'.join(
+            f"COUNT(*) FILTER (WHERE {condition})" for condition in checks.values()
+        )
+        where = "WHERE t.loaded_at > %s" if since else ''
+
+        start = time.monotonic()
+        cursor.execute(
+            f"""
+            SELECT COUNT(*), MAX(t.loaded_at), {failure_counts}
+            FROM raw.{table_name} t {group.get('joins', '')}
+            {where}
+            """,
+            (since,) if since else None
+        )
+        rows_checked, newest, *failures = cursor.fetchone()
+        seconds = round(time.monotonic() - start, 3)
+    conn.commit()
+
+    return [
+        {
+            'check_name': check_name,
+            'table_name': table_name,
+            'scope': 'incremental' if since else 'full',
+            'rows_checked': rows_checked,
+            'failed_rows': failed_rows,
+            'passed': failed_rows == 0,
+            'seconds': seconds,
+            'checked_through': newest or since
+        }
+        for check_name, failed_rows in zip(checks, failures)
+    ]
+
+
+def record_results(conn, run_id, results, checked_at=None):
+    """Append check results for a run to the results table"""
+    checked_at = checked_at or datetime.now()
+    with conn.cursor() as cursor:
+        execute_values(
+            cursor,
+            f"""
+            INSERT INTO {RESULTS_TABLE} (
+                run_id, check_name, table_name, scope, rows_checked, failed_rows,
+                passed, seconds, checked_through, checked_at
+            ) VALUES %s
+            """,
+            [
+                (run_id, r['check_name'], r['table_name'], r['scope'], r['rows_checked'],
+                 r['failed_rows'], r['passed'], r['seconds'], r['checked_through'], checked_at)
+                for r in results
+            ]
+        )
+    conn.commit()
+
+
+def load_rejection_results(load_stats):
+    """Turn the rejection counts of validated loads into per-rule check results"""
+    return [
+        {
+            'check_name': rule_name,
+            'table_name': stats['table'],
+            'scope': 'load',
+            'rows_checked': stats['rows'] + stats['rows_rejected'],
+            'failed_rows': failed_rows,
+            'passed': failed_rows == 0,
+            'seconds': stats['seconds'],
+            'checked_through': None
+        }
+        for stats in load_stats
+        for rule_name, failed_rows in stats.get('rejected_by_rule', {}).items()
+    ]
+
+
+def run_quality_checks(connect_kwargs, run_id, tables=None, mode='incremental', workers=None,
+                       load_stats=None):
+    """Check raw tables concurrently, one scan per table, and record the results
+
+    mode 'incremental' limits each table's scan to rows loaded since its last
+    clean check; 'full' rescans everything. Results are written to
+    monitoring.data_quality_results whether or not checks fail, together with
+    the rule rejection counts of any load_stats (scope 'load'), which are not
+    returned. Returns the list of per-check results; callers decide how to
+    gate on failures.
+    """
+    tables = list(tables or QUALITY_CHECKS)
+    workers = min(workers or DEFAULT_WORKERS, len(tables))
+
+    pool = ThreadedConnectionPool(1, workers, **connect_kwargs)
+    try:
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            futures = [
+                executor.submit(run_pooled, pool, scan_table, table_name, mode)
+                for table_name in tables
+            ]
+            results = [result for future in futures for result in future.result()]
+        run_pooled(pool, record_results, run_id, results + load_rejection_results(load_stats or []))
+    finally:
+        pool.closeall()
+
+    for r in results:
+        logger.info(
+            "%s on raw.%s: %s of %s %s rows failed (%ss)",
+            r['check_name'], r['table_name'], r['failed_rows'], r['rows_checked'],
+            r['scope'], r['seconds']
+        )
+    return results
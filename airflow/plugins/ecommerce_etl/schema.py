@@ -0,0 +1,166 @@
+"""
+Compact typed layout of the raw tables, shared by the data generator and the loaders
+"""
+import pandas as pd
+
+try:
+    import pyarrow as pa
+except ImportError:  # pandas dtypes work without pyarrow
+    pa = None
+
+# Closed value sets, stored as categoricals: one int8 code per row instead of a string
+CATEGORIES = {
+    'customer_segment': ['premium', 'regular', 'budget'],
+    'gender': ['M', 'F', 'O'],
+    'category': ['Electronics', 'Clothing', 'Home & Garden', 'Sports', 'Books', 'Beauty',
+                 'Toys', 'Automotive', 'Food', 'Health'],
+    'order_status': ['completed', 'cancelled', 'returned', 'shipped', 'pending'],
+    'payment_method': ['credit_card', 'debit_card', 'paypal', 'apple_pay', 'google_pay'],
+    'shipping_method': ['standard', 'express', 'overnight', 'pickup'],
+    'currency': ['USD'],
+    'event_type': ['page_view', 'add_to_cart', 'remove_from_cart', 'purchase', 'search',
+                   'login', 'logout'],
+    'user_type': ['registered', 'anonymous'],
+    'device_type': ['desktop', 'mobile', 'tablet']
+}
+
+# Column kinds of every raw table, in file order. IDs are INTEGER in the raw schema,
+# so int32 holds them; nullable_id columns may be missing (NULL).
+TABLE_SCHEMAS = {
+    'customers': {
+        'customer_id': 'id',
+        'first_name': 'text',
+        'last_name': 'text',
+        'email': 'text',
+        'phone': 'text',
+        'address': 'text',
+        'city': 'text',
+        'state': 'text',
+        'zip_code': 'text',
+        'country': 'text',
+        'registration_date': 'date',
+        'customer_segment': 'category',
+        'birth_date': 'date',
+        'gender': 'category'
+    },
+    'products': {
+        'product_id': 'id',
+        'product_name': 'text',
+        'category': 'category',
+        'subcategory': 'text',
+        'brand': 'text',
+        'price': 'decimal',
+        'cost': 'decimal',
+        'weight': 'decimal',
+        'dimensions': 'text',
+        'description': 'text',
+        'created_date': 'date',
+        'is_active': 'bool'
+    },
+    'orders': {
+        'order_id': 'id',
+        'customer_id': 'id',
+        'order_date': 'date',
+        'order_status': 'category',
+        'payment_method': 'category',
+        'shipping_method': 'category',
+        'shipping_cost': 'decimal',
+        'tax_amount': 'decimal',
+        'total_amount': 'decimal',
+        'currency': 'category',
+        'created_at': 'timestamp',
+        'updated_at': 'timestamp'
+    },
+    'order_items': {
+        'order_item_id': 'id',
+        'order_id': 'id',
+        'product_id': 'id',
+        'quantity': 'int',
+        'unit_price': 'decimal',
+        'line_total': 'decimal',
+        'discount_amount': 'decimal',
+        'created_at': 'timestamp'
+    },
+    'web_events': {
+        'event_id': 'id',
+        'customer_id': 'nullable_id',
+        'session_id': 'text',
+        'event_type': 'category',
+        'product_id': 'nullable_id',
+        'event_timestamp': 'timestamp',
+        'user_agent': 'text',
+        'ip_address': 'text',
+        'referrer': 'text',
+        'page_url': 'text',
+        'user_type': 'category',
+        'device_type': 'category',
+        'country': 'text',
+        'city': 'text'
+    }
+}
+
+# Dates are held as midnight timestamps in pandas and written as dates to Parquet and CSV
+PANDAS_DTYPES = {
+    'id': 'int32',
+    'nullable_id': 'Int32',
+    'int': 'int32',
+    'decimal': 'float64',
+    'bool': 'bool',
+    'date': 'datetime64[s]',
+    'timestamp': 'datetime64[us]'
+}
+
+
+def pandas_dtype(column, kind):
+    """pandas dtype of a column of a given kind; None keeps text columns as they are"""
+    if kind == 'category':
+        return pd.CategoricalDtype(CATEGORIES[column])
+    return PANDAS_DTYPES.get(kind)
+
+
+def arrow_type(kind):
+    """Arrow type of a column kind: categoricals stay dictionary-encoded, dates become date32"""
+    return {
+        'id': pa.int32(),
+        'nullable_id': pa.int32(),
+        'int': pa.int32(),
+        'decimal': pa.float64(),
+        'bool': pa.bool_(),
+        'text': pa.string(),
+        'category': pa.dictionary(pa.int8(), pa.string()),
+        'date': pa.date32(),
+        'timestamp': pa.timestamp('us')
+    }[kind]
+
+
+def apply_schema(df, table_name):
+    """Cast a generated frame of a raw table to its compact dtypes
+
+    Values outside a column's categories would become missing, so they raise
+    instead.
+    """
+    dtypes = {}
+    for column, kind in TABLE_SCHEMAS[table_name].items():
+        dtype = pandas_dtype(column, kind)
+        if dtype is None or column not in df.columns or df[column].dtype == dtype:
+            continue
+        if kind == 'category':
+            unknown = set(df[column].dropna().unique()) - set(CATEGORIES[column])
+            if unknown:
+                raise ValueError(f"Unexpected {column} values for {table_name}: {sorted(unknown)}")
+        dtypes[column] = dtype
+    return df.astype(dtypes) if dtypes else df
+
+
+def arrow_schema(table_name):
+    """Arrow schema of a raw table, as written by the generator and cast to by columnar.copy_parquet"""
+    if pa is None:
+        raise ImportError("Arrow schemas require pyarrow (pip install pyarrow)")
+    return pa.schema([
+        (column, arrow_type(kind)) for column, kind in TABLE_SCHEMAS[table_name].items()
+    ])
+
+
+def memory_mb(df):
+    """In-memory size of a frame, counting the Python objects of text columns"""
+    return round(df.memory_usage(deep=True).sum() / 1024 / 1024, 1)
@@ -0,0 +1,31 @@
+"""
+Discovery of generator output files for each raw table
+"""
+import glob
+import os
+
+
+def source_files(data_dir, table_name):
+    """Return the files holding a table's data, in load order
+
+    The generator writes either a single <table>.csv, a <table>/ directory of
+    part-*.csv files when sharded, or <table>/month=YYYY-MM/part-*.parquet
+    files in columnar mode. CSV wins if both are present. An empty list means
+    no data yet.
+    """
+    single_file = os.path.join(data_dir, f'{table_name}.csv')
+    if os.path.isfile(single_file):
+        return [single_file]
+    csv_parts = sorted(glob.glob(os.path.join(data_dir, table_name, 'part-*.csv')))
+    if csv_parts:
+        return csv_parts
+    return sorted(glob.glob(os.path.join(data_dir, table_name, 'month=*', 'part-*.parquet')))
+
+
+def sensor_pattern(data_dir, table_name):
+    """Glob pattern matching a table's output in any layout, for FileSensor
+
+    Matches <table>.csv as well as the <table>/ directory, which FileSensor
+    treats as present once it holds any CSV part or Parquet partition file.
+    """
+    return os.path.join(data_dir, f'{table_name}*')
@@ -0,0 +1,168 @@
+"""
+Bounded-memory streaming helpers for raw table ingestion
+"""
+import csv
+import io
+import os
+import resource
+from itertools import islice
+
+# Memory ceiling for a single table load, overridable per environment
+DEFAULT_MEMORY_LIMIT_MB = int(os.environ.get('LOAD_MEMORY_LIMIT_MB', 256))
+
+# A parsed CSV row held as a list of str costs several times its text size
+PARSED_ROW_OVERHEAD = 4
+
+# Bytes read from the head of a file to estimate its average row width
+SAMPLE_BYTES = 1024 * 1024
+
+# Block size used when scanning a file for record boundaries
+SCAN_BLOCK_BYTES = 4 * 1024 * 1024
+
+# Files are not split into ranges smaller than this
+MIN_RANGE_BYTES = 16 * 1024 * 1024
+
+MIN_BATCH_ROWS = 100
+MIN_COPY_BUFFER = 64 * 1024
+MAX_COPY_BUFFER = 8 * 1024 * 1024
+
+
+def read_header(file_path):
+    """Return the column names from the first line of a CSV file"""
+    with open(file_path, newline='', encoding='utf-8') as f:
+        return next(csv.reader(f), [])
+
+
+def sample_row_bytes(file_path, sample_bytes=SAMPLE_BYTES):
+    """Estimate the average number of bytes per CSV line from the head of the file"""
+    with open(file_path, 'rb') as f:
+        head = f.read(sample_bytes)
+
+    lines = head.count(b'\n')
+    if lines == 0:
+        return max(len(head), 1)
+    return max(len(head) // lines, 1)
+
+
+def plan_batches(file_path, memory_limit_mb=None):
+    """Work out batch sizes that keep a streaming CSV load under the memory ceiling"""
+    return plan_for_row_bytes(sample_row_bytes(file_path), memory_limit_mb)
+
+
+def plan_for_row_bytes(row_bytes, memory_limit_mb=None, row_overhead=PARSED_ROW_OVERHEAD):
+    """Work out batch sizes for rows of a known average width
+
+    Half of the budget goes to row batches (row_overhead times the row width
+    in memory), a quarter to the encoded COPY buffer; the remainder is headroom
+    for the interpreter and driver. Returns a dict with batch_rows and
+    copy_buffer_size.
+    """
+    limit_bytes = int((memory_limit_mb or DEFAULT_MEMORY_LIMIT_MB) * 1024 * 1024)
+
+    batch_rows = max(MIN_BATCH_ROWS, (limit_bytes // 2) // (row_bytes * row_overhead))
+    copy_buffer_size = min(MAX_COPY_BUFFER, max(MIN_COPY_BUFFER, limit_bytes // 4))
+
+    return {
+        'memory_limit_mb': limit_bytes // (1024 * 1024),
+        'row_bytes': row_bytes,
+        'batch_rows': batch_rows,
+        'copy_buffer_size': copy_buffer_size
+    }
+
+
+def iter_row_batches(reader, batch_rows):
+    """Yield lists of at most batch_rows rows from a csv.reader"""
+    while True:
+        batch = list(islice(reader, batch_rows))
+        if not batch:
+            return
+        yield batch
+
+
+def split_csv_ranges(file_path, parts, min_range_bytes=MIN_RANGE_BYTES):
+    """Split the data rows of a CSV file into at most `parts` byte ranges
+
+    Range boundaries always fall on a record boundary: a newline preceded by an
+    even number of double quotes, so quoted fields spanning several lines are
+    never cut. The scan only counts quotes block by block, which runs at disk
+    speed. Returns a list of (start, end) offsets covering every row after the
+    header.
+    """
+    size = os.path.getsize(file_path)
+    with open(file_path, 'rb') as f:
+        f.readline()
+        data_start = f.tell()
+        parts = min(parts, max(1, (size - data_start) // max(min_range_bytes, 1)))
+        if parts <= 1:
+            return [(data_start, size)] if size > data_start else []
+
+        step = (size - data_start) // parts
+        targets = [data_start + step * i for i in range(1, parts)]
+        boundaries = [data_start]
+        in_quotes = False
+        pos = data_start
+
+        while targets:
+            block = f.read(SCAN_BLOCK_BYTES)
+            if not block:
+                break
+
+            idx = 0
+            while targets:
+                # Quotes before the next target only flip the parity
+                skip_to = max(idx, min(targets[0] - pos, len(block)))
+                in_quotes ^= block.count(b'"', idx, skip_to) % 2 == 1
+                idx = skip_to
+
+                newline = block.find(b'\n', idx)
+                if newline == -1:
+                    in_quotes ^= block.count(b'"', idx) % 2 == 1
+                    break
+
+                in_quotes ^= block.count(b'"', idx, newline) % 2 == 1
+                idx = newline + 1
+                if not in_quotes and pos + idx < size:
+                    boundaries.append(pos + idx)
+                    targets = [t for t in targets if t > pos + idx]
+
+            pos += len(block)
+
+    ends = boundaries[1:] + [size]
+    return [(start, end) for start, end in zip(boundaries, ends) if end > start]
+
+
+class ByteRangeReader(io.RawIOBase):
+    """Raw binary reader that stops at the end of a byte range of an open file"""
+
+    def __init__(self, file_obj, start, end):
+        self._file = file_obj
+        self._file.seek(start)
+        self._remaining = end - start
+
+    def readable(self):
+        return True
+
+    def close(self):
+        self._file.close()
+        super().close()
+
+    def readinto(self, buffer):
+        if self._remaining <= 0:
+            return 0
+        view = memoryview(buffer)[:min(len(buffer), self._remaining)]
+        read = self._file.readinto(view)
+        self._remaining -= read
+        return read
+
+
+def open_byte_range(file_path, start, end):
+    """Open a text stream over bytes [start, end) of a UTF-8 file"""
+    raw = open(file_path, 'rb')
+    reader = io.BufferedReader(ByteRangeReader(raw, start, end))
+    return io.TextIOWrapper(reader, encoding='utf-8', newline='')
+
+
+def peak_rss_mb():
+    """Peak resident set size of the current process in MB"""
+    # ru_maxrss is reported in kilobytes on Linux
+    return round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)
@@ -0,0 +1,206 @@
+"""
+Row-level validation applied while streaming files into the raw schema
+"""
+import csv
+import os
+from datetime import date, datetime, timedelta
+
+import numpy as np
+
+try:
+    import pyarrow as pa
+    import pyarrow.compute as pc
+except ImportError:  # CSV validation works without pyarrow
+    pa = None
+
+# Rejected rows are written here, one CSV per loaded file (or byte range)
+DEFAULT_QUARANTINE_DIR = os.environ.get('QUARANTINE_DIR', '/opt/airflow/data/quarantine')
+
+# Per-table rules mirroring the single-table checks of quality.QUALITY_CHECKS:
+# rule name -> (column, kind). Rows failing any rule are quarantined instead of loaded.
+VALIDATION_RULES = {
+    'customers': {
+        'customer_id_not_null': ('customer_id', 'not_null'),
+        'email_not_null': ('email', 'not_null')
+    },
+    'orders': {
+        'order_date_not_future': ('order_date', 'not_future')
+    },
+    'products': {
+        'price_positive': ('price', 'positive')
+    }
+}
+
+# Load statistics of a file loaded without any applicable rules
+NO_REJECTIONS = {'rows_rejected': 0, 'rejected_by_rule': {}, 'quarantine_file': None}
+
+
+def parse_numbers(values):
+    """Parse CSV text as floats: empty values become NaN, unparseable ones -inf"""
+    numbers = np.full(len(values), np.nan)
+    present = values != ''
+    try:
+        numbers[present] = values[present].astype(float)
+    except ValueError:
+        def parse(value):
+            try:
+                return float(value)
+            except ValueError:
+                return -np.inf
+        numbers[present] = [parse(value) for value in values[present]]
+    return numbers
+
+
+def text_failures(kind, values):
+    """Boolean mask of failing rows for a numpy array of CSV text values
+
+    Like the SQL checks, a missing value only fails not_null.
+    """
+    if kind == 'not_null':
+        return values == ''
+    if kind == 'not_future':
+        # ISO-8601 dates and timestamps compare as text once cut to the date
+        today = date.today().isoformat()
+        return (values.astype('U10') > today) & (values != '')
+    if kind == 'positive':
+        # NaN compares False, -inf (unparseable) is rejected
+        return parse_numbers(values) <= 0
+    raise ValueError(f"Unknown validation rule kind: {kind}")
+
+
+def arrow_failures(kind, values):
+    """Boolean numpy mask of failing rows for an Arrow column"""
+    if kind == 'not_null':
+        failed = pc.is_null(values)
+    elif kind == 'not_future':
+        tomorrow = datetime.combine(date.today() + timedelta(days=1), datetime.min.time())
+        failed = pc.greater_equal(pc.cast(values, pa.timestamp('us')),
+                                  pa.scalar(tomorrow, pa.timestamp('us')))
+    elif kind == 'positive':
+        failed = pc.less_equal(pc.cast(values, pa.float64()), 0)
+    else:
+        raise ValueError(f"Unknown validation rule kind: {kind}")
+    return pc.fill_null(failed, False).to_numpy(zero_copy_only=False)
+
+
+def quarantine_path(quarantine_dir, table_name, file_name, loaded_at, byte_range=None):
+    """Quarantine file for the rows of one load of a file (or byte range of it)"""
+    name = os.path.splitext(file_name)[0].replace(os.sep, '_')
+    if byte_range is not None:
+        name = f'{name}.{byte_range[0]}'
+    stamp = loaded_at.strftime('%Y%m%dT%H%M%S')
+    return os.path.join(quarantine_dir, table_name, f'{stamp}_{name}.csv')
+
+
+class RowValidator:
+    """Evaluates a table's rules column by column over each batch of rows
+
+    Failing rows are appended to a quarantine CSV (the source columns plus the
+    names of the rules they broke), opened on the first rejection.
+    """
+
+    def __init__(self, rules, columns, quarantine_file=None):
+        self.rules = rules
+        self.columns = columns
+        self.quarantine_file = quarantine_file
+        self.rows_rejected = 0
+        self.rejected_by_rule = {name: 0 for name in rules}
+        self._quarantine = None
+        self._writer = None
+
+    def _keep_mask(self, failures, rejected_rows):
+        """Combine per-rule failure masks, quarantine rejected rows and return the keep mask"""
+        rejected = np.zeros(len(next(iter(failures.values()))), dtype=bool)
+        for name, failed in failures.items():
+            self.rejected_by_rule[name] += int(failed.sum())
+            rejected |= failed
+
+        count = int(rejected.sum())
+        if count:
+            self.rows_rejected += count
+            positions = np.flatnonzero(rejected)
+            broken = [
+                ';'.join(name for name, failed in failures.items() if failed[i])
+                for i in positions
+            ]
+            self._quarantine_rows(
+                row + [rules] for row, rules in zip(rejected_rows(positions), broken)
+            )
+        return ~rejected
+
+    def _quarantine_rows(self, rows):
+        if self.quarantine_file is None:
+            return
+        if self._writer is None:
+            os.makedirs(os.path.dirname(self.quarantine_file), exist_ok=True)
+            self._quarantine = open(self.quarantine_file, 'w', newline='', encoding='utf-8')
+            self._writer = csv.writer(self._quarantine)
+            self._writer.writerow(self.columns + ['rejected_rules'])
+        self._writer.writerows(rows)
+
+    def filter_rows(self, batch):
+        """Return the rows of a batch of parsed CSV rows that pass every rule"""
+        if not batch:
+            return batch
+        failures = {}
+        for name, (column, kind) in self.rules.items():
+            index = self.columns.index(column)
+            failures[name] = text_failures(kind, np.array([row[index] for row in batch]))
+        keep = self._keep_mask(failures, lambda positions: [batch[i] for i in positions])
+        if keep.all():
+            return batch
+        return [row for row, kept in zip(batch, keep) if kept]
+
+    def filter_batch(self, batch):
+        """Return the rows of an Arrow record batch that pass every rule"""
+        if batch.num_rows == 0:
+            return batch
+        failures = {
+            name: arrow_failures(kind, batch.column(batch.schema.get_field_index(column)))
+            for name, (column, kind) in self.rules.items()
+        }
+
+        def rejected_rows(positions):
+            rows = batch.take(pa.array(positions)).to_pylist()
+            return [['' if row[c] is None else row[c] for c in self.columns] for row in rows]
+
+        keep = self._keep_mask(failures, rejected_rows)
+        if keep.all():
+            return batch
+        return batch.filter(pa.array(keep))
+
+    def close(self):
+        if self._quarantine is not None:
+            self._quarantine.close()
+
+    def stats(self):
+        return {
+            'rows_rejected': self.rows_rejected,
+            'rejected_by_rule': dict(self.rejected_by_rule),
+            'quarantine_file': self.quarantine_file if self.rows_rejected else None
+        }
+
+
+def make_validator(rule_set, columns, quarantine_file=None):
+    """Build a RowValidator for a table's rules, or None if none apply to these columns"""
+    rules = {
+        name: (column, kind)
+        for name, (column, kind) in VALIDATION_RULES.get(rule_set, {}).items()
+        if column in columns
+    }
+    if not rules:
+        return None
+    return RowValidator(rules, list(columns), quarantine_file)
+
+
+def merge_validation_stats(part_stats):
+    """Sum rejection counts over per-file or per-range load statistics"""
+    by_rule = {}
+    for stats in part_stats:
+        for name, count in stats.get('rejected_by_rule', {}).items():
+            by_rule[name] = by_rule.get(name, 0) + count
+    return {
+        'rows_rejected': sum(s.get('rows_rejected', 0) for s in part_stats),
+        'rejected_by_rule': by_rule,
+        'quarantine_files': [s['quarantine_file'] for s in part_stats if s.get('quarantine_file')]
+    }
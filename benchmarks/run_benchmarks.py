@@ -0,0 +1,344 @@
+#!/usr/bin/env python3
+"""
+Reproducible pipeline benchmarks across scale factors
+
+For each scale factor the harness generates a seeded dataset with
+EcommerceDataGenerator.generate_all_data, bulk loads it into a local Postgres
+through the same parallel loader the DAG's load tasks use, then builds each dbt
+layer. Generation and loading run in a fresh child process each so peak RSS is
+measured per stage. Results are written as JSON and, given a baseline results
+file, compared stage by stage.
+
+Usage:
+    python benchmarks/run_benchmarks.py --scale-factors 0.01 0.1 --reset
+    python benchmarks/run_benchmarks.py --baseline benchmarks/results/baseline.json
+"""
+import argparse
+import json
+import os
+import platform
+import resource
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+
+PROJECT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(PROJECT_DIR, 'airflow', 'plugins'))
+sys.path.insert(0, os.path.join(PROJECT_DIR, 'data-generation'))
+
+DBT_DIR = os.path.join(PROJECT_DIR, 'dbt')
+INIT_SQL = os.path.join(PROJECT_DIR, 'infrastructure', 'warehouse-init.sql')
+RESULTS_DIR = os.path.join(PROJECT_DIR, 'benchmarks', 'results')
+
+TABLES = ['customers', 'products', 'orders', 'order_items', 'web_events']
+DBT_LAYERS = ['staging', 'warehouse', 'marts']
+
+# The docker-compose warehouse service, published on localhost:5435
+WAREHOUSE_CONN = {
+    'host': os.environ.get('WAREHOUSE_HOST', 'localhost'),
+    'port': int(os.environ.get('WAREHOUSE_PORT', 5435)),
+    'dbname': os.environ.get('WAREHOUSE_DB', 'ecommerce_dw'),
+    'user': os.environ.get('WAREHOUSE_USER', 'warehouse'),
+    'password': os.environ.get('WAREHOUSE_PASSWORD', 'warehouse')
+}
+
+# Slower than the baseline by more than this many percent counts as a regression
+DEFAULT_THRESHOLD_PCT = 10.0
+
+
+def child_peak_rss_mb():
+    """Peak RSS of the current process in MB; called inside the stage's child process"""
+    return round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)
+
+
+def generate_stage(scale_factor, output_dir, seed, file_format):
+    """Generate a seeded dataset in memory and write it out; runs in a child process"""
+    from generate_ecommerce_data import EcommerceDataGenerator, seed_everything
+
+    seed_everything(seed)
+    start = time.monotonic()
+    data = EcommerceDataGenerator().generate_all_data(
+        scale_factor=scale_factor, output_dir=output_dir, file_format=file_format
+    )
+    seconds = time.monotonic() - start
+    rows = sum(len(df) for df in data.values())
+    return [{
+        'component': 'all',
+        'seconds': round(seconds, 3),
+        'rows': rows,
+        'rows_per_sec': round(rows / seconds, 1) if seconds > 0 else None,
+        'peak_rss_mb': child_peak_rss_mb()
+    }]
+
+
+def load_stage(data_dir, workers, memory_limit_mb):
+    """Truncate and bulk load every raw table as the DAG's load tasks do; runs in a child process"""
+    from ecommerce_etl.parallel_load import load_tables_parallel
+    from ecommerce_etl.sources import source_files
+
+    files = {table: source_files(data_dir, table) for table in TABLES}
+    start = time.monotonic()
+    results = load_tables_parallel(
+        WAREHOUSE_CONN, {t: f for t, f in files.items() if f}, workers=workers, mode='full',
+        memory_limit_mb=memory_limit_mb, skip_unchanged=False
+    )
+    seconds = time.monotonic() - start
+    rows = sum(stats['rows'] for stats in results)
+    peak = child_peak_rss_mb()
+    return [
+        {
+            'component': stats['table'],
+            'seconds': stats['seconds'],
+            'rows': stats['rows'],
+            'rows_per_sec': stats['rows_per_sec'],
+            'peak_rss_mb': peak
+        }
+        for stats in results
+    ] + [{
+        'component': 'all',
+        'seconds': round(seconds, 3),
+        'rows': rows,
+        'rows_per_sec': round(rows / seconds, 1) if seconds > 0 else None,
+        'peak_rss_mb': peak
+    }]
+
+
+def run_in_child(func, *args):
+    """Run a stage in a fresh process so its peak RSS is its own"""
+    with ProcessPoolExecutor(max_workers=1) as executor:
+        return executor.submit(func, *args).result()
+
+
+def dbt_command(*args, threads=None):
+    command = ['dbt', *args, '--project-dir', DBT_DIR, '--profiles-dir', DBT_DIR,
+               '--target', 'benchmark']
+    if threads:
+        command += ['--threads', str(threads)]
+    return command
+
+
+def dbt_stage(layers, threads):
+    """Build each dbt layer over the whole generated date range"""
+    from ecommerce_etl.instrumentation import dbt_model_metrics
+
+    if not os.path.isdir(os.path.join(DBT_DIR, 'dbt_packages')):
+        subprocess.run(dbt_command('deps'), check=True, env={**os.environ, **dbt_env()})
+
+    dbt_vars = json.dumps({'start_date': '2022-01-01', 'end_date': '2024-12-31', 'full_reload': True})
+    results = []
+    for layer in layers:
+        start = time.monotonic()
+        subprocess.run(
+            dbt_command('run', '--select', layer, '--vars', dbt_vars, threads=threads),
+            check=True, env={**os.environ, **dbt_env()}
+        )
+        seconds = time.monotonic() - start
+        models = dbt_model_metrics(os.path.join(DBT_DIR, 'target', 'run_results.json'))
+        rows = sum(m['rows'] or 0 for m in models)
+        results.append({
+            'component': layer,
+            'seconds': round(seconds, 3),
+            'rows': rows,
+            'rows_per_sec': round(rows / seconds, 1) if seconds > 0 else None,
+            'peak_rss_mb': None
+        })
+        results.extend(
+            {
+                'component': f"{layer}.{m['table_name']}",
+                'seconds': m['seconds'],
+                'rows': m['rows'],
+                'rows_per_sec': m['rows_per_sec'],
+                'peak_rss_mb': None
+            }
+            for m in models
+        )
+    return results
+
+
+def dbt_env():
+    """Connection settings read by the benchmark target in dbt/profiles.yml"""
+    return {
+        'WAREHOUSE_HOST': WAREHOUSE_CONN['host'],
+        'WAREHOUSE_PORT': str(WAREHOUSE_CONN['port']),
+        'WAREHOUSE_DB': WAREHOUSE_CONN['dbname'],
+        'WAREHOUSE_USER': WAREHOUSE_CONN['user'],
+        'WAREHOUSE_PASSWORD': WAREHOUSE_CONN['password']
+    }
+
+
+def reset_warehouse():
+    """Drop every pipeline schema and rerun warehouse-init.sql, so each scale factor starts empty"""
+    import psycopg2
+
+    conn = psycopg2.connect(**WAREHOUSE_CONN)
+    try:
+        with conn.cursor() as cursor:
+            cursor.execute(
+                "DROP SCHEMA IF EXISTS raw, staging, warehouse, marts, archive, monitoring, "
+                "test_failures, snapshots, seeds CASCADE"
+            )
+            with open(INIT_SQL) as f:
+                cursor.execute(f.read())
+        conn.commit()
+    finally:
+        conn.close()
+
+
+def summarize(samples):
+    """Median of repeated measurements of one component"""
+    summary = dict(samples[0])
+    for field in ('seconds', 'rows_per_sec', 'peak_rss_mb'):
+        values = [s[field] for s in samples if s[field] is not None]
+        summary[field] = round(statistics.median(values), 3) if values else None
+    summary['runs'] = len(samples)
+    return summary
+
+
+def compare(results, baseline, threshold_pct):
+    """Per-component change in seconds against a baseline results file"""
+    previous = {
+        (r['scale_factor'], r['stage'], r['component']): r for r in baseline['results']
+    }
+    comparison = []
+    for r in results:
+        base = previous.get((r['scale_factor'], r['stage'], r['component']))
+        if not base or not base['seconds'] or r['seconds'] is None:
+            continue
+        change_pct = round((r['seconds'] - base['seconds']) / base['seconds'] * 100, 1)
+        comparison.append({
+            'scale_factor': r['scale_factor'],
+            'stage': r['stage'],
+            'component': r['component'],
+            'baseline_seconds': base['seconds'],
+            'seconds': r['seconds'],
+            'change_pct': change_pct,
+            'regression': change_pct > threshold_pct
+        })
+    return comparison
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', 'HEAD'], cwd=PROJECT_DIR, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark generation, raw loading and dbt builds')
+    parser.add_argument('--scale-factors', type=float, nargs='+', default=[0.01, 0.1, 1.0])
+    parser.add_argument('--stages', nargs='+', choices=['generate', 'load', 'dbt'],
+                        default=['generate', 'load', 'dbt'])
+    parser.add_argument('--repeat', type=int, default=1,
+                        help='Runs per stage; the median is reported')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--format', choices=['csv', 'parquet'], default='csv')
+    parser.add_argument('--workers', type=int, default=None, help='Parallel COPY workers')
+    parser.add_argument('--memory-limit-mb', type=int, default=None)
+    parser.add_argument('--dbt-threads', type=int, default=None)
+    parser.add_argument('--dbt-layers', nargs='+', default=DBT_LAYERS)
+    parser.add_argument('--data-dir', default=None,
+                        help='Where datasets are generated (default: a temporary directory)')
+    parser.add_argument('--reset', action='store_true',
+                        help='Drop and re-initialize the pipeline schemas before each scale factor')
+    parser.add_argument('--output', default=None,
+                        help='Results file (default: benchmarks/results/<timestamp>.json)')
+    parser.add_argument('--baseline', default=None, help='Results file to compare against')
+    parser.add_argument('--threshold-pct', type=float, default=DEFAULT_THRESHOLD_PCT)
+    parser.add_argument('--fail-on-regression', action='store_true')
+    args = parser.parse_args()
+
+    if {'load', 'dbt'} & set(args.stages) and not args.reset:
+        print("⚠️  Without --reset, incremental warehouse state from earlier runs affects load and dbt timings")
+
+    data_root = args.data_dir or tempfile.mkdtemp(prefix='ecommerce-benchmark-')
+    created_at = datetime.now()
+    results = []
+    try:
+        for scale_factor in args.scale_factors:
+            print(f"\n=== Scale factor {scale_factor} ===")
+            data_dir = os.path.join(data_root, f'sf{scale_factor}')
+            samples = {}
+
+            for run in range(args.repeat):
+                if args.reset:
+                    reset_warehouse()
+                if 'generate' in args.stages or not os.path.isdir(data_dir):
+                    samples.setdefault('generate', []).append(
+                        run_in_child(generate_stage, scale_factor, data_dir, args.seed, args.format)
+                    )
+                if 'load' in args.stages:
+                    samples.setdefault('load', []).append(
+                        run_in_child(load_stage, data_dir, args.workers, args.memory_limit_mb)
+                    )
+                if 'dbt' in args.stages:
+                    samples.setdefault('dbt', []).append(dbt_stage(args.dbt_layers, args.dbt_threads))
+
+            for stage, runs in samples.items():
+                if stage not in args.stages:
+                    continue
+                components = {}
+                for run_results in runs:
+                    for r in run_results:
+                        components.setdefault(r['component'], []).append(r)
+                for component_samples in components.values():
+                    summary = summarize(component_samples)
+                    results.append({'scale_factor': scale_factor, 'stage': stage, **summary})
+                    print(f"{stage:>8} {summary['component']:<40} {summary['seconds']:>10}s "
+                          f"{summary['rows_per_sec'] or '':>14} rows/sec")
+    finally:
+        if not args.data_dir:
+            shutil.rmtree(data_root, ignore_errors=True)
+
+    report = {
+        'created_at': created_at.isoformat(sep=' '),
+        'git_commit': git_commit(),
+        'environment': {
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'cpu_count': os.cpu_count()
+        },
+        'config': {
+            'scale_factors': args.scale_factors,
+            'stages': args.stages,
+            'repeat': args.repeat,
+            'seed': args.seed,
+            'format': args.format,
+            'workers': args.workers,
+            'memory_limit_mb': args.memory_limit_mb,
+            'dbt_threads': args.dbt_threads,
+            'reset': args.reset
+        },
+        'results': results
+    }
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        report['baseline'] = {'file': args.baseline, 'git_commit': baseline.get('git_commit')}
+        report['comparison'] = compare(results, baseline, args.threshold_pct)
+        print(f"\n=== Compared with {args.baseline} ===")
+        for c in report['comparison']:
+            flag = '  REGRESSION' if c['regression'] else ''
+            print(f"sf{c['scale_factor']} {c['stage']:>8} {c['component']:<40} "
+                  f"{c['baseline_seconds']:>10}s -> {c['seconds']:>10}s ({c['change_pct']:+}%){flag}")
+
+    output = args.output or os.path.join(RESULTS_DIR, f"{created_at:%Y%m%dT%H%M%S}.json")
+    os.makedirs(os.path.dirname(output) or '.', exist_ok=True)
+    with open(output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"\nResults written to {output}")
+
+    if args.fail_on_regression and any(c['regression'] for c in report.get('comparison', [])):
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -3,49 +3,276 @@ import numpy as np
 from faker import Faker
 import random
 from datetime import datetime, timedelta
+from concurrent.futures import ProcessPoolExecutor
+import argparse
+import glob
+import json
 import os
+import resource
+import sys
+import time
+
+from value_factory import ValueFactory
+
+# The raw table schemas live with the loaders in the Airflow plugins package
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'airflow', 'plugins'))
+
+from ecommerce_etl.schema import apply_schema, arrow_schema, memory_mb
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # Parquet output is optional, CSV needs only pandas
+    pq = None
 
 fake = Faker()
 Faker.seed(42)
 np.random.seed(42)
 random.seed(42)
 
+# Upper bound of items per order; sharded runs reserve this many item IDs per order
+MAX_ITEMS_PER_ORDER = 5
+
+SHARDED_TABLES = ['customers', 'products', 'orders', 'order_items', 'web_events']
+
+# Rows generated and written per batch in streaming mode
+DEFAULT_BATCH_SIZE = 100000
+
+# Parquet output is partitioned by month of each table's load watermark column,
+# so incremental loads can skip whole partitions
+PARTITION_COLUMNS = {
+    'customers': 'registration_date',
+    'products': 'created_date',
+    'orders': 'updated_at',
+    'order_items': 'created_at',
+    'web_events': 'event_timestamp'
+}
+
+# Relative order frequency of a customer in each segment
+SEGMENT_ORDER_WEIGHTS = {'premium': 0.15, 'regular': 0.08, 'budget': 0.05}
+
+# Seasonal boost of daily order volume by month (holiday shopping, summer); other months 1.0
+MONTH_ORDER_WEIGHTS = {11: 1.5, 12: 1.5, 6: 1.2, 7: 1.2}
+
+ORDER_STATUSES = ['completed', 'cancelled', 'returned', 'shipped', 'pending']
+ORDER_STATUS_PROBS = [0.75, 0.10, 0.05, 0.08, 0.02]
+
+PAYMENT_METHODS = ['credit_card', 'debit_card', 'paypal', 'apple_pay', 'google_pay']
+PAYMENT_METHOD_PROBS = [0.45, 0.25, 0.15, 0.08, 0.07]
+
+SHIPPING_METHODS = ['standard', 'express', 'overnight', 'pickup']
+SHIPPING_METHOD_PROBS = [0.60, 0.25, 0.10, 0.05]
+
+def derive_seed(seed, *key):
+    """Derive an independent, reproducible 32-bit seed from a base seed and a key"""
+    return int(np.random.SeedSequence(seed, spawn_key=key).generate_state(1)[0])
+
+def seed_everything(seed):
+    """Seed every random source the generator draws from"""
+    Faker.seed(seed)
+    np.random.seed(seed)
+    random.seed(seed)
+
+def cumulative_probabilities(weights):
+    """Normalized cumulative distribution of non-negative weights, for draw_weighted"""
+    cdf = np.cumsum(np.asarray(weights, dtype=float))
+    return cdf / cdf[-1]
+
+def draw_weighted(cdf, size):
+    """Draw size indices distributed by a cumulative probability table"""
+    idx = np.searchsorted(cdf, np.random.random(size), side='right')
+    return np.minimum(idx, len(cdf) - 1)
+
+def split_range(total, parts):
+    """Split range(total) into `parts` contiguous (start, count) chunks"""
+    bounds = np.linspace(0, total, parts + 1).astype(int)
+    return [(int(start), int(end - start)) for start, end in zip(bounds[:-1], bounds[1:])]
+
+def clear_outputs(output_dir):
+    """Remove previous output of every table, in any layout"""
+    for table_name in SHARDED_TABLES:
+        stale_files = glob.glob(os.path.join(output_dir, f'{table_name}.csv'))
+        stale_files += glob.glob(os.path.join(output_dir, table_name, 'part-*.csv'))
+        stale_files += glob.glob(os.path.join(output_dir, table_name, 'month=*', 'part-*.parquet'))
+        for stale_file in stale_files:
+            os.remove(stale_file)
+
+def output_bytes(output_dir, table_name):
+    """Bytes on disk of a table's output, in any layout"""
+    single_file = os.path.join(output_dir, f'{table_name}.csv')
+    if os.path.isfile(single_file):
+        return os.path.getsize(single_file)
+    return sum(
+        os.path.getsize(os.path.join(root, name))
+        for root, _, names in os.walk(os.path.join(output_dir, table_name))
+        for name in names
+    )
+
+def write_generation_metrics(report_path, totals, output_dir, started_at, seconds):
+    """Append a 'generate' stage record per table, and one for the whole run, to a JSON Lines report
+    
+    Records carry the fields of the pipeline's stage metrics (see
+    ecommerce_etl.instrumentation). Tables are generated interleaved, so each
+    shares the run's wall time; peak RSS includes shard worker processes.
+    """
+    peak_rss_mb = round(max(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+                            resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss) / 1024, 1)
+    run_id = f"generate_{started_at:%Y%m%dT%H%M%S}"
+    
+    records = []
+    for table_name in [*totals, None]:
+        rows = totals[table_name] if table_name else sum(totals.values())
+        size = (output_bytes(output_dir, table_name) if table_name
+                else sum(output_bytes(output_dir, t) for t in totals))
+        records.append({
+            'run_id': run_id,
+            'stage': 'generate',
+            'table_name': table_name,
+            'status': 'success',
+            'started_at': started_at.isoformat(sep=' '),
+            'seconds': round(seconds, 3),
+            'rows': rows,
+            'bytes': size,
+            'rows_per_sec': round(rows / seconds, 1) if seconds > 0 else None,
+            'peak_rss_mb': peak_rss_mb,
+            'round_trips': None
+        })
+    
+    os.makedirs(os.path.dirname(report_path) or '.', exist_ok=True)
+    with open(report_path, 'a', encoding='utf-8') as f:
+        for record in records:
+            f.write(json.dumps(record) + '\n')
+    print(f"Wrote generation metrics to {report_path}")
+
+def open_writer(table_name, output_dir, file_format='csv', part=None):
+    """Open a batch writer for one table
+    
+    CSV goes to <table>.csv, or <table>/part-<part>.csv for shards; Parquet
+    always goes to <table>/month=YYYY-MM/part-<part>.parquet.
+    """
+    part_name = f'part-{part or 0:05d}'
+    if file_format == 'parquet':
+        return ParquetBatchWriter(table_name, os.path.join(output_dir, table_name), part_name)
+    if part is None:
+        return CsvBatchWriter(table_name, os.path.join(output_dir, f'{table_name}.csv'))
+    return CsvBatchWriter(table_name, os.path.join(output_dir, table_name, f'{part_name}.csv'))
+
+class CsvBatchWriter:
+    """Append DataFrame batches to one CSV file as they are produced, reporting throughput"""
+    
+    def __init__(self, table_name, file_path):
+        self.table_name = table_name
+        self.file_path = file_path
+        self.rows = 0
+        self._start = time.monotonic()
+        os.makedirs(os.path.dirname(file_path) or '.', exist_ok=True)
+    
+    def write(self, df):
+        """Write one batch, with the header only on the first"""
+        first = self.rows == 0
+        df.to_csv(self.file_path, mode='w' if first else 'a', header=first, index=False)
+        self.rows += len(df)
+        print(f"  {self.table_name}: {self.rows:,} rows written ({self.rows_per_sec():,.0f} rows/sec)")
+    
+    def rows_per_sec(self):
+        elapsed = time.monotonic() - self._start
+        return self.rows / elapsed if elapsed > 0 else 0.0
+    
+    def close(self):
+        """Report the final count and throughput for the table"""
+        elapsed = time.monotonic() - self._start
+        print(f"✓ Saved {self.table_name}: {self.rows:,} rows in {elapsed:.1f}s "
+              f"({self.rows_per_sec():,.0f} rows/sec)")
+        return self.rows
+
+class ParquetBatchWriter(CsvBatchWriter):
+    """Append DataFrame batches to typed, month-partitioned Parquet files
+    
+    Every batch becomes one row group per month it touches, written to
+    <table_dir>/month=YYYY-MM/<part_name>.parquet. Every file uses the
+    table's compact schema (dictionary-encoded categories, int32 IDs, date32
+    dates), whatever the values of a batch.
+    """
+    
+    def __init__(self, table_name, table_dir, part_name='part-00000'):
+        if pq is None:
+            raise ImportError("Parquet output requires pyarrow (pip install pyarrow)")
+        super().__init__(table_name, table_dir)
+        self.table_dir = table_dir
+        self.part_name = part_name
+        self.partition_column = PARTITION_COLUMNS[table_name]
+        self.schema = arrow_schema(table_name)
+        self._writers = {}
+    
+    def write(self, df):
+        """Write one batch, split by month of the partition column"""
+        table = pa.Table.from_pandas(df, schema=self.schema, preserve_index=False)
+        months = pd.to_datetime(df[self.partition_column]).dt.strftime('%Y-%m').fillna('unknown')
+        for month, positions in months.groupby(months.values).indices.items():
+            writer = self._writers.get(month)
+            if writer is None:
+                partition_dir = os.path.join(self.table_dir, f'month={month}')
+                os.makedirs(partition_dir, exist_ok=True)
+                writer = pq.ParquetWriter(
+                    os.path.join(partition_dir, f'{self.part_name}.parquet'), self.schema,
+                    compression='snappy', coerce_timestamps='us', allow_truncated_timestamps=True
+                )
+                self._writers[month] = writer
+            writer.write_table(table.take(pa.array(positions)))
+        self.rows += len(df)
+        print(f"  {self.table_name}: {self.rows:,} rows written to {len(self._writers)} partitions "
+              f"({self.rows_per_sec():,.0f} rows/sec)")
+    
+    def close(self):
+        for writer in self._writers.values():
+            writer.close()
+        return super().close()
+
 class EcommerceDataGenerator:
     def __init__(self):
         self.start_date = datetime(2022, 1, 1)
         self.end_date = datetime(2024, 12, 31)
-        
-    def generate_customers(self, num_customers=500000):  # Increased default
+        self.values = ValueFactory(fake)
+        
+        # Every calendar day orders can fall on, weighted by its month's seasonal boost
+        self.order_days = np.arange(np.datetime64(self.start_date, 'D'),
+                                    np.datetime64(self.end_date, 'D') + 1)
+        months = self.order_days.astype('datetime64[M]').astype(int) % 12 + 1
+        self.order_day_cdf = cumulative_probabilities(
+            [MONTH_ORDER_WEIGHTS.get(month, 1.0) for month in months]
+        )
+        
+    def customer_order_cdf(self, customers_df):
+        """Cumulative probability of each customer placing a given order, by segment"""
+        weights = customers_df['customer_segment'].map(SEGMENT_ORDER_WEIGHTS).astype(float).fillna(0.0)
+        return cumulative_probabilities(weights.values)
+        
+    def generate_customers(self, num_customers=500000, first_id=1):  # Increased default
         """Generate customer data with realistic demographics"""
-        customers = []
-        
-        for i in range(num_customers):
-            # Create customer segments
-            segment = np.random.choice(['premium', 'regular', 'budget'], 
-                                     p=[0.15, 0.60, 0.25])
-            
-            customer = {
-                'customer_id': i + 1,
-                'first_name': fake.first_name(),
-                'last_name': fake.last_name(),
-                'email': fake.email(),
-                'phone': fake.phone_number(),
-                'address': fake.address().replace('\n', ', '),
-                'city': fake.city(),
-                'state': fake.state_abbr(),
-                'zip_code': fake.zipcode(),
-                'country': 'USA',
-                'registration_date': fake.date_between(
-                    start_date=self.start_date, 
-                    end_date=self.end_date
-                ),
-                'customer_segment': segment,
-                'birth_date': fake.date_of_birth(minimum_age=18, maximum_age=80),
-                'gender': np.random.choice(['M', 'F', 'O'], p=[0.48, 0.48, 0.04])
-            }
-            customers.append(customer)
-        
-        return pd.DataFrame(customers)
+        values = self.values
+        
+        # Create customer segments
+        segments = np.random.choice(['premium', 'regular', 'budget'], size=num_customers,
+                                    p=[0.15, 0.60, 0.25])
+        
+        customer_ids = np.arange(first_id, first_id + num_customers)
+        
+        return apply_schema(pd.DataFrame({
+            'customer_id': customer_ids,
+            'first_name': values.sample('first_name', num_customers),
+            'last_name': values.sample('last_name', num_customers),
+            'email': values.emails(customer_ids),
+            'phone': values.sample('phone_number', num_customers),
+            'address': values.sample('address', num_customers),
+            'city': values.sample('city', num_customers),
+            'state': values.sample('state_abbr', num_customers),
+            'zip_code': values.sample('zipcode', num_customers),
+            'country': 'USA',
+            'registration_date': values.dates(self.start_date, self.end_date, num_customers),
+            'customer_segment': segments,
+            'birth_date': values.birth_dates(18, 80, num_customers),
+            'gender': np.random.choice(['M', 'F', 'O'], size=num_customers, p=[0.48, 0.48, 0.04])
+        }), 'customers')
     
     def generate_products(self, num_products=50000):  # Increased default
         """Generate product catalog with categories and pricing"""
@@ -95,163 +322,124 @@ class EcommerceDataGenerator:
             }
             products.append(product)
         
-        return pd.DataFrame(products)
+        return apply_schema(pd.DataFrame(products), 'products')
     
-    def generate_orders(self, customers_df, products_df, num_orders=5000000):  # Increased default
-        """Generate order data with realistic patterns"""
-        orders = []
-        
-        # Customer behavior patterns
-        customer_segments = customers_df.set_index('customer_id')['customer_segment'].to_dict()
-        
-        for i in range(num_orders):
-            # Select customer with segment-based probability
-            customer_id = np.random.choice(customers_df['customer_id'].values)
-            segment = customer_segments[customer_id]
-            
-            # Order frequency based on segment
-            if segment == 'premium':
-                order_prob = 0.15
-            elif segment == 'regular':
-                order_prob = 0.08
-            else:  # budget
-                order_prob = 0.05
-            
-            # Generate order date with seasonal patterns
-            order_date = fake.date_between(
-                start_date=self.start_date, 
-                end_date=self.end_date
-            )
-            
-            # Add seasonal boost (holiday shopping)
-            if order_date.month in [11, 12]:  # November, December
-                seasonal_boost = 1.5
-            elif order_date.month in [6, 7]:  # Summer
-                seasonal_boost = 1.2
-            else:
-                seasonal_boost = 1.0
-            
-            # Order status distribution
-            order_status = np.random.choice([
-                'completed', 'cancelled', 'returned', 'shipped', 'pending'
-            ], p=[0.75, 0.10, 0.05, 0.08, 0.02])
-            
-            order = {
-                'order_id': i + 1,
-                'customer_id': customer_id,
-                'order_date': order_date,
-                'order_status': order_status,
-                'payment_method': np.random.choice([
-                    'credit_card', 'debit_card', 'paypal', 'apple_pay', 'google_pay'
-                ], p=[0.45, 0.25, 0.15, 0.08, 0.07]),
-                'shipping_method': np.random.choice([
-                    'standard', 'express', 'overnight', 'pickup'
-                ], p=[0.60, 0.25, 0.10, 0.05]),
-                'shipping_cost': round(np.random.uniform(0, 25), 2),
-                'tax_amount': 0.0,  # Fixed: Initialize as float
-                'total_amount': 0.0,  # Fixed: Initialize as float
-                'currency': 'USD',
-                'created_at': fake.date_time_between(
-                    start_date=order_date, 
-                    end_date=order_date + timedelta(hours=1)
-                ),
-                'updated_at': fake.date_time_between(
-                    start_date=order_date, 
-                    end_date=order_date + timedelta(days=7)
-                )
-            }
-            orders.append(order)
-        
-        # Convert to DataFrame with proper dtypes
-        orders_df = pd.DataFrame(orders)
-        orders_df['tax_amount'] = orders_df['tax_amount'].astype(float)
-        orders_df['total_amount'] = orders_df['total_amount'].astype(float)
-        
-        return orders_df
+    def generate_orders(self, customers_df, products_df, num_orders=5000000, first_id=1,
+                        customer_cdf=None):  # Increased default
+        """Generate order data with realistic patterns
+        
+        Every column is drawn in bulk. Customers are picked in proportion to
+        their segment's order frequency and order dates in proportion to their
+        month's seasonal boost; pass customer_cdf (from customer_order_cdf) to
+        reuse the customer table across batches.
+        """
+        if customer_cdf is None:
+            customer_cdf = self.customer_order_cdf(customers_df)
+        customer_ids = customers_df['customer_id'].values[draw_weighted(customer_cdf, num_orders)]
+        order_days = self.order_days[draw_weighted(self.order_day_cdf, num_orders)]
+        
+        # Created within an hour of the order date starting, updated within a week
+        order_starts = order_days.astype('datetime64[us]')
+        created_offsets = np.random.randint(0, 3600 * 1_000_000 + 1, num_orders, dtype=np.int64)
+        updated_offsets = np.random.randint(0, 7 * 86400 * 1_000_000 + 1, num_orders, dtype=np.int64)
+        
+        return apply_schema(pd.DataFrame({
+            'order_id': np.arange(first_id, first_id + num_orders),
+            'customer_id': customer_ids,
+            'order_date': order_days,
+            'order_status': np.random.choice(ORDER_STATUSES, size=num_orders, p=ORDER_STATUS_PROBS),
+            'payment_method': np.random.choice(PAYMENT_METHODS, size=num_orders,
+                                               p=PAYMENT_METHOD_PROBS),
+            'shipping_method': np.random.choice(SHIPPING_METHODS, size=num_orders,
+                                                p=SHIPPING_METHOD_PROBS),
+            'shipping_cost': np.round(np.random.uniform(0, 25, num_orders), 2),
+            'tax_amount': np.zeros(num_orders),  # Backfilled with the order items
+            'total_amount': np.zeros(num_orders),
+            'currency': 'USD',
+            'created_at': order_starts + created_offsets.astype('timedelta64[us]'),
+            'updated_at': order_starts + updated_offsets.astype('timedelta64[us]')
+        }), 'orders')
     
-    def generate_order_items_optimized(self, orders_df, products_df):
-        """Generate order items with optimized approach"""
-        print("Generating order items (this may take a while for large datasets)...")
+    def generate_order_items_optimized(self, orders_df, products_df, first_id=1):
+        """Generate order items with a fully vectorized approach"""
+        print("Generating order items...")
         
-        # Pre-calculate everything we need
-        products_dict = products_df.set_index('product_id')[['price']].to_dict('index')
         product_ids = products_df['product_id'].values
+        product_prices = products_df['price'].values
+        num_orders = len(orders_df)
         
-        # Create arrays for vectorized operations
-        order_ids = orders_df['order_id'].values
-        order_created_at = orders_df['created_at'].values
-        
-        # Pre-generate all random choices for better performance
+        # Items per order, capped so every order can hold distinct products
         num_items_per_order = np.random.choice([1, 2, 3, 4, 5], 
-                                             size=len(orders_df), 
+                                             size=num_orders, 
                                              p=[0.50, 0.30, 0.12, 0.05, 0.03])
-        
-        order_items = []
-        order_totals = {}
-        
-        for idx, (order_id, created_at, num_items) in enumerate(zip(order_ids, order_created_at, num_items_per_order)):
-            # Select products for this order
-            selected_products = np.random.choice(product_ids, size=num_items, replace=False)
-            
-            order_total = 0
-            
-            for product_id in selected_products:
-                product = products_dict[product_id]
-                
-                # Quantity (1-3 for most items)
-                quantity = np.random.choice([1, 2, 3], p=[0.70, 0.20, 0.10])
-                
-                # Price with possible discounts
-                unit_price = product['price']
-                discount_amount = 0
-                if np.random.random() < 0.15:  # 15% chance of discount
-                    discount_pct = np.random.uniform(0.10, 0.30)
-                    discount_amount = unit_price * quantity * discount_pct
-                    unit_price = unit_price * (1 - discount_pct)
-                
-                line_total = round(unit_price * quantity, 2)
-                order_total += line_total
-                
-                order_item = {
-                    'order_item_id': len(order_items) + 1,
-                    'order_id': order_id,
-                    'product_id': product_id,
-                    'quantity': quantity,
-                    'unit_price': round(unit_price, 2),
-                    'line_total': line_total,
-                    'discount_amount': round(discount_amount, 2),
-                    'created_at': created_at
-                }
-                order_items.append(order_item)
-            
-            order_totals[order_id] = order_total
-            
-            # Print progress for large datasets
-            if idx % 100000 == 0 and idx > 0:
-                print(f"Processed {idx:,} orders...")
-        
-        # Update order totals efficiently
+        num_items_per_order = np.minimum(num_items_per_order, len(product_ids))
+        
+        # One row per item, pointing back at its order by position
+        order_idx = np.repeat(np.arange(num_orders), num_items_per_order)
+        num_items = len(order_idx)
+        
+        # Draw products for every item at once, then redraw repeats within an order
+        product_idx = np.random.randint(0, len(product_ids), size=num_items)
+        product_idx = self._redraw_duplicate_products(order_idx, product_idx, len(product_ids))
+        
+        # Quantity (1-3 for most items)
+        quantities = np.random.choice([1, 2, 3], size=num_items, p=[0.70, 0.20, 0.10])
+        
+        # Price with possible discounts (15% chance of a 10-30% discount)
+        base_prices = product_prices[product_idx]
+        has_discount = np.random.random(num_items) < 0.15
+        discount_pct = np.where(has_discount, np.random.uniform(0.10, 0.30, size=num_items), 0.0)
+        discount_amounts = base_prices * quantities * discount_pct
+        unit_prices = base_prices * (1 - discount_pct)
+        line_totals = np.round(unit_prices * quantities, 2)
+        
+        order_items_df = apply_schema(pd.DataFrame({
+            'order_item_id': np.arange(first_id, first_id + num_items),
+            'order_id': orders_df['order_id'].values[order_idx],
+            'product_id': product_ids[product_idx],
+            'quantity': quantities,
+            'unit_price': np.round(unit_prices, 2),
+            'line_total': line_totals,
+            'discount_amount': np.round(discount_amounts, 2),
+            'created_at': orders_df['created_at'].values[order_idx]
+        }), 'order_items')
+        
+        # Backfill order totals: one bincount pass and one column assignment each
         print("Updating order totals...")
         tax_rate = 0.08
-        
-        for order_id, subtotal in order_totals.items():
-            tax_amount = round(subtotal * tax_rate, 2)
-            shipping_cost = orders_df.loc[orders_df['order_id'] == order_id, 'shipping_cost'].iloc[0]
-            total_amount = round(subtotal + tax_amount + shipping_cost, 2)
-            
-            # Update using .loc to avoid the warning
-            orders_df.loc[orders_df['order_id'] == order_id, 'tax_amount'] = tax_amount
-            orders_df.loc[orders_df['order_id'] == order_id, 'total_amount'] = total_amount
-        
-        return pd.DataFrame(order_items)
+        subtotals = np.bincount(order_idx, weights=line_totals, minlength=num_orders)
+        tax_amounts = np.round(subtotals * tax_rate, 2)
+        orders_df['tax_amount'] = tax_amounts
+        orders_df['total_amount'] = np.round(
+            subtotals + tax_amounts + orders_df['shipping_cost'].values, 2
+        )
+        
+        return order_items_df
+    
+    def _redraw_duplicate_products(self, order_idx, product_idx, num_products):
+        """Redraw products repeated within the same order until each order's products are distinct"""
+        while True:
+            # Sort items by (order, product) so repeats become neighbours
+            order = np.lexsort((product_idx, order_idx))
+            sorted_orders = order_idx[order]
+            sorted_products = product_idx[order]
+            repeats = order[1:][(sorted_orders[1:] == sorted_orders[:-1]) & 
+                                (sorted_products[1:] == sorted_products[:-1])]
+            if len(repeats) == 0:
+                return product_idx
+            product_idx[repeats] = np.random.randint(0, num_products, size=len(repeats))
     
-    def generate_web_events(self, customers_df, products_df, num_events=25000000):  # Increased default
+    def generate_web_events(self, customers_df, products_df, num_events=25000000, first_id=1):  # Increased default
         """Generate web clickstream events with batch processing"""
         print("Generating web events in batches...")
         
-        events = []
-        batch_size = 1000000  # Process in batches of 1M
-        
+        batches = list(self.iter_web_events(customers_df, products_df, num_events, first_id))
+        return pd.concat(batches, ignore_index=True) if batches else pd.DataFrame()
+    
+    def iter_web_events(self, customers_df, products_df, num_events, first_id=1,
+                        batch_size=1000000):  # Process in batches of 1M
+        """Yield web clickstream events as one DataFrame per batch"""
+        values = self.values
         customer_ids = customers_df['customer_id'].values
         product_ids = products_df['product_id'].values
         
@@ -267,55 +455,97 @@ class EcommerceDataGenerator:
             
             # Generate batch data
             logged_in_mask = np.random.random(batch_size_actual) < 0.3
-            customer_ids_batch = np.where(logged_in_mask, 
-                                        np.random.choice(customer_ids, batch_size_actual),
-                                        None)
+            customer_ids_batch = pd.arrays.IntegerArray(
+                np.random.choice(customer_ids, batch_size_actual).astype('int64'), ~logged_in_mask
+            )
             user_types = np.where(logged_in_mask, 'registered', 'anonymous')
             
             event_types_batch = np.random.choice(event_types, size=batch_size_actual, p=event_probs)
             
             # Generate product interactions
             product_interaction_mask = np.isin(event_types_batch, ['page_view', 'add_to_cart', 'remove_from_cart'])
-            product_ids_batch = np.where(product_interaction_mask,
-                                       np.random.choice(product_ids, batch_size_actual),
-                                       None)
-            
-            # Generate timestamps
-            timestamps = [fake.date_time_between(start_date=self.start_date, end_date=self.end_date) 
-                         for _ in range(batch_size_actual)]
+            product_ids_batch = pd.arrays.IntegerArray(
+                np.random.choice(product_ids, batch_size_actual).astype('int64'), ~product_interaction_mask
+            )
             
-            for i in range(batch_size_actual):
-                event = {
-                    'event_id': batch_start + i + 1,
-                    'customer_id': customer_ids_batch[i],
-                    'session_id': fake.uuid4(),
-                    'event_type': event_types_batch[i],
-                    'product_id': product_ids_batch[i],
-                    'event_timestamp': timestamps[i],
-                    'user_agent': fake.user_agent(),
-                    'ip_address': fake.ipv4(),
-                    'referrer': fake.url() if np.random.random() < 0.6 else None,
-                    'page_url': fake.url(),
-                    'user_type': user_types[i],
-                    'device_type': np.random.choice(['desktop', 'mobile', 'tablet'], p=[0.45, 0.45, 0.10]),
-                    'country': fake.country_code(),
-                    'city': fake.city()
-                }
-                events.append(event)
-        
-        return pd.DataFrame(events)
+            # Free text is sampled from Faker pools, identifiers and timestamps synthesized in bulk
+            has_referrer = np.random.random(batch_size_actual) < 0.6
+            yield apply_schema(pd.DataFrame({
+                'event_id': np.arange(first_id + batch_start, first_id + batch_end),
+                'customer_id': customer_ids_batch,
+                'session_id': values.uuid4(batch_size_actual),
+                'event_type': event_types_batch,
+                'product_id': product_ids_batch,
+                'event_timestamp': values.timestamps(self.start_date, self.end_date, batch_size_actual),
+                'user_agent': values.sample('user_agent', batch_size_actual),
+                'ip_address': values.ipv4(batch_size_actual),
+                'referrer': np.where(has_referrer, values.sample('url', batch_size_actual), None),
+                'page_url': values.sample('url', batch_size_actual),
+                'user_type': user_types,
+                'device_type': np.random.choice(['desktop', 'mobile', 'tablet'], size=batch_size_actual,
+                                                p=[0.45, 0.45, 0.10]),
+                'country': values.sample('country_code', batch_size_actual),
+                'city': values.sample('city', batch_size_actual)
+            }), 'web_events')
+    
+    def iter_orders_with_items(self, customers_df, products_df, num_orders, first_id=1,
+                               first_item_id=1, batch_size=DEFAULT_BATCH_SIZE):
+        """Yield (orders_df, order_items_df) batches with order totals already backfilled"""
+        next_item_id = first_item_id
+        customer_cdf = self.customer_order_cdf(customers_df)
+        for batch_start in range(0, num_orders, batch_size):
+            batch_orders = min(batch_size, num_orders - batch_start)
+            orders_df = self.generate_orders(customers_df, products_df, batch_orders,
+                                             first_id=first_id + batch_start,
+                                             customer_cdf=customer_cdf)
+            order_items_df = self.generate_order_items_optimized(orders_df, products_df,
+                                                                 first_id=next_item_id)
+            next_item_id += len(order_items_df)
+            yield orders_df, order_items_df
+    
+    def stream_tables(self, products_df, num_customers, num_orders, num_events, writers,
+                      first_customer_id=1, first_order_id=1, first_item_id=1, first_event_id=1,
+                      batch_size=DEFAULT_BATCH_SIZE):
+        """Generate customers, orders, order items and events batch by batch straight to disk
+        
+        Each batch is handed to writers[table] as soon as it is produced, so
+        memory stays bounded by the batch size; only customer IDs and segments
+        are kept to drive order and event generation.
+        """
+        print("Streaming customers...")
+        customer_keys = []
+        for start in range(0, num_customers, batch_size):
+            customers_df = self.generate_customers(min(batch_size, num_customers - start),
+                                                   first_id=first_customer_id + start)
+            writers['customers'].write(customers_df)
+            customer_keys.append(customers_df[['customer_id', 'customer_segment']])
+        customers_df = pd.concat(customer_keys, ignore_index=True)
+        
+        print("Streaming orders and order items...")
+        for orders_df, order_items_df in self.iter_orders_with_items(
+                customers_df, products_df, num_orders, first_order_id, first_item_id, batch_size):
+            writers['orders'].write(orders_df)
+            writers['order_items'].write(order_items_df)
+        
+        print("Streaming web events...")
+        for web_events_df in self.iter_web_events(customers_df, products_df, num_events,
+                                                  first_event_id, batch_size):
+            writers['web_events'].write(web_events_df)
+        
+        return {table_name: writer.close() for table_name, writer in writers.items()}
     
-    def save_data(self, data_dict, output_dir='data'):
-        """Save all generated data to CSV files"""
+    def save_data(self, data_dict, output_dir='data', file_format='csv'):
+        """Save all generated data to CSV or partitioned Parquet files"""
         os.makedirs(output_dir, exist_ok=True)
+        clear_outputs(output_dir)
         
         for table_name, df in data_dict.items():
-            file_path = os.path.join(output_dir, f'{table_name}.csv')
-            print(f"Saving {len(df):,} records to {file_path}...")
-            df.to_csv(file_path, index=False)
-            print(f"✓ Saved {table_name}")
+            writer = open_writer(table_name, output_dir, file_format)
+            print(f"Saving {len(df):,} records to {writer.file_path}...")
+            writer.write(df)
+            writer.close()
     
-    def generate_all_data(self, scale_factor=1.0):
+    def generate_all_data(self, scale_factor=1.0, output_dir='data', file_format='csv'):
         """Generate complete ecommerce dataset with configurable scale"""
         base_customers = int(500000 * scale_factor)
         base_products = int(50000 * scale_factor)
@@ -349,7 +579,7 @@ class EcommerceDataGenerator:
         }
         
         print("\nSaving data...")
-        self.save_data(data_dict)
+        self.save_data(data_dict, output_dir, file_format)
         
         # Print summary statistics
         print("\n=== Data Generation Summary ===")
@@ -357,13 +587,149 @@ class EcommerceDataGenerator:
         for table_name, df in data_dict.items():
             records = len(df)
             total_records += records
-            print(f"{table_name}: {records:,} records")
+            print(f"{table_name}: {records:,} records ({memory_mb(df):,} MB in memory)")
         
         print(f"\nTotal records generated: {total_records:,}")
         
         return data_dict
 
+    def generate_all_data_streaming(self, scale_factor=1.0, output_dir='data',
+                                    batch_size=DEFAULT_BATCH_SIZE, file_format='csv'):
+        """Generate the dataset with every batch written to disk as soon as it is produced"""
+        base_customers = int(500000 * scale_factor)
+        base_products = int(50000 * scale_factor)
+        base_orders = int(5000000 * scale_factor)
+        base_events = int(25000000 * scale_factor)
+        
+        print(f"Streaming dataset with scale factor {scale_factor}x in batches of {batch_size:,}")
+        print(f"Target: {base_customers:,} customers, {base_products:,} products, {base_orders:,} orders, {base_events:,} events")
+        os.makedirs(output_dir, exist_ok=True)
+        clear_outputs(output_dir)
+        
+        print("\nGenerating products...")
+        products_df = self.generate_products(base_products)
+        products_writer = open_writer('products', output_dir, file_format)
+        products_writer.write(products_df)
+        products_rows = products_writer.close()
+        
+        writers = {table_name: open_writer(table_name, output_dir, file_format)
+                   for table_name in SHARDED_TABLES if table_name != 'products'}
+        totals = self.stream_tables(products_df, base_customers, base_orders, base_events,
+                                    writers, batch_size=batch_size)
+        totals['products'] = products_rows
+        
+        # Print summary statistics
+        print("\n=== Data Generation Summary ===")
+        for table_name in SHARDED_TABLES:
+            print(f"{table_name}: {totals[table_name]:,} records")
+        print(f"\nTotal records generated: {sum(totals.values()):,}")
+        
+        return totals
+
+    def generate_all_data_sharded(self, scale_factor=1.0, num_shards=8, workers=None,
+                                  output_dir='data', seed=42, file_format='csv'):
+        """Generate the dataset in ID-range shards across a process pool
+        
+        Customers, orders and web events are split into num_shards contiguous ID
+        ranges; each shard's orders and events reference its own customers.
+        Products are generated once and shared. Every shard reseeds from a seed
+        derived from (seed, shard index), so output only depends on seed and
+        num_shards, never on the number of workers. Each shard writes
+        <output_dir>/<table>/part-<shard>.csv (or the matching part in every
+        Parquet month partition) for the loaders to pick up.
+        """
+        base_customers = int(500000 * scale_factor)
+        base_products = int(50000 * scale_factor)
+        base_orders = int(5000000 * scale_factor)
+        base_events = int(25000000 * scale_factor)
+        workers = workers or os.cpu_count()
+        
+        if base_customers < num_shards:
+            raise ValueError(f"{num_shards} shards need at least {num_shards} customers, got {base_customers}")
+        
+        print(f"Generating dataset with scale factor {scale_factor}x in {num_shards} shards on {workers} workers")
+        print(f"Target: {base_customers:,} customers, {base_products:,} products, {base_orders:,} orders, {base_events:,} events")
+        
+        # Replace previous output of every table, sharded or not
+        clear_outputs(output_dir)
+        
+        print("\nGenerating products...")
+        seed_everything(derive_seed(seed, 0))
+        products_df = self.generate_products(base_products)
+        products_writer = open_writer('products', output_dir, file_format, part=0)
+        products_writer.write(products_df)
+        products_writer.close()
+        
+        shard_args = [
+            (shard, derive_seed(seed, 1, shard), customers, orders, events, products_df, output_dir,
+             file_format)
+            for shard, customers, orders, events in zip(
+                range(num_shards),
+                split_range(base_customers, num_shards),
+                split_range(base_orders, num_shards),
+                split_range(base_events, num_shards)
+            )
+        ]
+        
+        print(f"Generating {num_shards} shards...")
+        totals = {'products': len(products_df)}
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            for counts in executor.map(generate_shard, shard_args):
+                for table_name, records in counts.items():
+                    totals[table_name] = totals.get(table_name, 0) + records
+        
+        # Print summary statistics
+        print("\n=== Data Generation Summary ===")
+        for table_name in SHARDED_TABLES:
+            print(f"{table_name}: {totals.get(table_name, 0):,} records")
+        print(f"\nTotal records generated: {sum(totals.values()):,}")
+        
+        return totals
+
+def generate_shard(args):
+    """Generate and write one ID-range shard; runs in a worker process"""
+    shard, shard_seed, customers, orders, events, products_df, output_dir, file_format = args
+    (first_customer, num_customers), (first_order, num_orders), (first_event, num_events) = (
+        customers, orders, events
+    )
+    seed_everything(shard_seed)
+    generator = EcommerceDataGenerator()
+    
+    writers = {table_name: open_writer(table_name, output_dir, file_format, part=shard)
+               for table_name in SHARDED_TABLES if table_name != 'products'}
+    # Item IDs are reserved per order so shards never collide
+    counts = generator.stream_tables(
+        products_df, num_customers, num_orders, num_events, writers,
+        first_customer_id=first_customer + 1,
+        first_order_id=first_order + 1,
+        first_item_id=first_order * MAX_ITEMS_PER_ORDER + 1,
+        first_event_id=first_event + 1
+    )
+    print(f"✓ Shard {shard} written")
+    
+    return counts
+
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Generate synthetic e-commerce data')
+    parser.add_argument('--scale-factor', type=float, default=0.1)
+    parser.add_argument('--shards', type=int, default=0,
+                        help='Split generation into this many ID-range shards (0 = single process)')
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--streaming', action='store_true',
+                        help='Write every batch to disk as soon as it is generated')
+    parser.add_argument('--batch-size', type=int, default=DEFAULT_BATCH_SIZE)
+    parser.add_argument('--format', choices=['csv', 'parquet'], default='csv',
+                        help='parquet writes typed files partitioned by month (needs pyarrow)')
+    parser.add_argument('--output-dir', default='data')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--metrics-report', default=None,
+                        help='JSON Lines file to append stage metrics to '
+                             '(default: <output-dir>/generation_metrics.jsonl)')
+    args = parser.parse_args()
+    
+    started_at = datetime.now()
+    start = time.monotonic()
+    
     generator = EcommerceDataGenerator()
     
     # Generate massive dataset - adjust scale_factor as needed
@@ -371,4 +737,28 @@ if __name__ == "__main__":
     # scale_factor=2.0 = ~60M total records
     # scale_factor=0.1 = ~3M total records (for testing)
     
-    data = generator.generate_all_data(scale_factor=0.1)  # Generate 2x the base amount
\ No newline at end of file
+    if args.shards > 0:
+        totals = generator.generate_all_data_sharded(
+            scale_factor=args.scale_factor,
+            num_shards=args.shards,
+            workers=args.workers,
+            output_dir=args.output_dir,
+            seed=args.seed,
+            file_format=args.format
+        )
+    elif args.streaming:
+        totals = generator.generate_all_data_streaming(
+            scale_factor=args.scale_factor,
+            output_dir=args.output_dir,
+            batch_size=args.batch_size,
+            file_format=args.format
+        )
+    else:
+        data = generator.generate_all_data(scale_factor=args.scale_factor, output_dir=args.output_dir,
+                                           file_format=args.format)
+        totals = {table_name: len(df) for table_name, df in data.items()}
+    
+    write_generation_metrics(
+        args.metrics_report or os.path.join(args.output_dir, 'generation_metrics.jsonl'),
+        totals, args.output_dir, started_at, time.monotonic() - start
+    )
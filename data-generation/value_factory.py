@@ -0,0 +1,92 @@
+import numpy as np
+from datetime import date
+
+# Distinct values drawn from Faker per pool; sampling by index reuses them
+DEFAULT_POOL_SIZE = 10000
+
+HEX_DIGITS = np.frombuffer(b'0123456789abcdef', dtype=np.uint8)
+
+# Offsets in the 32 hex digits of a UUID before which a dash goes
+UUID_DASH_OFFSETS = [8, 12, 16, 20]
+
+OCTETS = np.array([str(i) for i in range(256)], dtype=object)
+
+# Pools whose values need post-processing rather than a bare Faker call
+POOL_BUILDERS = {
+    'address': lambda faker: faker.address().replace('\n', ', ')
+}
+
+class ValueFactory:
+    """Vectorized column synthesis for high-volume generator tables
+
+    Free-text columns are sampled by index from pools of realistic values
+    drawn from Faker once per pool; UUIDs, IPv4 addresses, dates and timestamps
+    are built directly from numpy random arrays. Every draw uses numpy's
+    global random state (and Faker's for pools), so seeding both keeps output
+    reproducible.
+    """
+
+    def __init__(self, faker, pool_size=DEFAULT_POOL_SIZE):
+        self.faker = faker
+        self.pool_size = pool_size
+        self._pools = {}
+
+    def pool(self, name):
+        """Return the value pool for a Faker provider method, building it on first use"""
+        if name not in self._pools:
+            make = POOL_BUILDERS.get(name, lambda faker: getattr(faker, name)())
+            self._pools[name] = np.array([make(self.faker) for _ in range(self.pool_size)],
+                                         dtype=object)
+        return self._pools[name]
+
+    def sample(self, name, size):
+        """Draw size values from a pool uniformly at random"""
+        pool = self.pool(name)
+        return pool[np.random.randint(0, len(pool), size)]
+
+    def emails(self, ids):
+        """Compose one user.<id>@domain address per id from user name and domain pools
+
+        The pools alone repeat addresses once a table outgrows them; the id
+        suffix keeps every address unique.
+        """
+        ids = np.asarray(ids).astype(str).astype(object)
+        return (self.sample('user_name', len(ids)) + '.' + ids + '@'
+                + self.sample('free_email_domain', len(ids)))
+
+    def uuid4(self, size):
+        """Random version 4 UUID strings"""
+        raw = np.random.randint(0, 256, size=(size, 16), dtype=np.uint8)
+        raw[:, 6] = (raw[:, 6] & 0x0F) | 0x40  # version 4
+        raw[:, 8] = (raw[:, 8] & 0x3F) | 0x80  # RFC 4122 variant
+
+        digits = np.empty((size, 32), dtype=np.uint8)
+        digits[:, 0::2] = HEX_DIGITS[raw >> 4]
+        digits[:, 1::2] = HEX_DIGITS[raw & 0x0F]
+        text = np.insert(digits, UUID_DASH_OFFSETS, ord('-'), axis=1)
+        return np.ascontiguousarray(text).view('S36').ravel().astype('U36').astype(object)
+
+    def ipv4(self, size):
+        """Random dotted-quad IPv4 addresses outside the multicast and reserved ranges"""
+        first = np.random.randint(1, 224, size)
+        rest = np.random.randint(0, 256, size=(3, size))
+        return OCTETS[first] + '.' + OCTETS[rest[0]] + '.' + OCTETS[rest[1]] + '.' + OCTETS[rest[2]]
+
+    def timestamps(self, start, end, size):
+        """Uniform microsecond timestamps between two datetimes"""
+        span_us = int((end - start).total_seconds() * 1_000_000)
+        offsets = np.random.randint(0, span_us + 1, size, dtype=np.int64)
+        return np.datetime64(start, 'us') + offsets.astype('timedelta64[us]')
+
+    def dates(self, start, end, size):
+        """Uniform dates between two dates or datetimes, as datetime64[D]"""
+        start_day = np.datetime64(start, 'D')
+        span_days = int((np.datetime64(end, 'D') - start_day).astype(int))
+        days = start_day + np.random.randint(0, span_days + 1, size).astype('timedelta64[D]')
+        return days
+
+    def birth_dates(self, minimum_age, maximum_age, size):
+        """Dates of birth for ages in [minimum_age, maximum_age], as Faker's date_of_birth (datetime64[D])"""
+        today = np.datetime64(date.today(), 'D')
+        ages_days = np.random.randint(int(minimum_age * 365.25), int((maximum_age + 1) * 365.25), size)
+        return today - ages_days.astype('timedelta64[D]')
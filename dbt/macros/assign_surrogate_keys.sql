@@ -0,0 +1,26 @@
+{% macro assign_surrogate_keys(source_relation, business_key, surrogate_key) -%}
+
+    {#- Append new business keys to a key map, numbering them after the current maximum surrogate key -#}
+    WITH new_keys AS (
+        SELECT DISTINCT s.{{ business_key }}
+        FROM {{ source_relation }} s
+        WHERE s.{{ business_key }} IS NOT NULL
+        {% if is_incremental() %}
+            AND NOT EXISTS (
+                SELECT 1 FROM {{ this }} k WHERE k.{{ business_key }} = s.{{ business_key }}
+            )
+        {% endif %}
+    )
+
+    SELECT
+        (
+            {% if is_incremental() %}
+            (SELECT COALESCE(MAX({{ surrogate_key }}), 0) FROM {{ this }}) +
+            {% endif %}
+            ROW_NUMBER() OVER (ORDER BY {{ business_key }})
+        )::INTEGER AS {{ surrogate_key }},
+        {{ business_key }},
+        CURRENT_TIMESTAMP AS assigned_at
+    FROM new_keys
+
+{%- endmacro %}
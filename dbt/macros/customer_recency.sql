@@ -0,0 +1,21 @@
+{% macro customer_recency_columns(total_orders, total_spent, last_order_date) -%}
+
+    {#- Recency-dependent customer fields, derived when queried so they never go stale -#}
+    CURRENT_DATE - {{ last_order_date }} AS days_since_last_order,
+    
+    CASE 
+        WHEN {{ total_orders }} = 0 THEN 0
+        WHEN {{ last_order_date }} IS NULL THEN {{ total_spent }}
+        WHEN CURRENT_DATE - {{ last_order_date }} <= {{ var('customer_churn_days') }} THEN 
+            {{ total_spent }} * (1 + ({{ total_orders }} * 0.1))
+        ELSE {{ total_spent }} * 0.8
+    END AS customer_lifetime_value,
+    
+    CASE 
+        WHEN {{ total_orders }} = 0 THEN 'Prospect'
+        WHEN CURRENT_DATE - {{ last_order_date }} <= 30 THEN 'Active'
+        WHEN CURRENT_DATE - {{ last_order_date }} <= {{ var('customer_churn_days') }} THEN 'At Risk'
+        ELSE 'Churned'
+    END AS customer_status
+
+{%- endmacro %}
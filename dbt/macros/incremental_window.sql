@@ -0,0 +1,11 @@
+{% macro incremental_window(date_columns) -%}
+
+    {#- Rows of an incremental run: any of date_columns falls within the start_date/end_date vars -#}
+    (
+    {%- for column in date_columns %}
+        {{ column }}::DATE BETWEEN '{{ var("start_date") }}'::DATE AND '{{ var("end_date") }}'::DATE
+        {%- if not loop.last %} OR{% endif %}
+    {%- endfor %}
+    )
+
+{%- endmacro %}
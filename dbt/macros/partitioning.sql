@@ -0,0 +1,42 @@
+{% macro partition_window(column, lookback_days=0) -%}
+
+    {#- Literal date bounds of the run window, so the planner prunes partitions (including for DELETE) -#}
+    {{ column }} >= '{{ var("start_date") }}'::DATE - {{ lookback_days }}
+    AND {{ column }} < '{{ var("end_date") }}'::DATE + 1
+
+{%- endmacro %}
+
+
+{% macro ensure_window_partitions(relation, lookback_days=0) -%}
+
+    {#- Create the monthly partitions an incremental run of a partitioned model writes to -#}
+    SELECT public.ensure_monthly_partitions(
+        '{{ relation.schema }}.{{ relation.identifier }}',
+        '{{ var("start_date") }}'::DATE - {{ lookback_days }},
+        '{{ var("end_date") }}'::DATE + 90
+    )
+
+{%- endmacro %}
+
+
+{% macro split_default_partition(relation) -%}
+
+    SELECT public.split_default_partition('{{ relation.schema }}.{{ relation.identifier }}')
+
+{%- endmacro %}
+
+
+{% macro is_window_run() %}
+
+    {#- Incremental run limited to the start_date/end_date window: not on the first build of a
+        model, into an empty table, or when the full_reload var asks for every row -#}
+    {%- if not is_incremental() or var('full_reload', false) -%}
+        {{ return(false) }}
+    {%- endif -%}
+    {%- if execute -%}
+        {%- set result = run_query('SELECT EXISTS (SELECT 1 FROM ' ~ this ~ ')') -%}
+        {{ return(result.columns[0].values()[0]) }}
+    {%- endif -%}
+    {{ return(true) }}
+
+{% endmacro %}
@@ -0,0 +1,32 @@
+{% macro session_rebuild_start(sessions_relation) -%}
+
+    {#- Where an incremental run starts re-reading events: session_lookback_days before the window,
+        or earlier if a session of sessions_relation was still open there, so that session is
+        rebuilt from its first event and keeps its session_id -#}
+    LEAST(
+        '{{ var("start_date") }}'::DATE - {{ var('session_lookback_days') }},
+        (
+            SELECT MIN(session_start)
+            FROM {{ sessions_relation }}
+            WHERE session_end >= '{{ var("start_date") }}'::DATE - {{ var('session_lookback_days') }}
+                - INTERVAL '{{ var("session_timeout_minutes") }} minutes'
+        )
+    )
+
+{%- endmacro %}
+
+
+{% macro delete_superseded_sessions(relation) -%}
+
+    {#- Drop sessions overlapping a newer session of the same visitor: a session that new events
+        merged into the one before it, or a truncated copy an earlier run left behind -#}
+    DELETE FROM {{ relation }} stale
+    USING {{ relation }} fresh
+    WHERE fresh.session_end >= '{{ var("start_date") }}'::DATE
+        AND stale.visitor_key = fresh.visitor_key
+        AND stale.session_id <> fresh.session_id
+        AND stale.session_start <= fresh.session_end
+        AND stale.session_end >= fresh.session_start
+        AND stale.dbt_updated_at < fresh.dbt_updated_at
+
+{%- endmacro %}
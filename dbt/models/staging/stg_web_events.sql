@@ -0,0 +1,30 @@
+{{ config(
+    materialized='view'
+) }}
+
+-- Clickstream events with the key sessions are built on. A view, so window predicates on
+-- event_timestamp reach raw.web_events and prune its monthly partitions.
+
+SELECT 
+    event_id,
+    customer_id,
+    event_type,
+    product_id,
+    event_timestamp,
+    
+    -- Logged-in visitors are followed across devices; anonymous ones by IP and user agent
+    CASE 
+        WHEN customer_id IS NOT NULL THEN 'c' || customer_id
+        ELSE MD5(COALESCE(ip_address, '') || '|' || COALESCE(user_agent, ''))
+    END AS visitor_key,
+    
+    user_type,
+    device_type,
+    referrer,
+    page_url,
+    country,
+    loaded_at
+FROM {{ source('raw', 'web_events') }}
+WHERE event_id IS NOT NULL
+    AND event_timestamp IS NOT NULL
+    AND event_type IS NOT NULL
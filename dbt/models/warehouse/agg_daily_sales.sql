@@ -0,0 +1,152 @@
+{{ config(
+    materialized='incremental',
+    incremental_strategy='delete+insert',
+    unique_key='order_date',
+    indexes=[
+      {'columns': ['order_date'], 'unique': True},
+      {'columns': ['date_key']}
+    ],
+    post_hook=[
+      "DELETE FROM {{ this }} d
+       WHERE {{ partition_window('d.order_date', var('order_update_lag_days')) }}
+           AND NOT EXISTS (SELECT 1 FROM {{ ref('fact_orders') }} fo WHERE fo.order_date = d.order_date)"
+    ]
+) }}
+
+-- Persisted per-day sales totals, the base of the period rollups and the sales_summary mart.
+-- Incremental runs recompute only the affected days, reading just those days' orders: days of
+-- orders placed or updated in the run window, and stored days whose totals no longer match
+-- fact_orders because orders moved to another date; days left without orders are deleted
+-- after the run. Items are summed per order before joining, so order-level amounts are
+-- never repeated once per item. Each day also keeps HyperLogLog sketches of its
+-- customers and products (see macros/hll.sql), which merge into distinct counts for any range.
+
+WITH affected_dates AS (
+    SELECT DISTINCT fo.order_date
+    FROM {{ ref('fact_orders') }} fo
+    {% if is_window_run() %}
+    WHERE {{ partition_window('fo.order_date', var('order_update_lag_days')) }}
+        AND {{ incremental_window(['fo.order_date', 'fo.updated_at']) }}
+
+    UNION
+
+    -- Days an updated order left: restated orders can only have moved within the update lag
+    SELECT d.order_date
+    FROM {{ this }} d
+    LEFT JOIN (
+        SELECT order_date, COUNT(*) AS total_orders, SUM(total_amount) AS total_revenue
+        FROM {{ ref('fact_orders') }}
+        WHERE {{ partition_window('order_date', var('order_update_lag_days')) }}
+        GROUP BY order_date
+    ) f ON d.order_date = f.order_date
+    WHERE {{ partition_window('d.order_date', var('order_update_lag_days')) }}
+        AND (f.total_orders IS DISTINCT FROM d.total_orders
+             OR f.total_revenue IS DISTINCT FROM d.total_revenue)
+    {% endif %}
+),
+
+orders AS (
+    SELECT
+        fo.order_key,
+        fo.order_date,
+        fo.customer_key,
+        fo.order_status,
+        fo.payment_method,
+        fo.total_amount,
+        fo.subtotal_amount,
+        fo.tax_amount,
+        fo.shipping_cost
+    FROM {{ ref('fact_orders') }} fo
+    {% if is_window_run() %}
+    WHERE {{ partition_window('fo.order_date', var('order_update_lag_days')) }}
+        AND fo.order_date IN (SELECT order_date FROM affected_dates)
+    {% endif %}
+),
+
+order_items AS (
+    SELECT
+        o.order_date,
+        foi.order_key,
+        foi.product_key,
+        foi.quantity
+    FROM {{ ref('fact_order_items') }} foi
+    INNER JOIN orders o ON foi.order_key = o.order_key
+),
+
+daily_orders AS (
+    SELECT
+        order_date,
+        COUNT(*) AS total_orders,
+        COUNT(DISTINCT customer_key) AS unique_customers,
+        SUM(total_amount) AS total_revenue,
+        SUM(subtotal_amount) AS subtotal_revenue,
+        SUM(tax_amount) AS total_tax,
+        SUM(shipping_cost) AS total_shipping,
+
+        -- Payment method distribution
+        COUNT(*) FILTER (WHERE payment_method = 'credit_card') AS credit_card_orders,
+        COUNT(*) FILTER (WHERE payment_method = 'debit_card') AS debit_card_orders,
+        COUNT(*) FILTER (WHERE payment_method = 'paypal') AS paypal_orders,
+
+        -- Order status distribution
+        COUNT(*) FILTER (WHERE order_status = 'completed') AS completed_orders,
+        COUNT(*) FILTER (WHERE order_status = 'cancelled') AS cancelled_orders,
+        COUNT(*) FILTER (WHERE order_status = 'returned') AS returned_orders
+    FROM orders
+    GROUP BY order_date
+),
+
+daily_items AS (
+    SELECT
+        order_date,
+        SUM(quantity) AS total_items_sold,
+        COUNT(DISTINCT product_key) AS unique_products_sold
+    FROM order_items
+    GROUP BY order_date
+),
+
+daily_customer_sketches AS (
+    {{ hll_sketch('orders', 'order_date', 'customer_key') }}
+),
+
+daily_product_sketches AS (
+    {{ hll_sketch('order_items', 'order_date', 'product_key') }}
+)
+
+SELECT
+    dd.date_key,
+    o.order_date,
+    dd.is_weekend,
+    dd.is_holiday,
+
+    -- Order metrics
+    o.total_orders,
+    o.unique_customers,
+
+    -- Revenue metrics
+    o.total_revenue,
+    o.subtotal_revenue,
+    o.total_tax,
+    o.total_shipping,
+
+    -- Product metrics
+    COALESCE(i.total_items_sold, 0) AS total_items_sold,
+    COALESCE(i.unique_products_sold, 0) AS unique_products_sold,
+
+    o.credit_card_orders,
+    o.debit_card_orders,
+    o.paypal_orders,
+    o.completed_orders,
+    o.cancelled_orders,
+    o.returned_orders,
+
+    -- Distinct-count sketches, merged by the period rollups
+    cs.sketch AS customer_hll,
+    ps.sketch AS product_hll,
+
+    CURRENT_TIMESTAMP AS dbt_updated_at
+FROM daily_orders o
+LEFT JOIN daily_items i ON o.order_date = i.order_date
+LEFT JOIN daily_customer_sketches cs ON o.order_date = cs.order_date
+LEFT JOIN daily_product_sketches ps ON o.order_date = ps.order_date
+LEFT JOIN {{ ref('dim_date') }} dd ON o.order_date = dd.date_actual
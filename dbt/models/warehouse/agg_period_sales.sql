@@ -0,0 +1,82 @@
+{{ config(materialized='view') }}
+
+-- Monthly, quarterly and yearly sales rolled up from agg_daily_sales, never from the facts.
+-- Additive totals are summed; distinct customers and products of a period are estimated by
+-- merging the daily HyperLogLog sketches (about 2.3% standard error, see macros/hll.sql).
+
+WITH periods AS (
+    SELECT
+        d.*,
+        grain.report_period,
+        DATE_TRUNC(grain.unit, d.order_date)::DATE AS report_date
+    FROM {{ ref('agg_daily_sales') }} d
+    CROSS JOIN (VALUES ('monthly', 'month'), ('quarterly', 'quarter'), ('yearly', 'year'))
+        AS grain(report_period, unit)
+),
+
+customer_registers AS (
+    {{ hll_merge('periods', ['report_period', 'report_date'], 'customer_hll') }}
+),
+
+product_registers AS (
+    {{ hll_merge('periods', ['report_period', 'report_date'], 'product_hll') }}
+),
+
+period_distincts AS (
+    SELECT 
+        c.report_period,
+        c.report_date,
+        c.approx_unique_customers,
+        p.approx_unique_products_sold
+    FROM (
+        SELECT report_period, report_date, {{ hll_estimate() }} AS approx_unique_customers
+        FROM customer_registers
+        GROUP BY report_period, report_date
+    ) c
+    LEFT JOIN (
+        SELECT report_period, report_date, {{ hll_estimate() }} AS approx_unique_products_sold
+        FROM product_registers
+        GROUP BY report_period, report_date
+    ) p ON c.report_period = p.report_period AND c.report_date = p.report_date
+),
+
+period_totals AS (
+    SELECT
+        report_period,
+        report_date,
+        MAX(date_key) AS date_key,
+        COUNT(*) AS days_with_orders,
+
+        -- Order metrics
+        SUM(total_orders) AS total_orders,
+
+        -- Revenue metrics
+        SUM(total_revenue) AS total_revenue,
+        SUM(subtotal_revenue) AS subtotal_revenue,
+        SUM(total_tax) AS total_tax,
+        SUM(total_shipping) AS total_shipping,
+
+        -- Product metrics
+        SUM(total_items_sold) AS total_items_sold,
+
+        SUM(credit_card_orders) AS credit_card_orders,
+        SUM(debit_card_orders) AS debit_card_orders,
+        SUM(paypal_orders) AS paypal_orders,
+        SUM(completed_orders) AS completed_orders,
+        SUM(cancelled_orders) AS cancelled_orders,
+        SUM(returned_orders) AS returned_orders,
+
+        -- Time-based patterns
+        COALESCE(SUM(total_orders) FILTER (WHERE is_weekend), 0) AS weekend_orders,
+        COALESCE(SUM(total_orders) FILTER (WHERE is_holiday), 0) AS holiday_orders
+    FROM periods
+    GROUP BY report_period, report_date
+)
+
+SELECT 
+    t.*,
+    COALESCE(d.approx_unique_customers, 0) AS approx_unique_customers,
+    COALESCE(d.approx_unique_products_sold, 0) AS approx_unique_products_sold
+FROM period_totals t
+LEFT JOIN period_distincts d 
+    ON t.report_period = d.report_period AND t.report_date = d.report_date
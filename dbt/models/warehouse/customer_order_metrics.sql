@@ -0,0 +1,45 @@
+{{ config(
+    materialized='incremental',
+    incremental_strategy='delete+insert',
+    unique_key='customer_id',
+    indexes=[
+      {'columns': ['customer_id'], 'unique': True}
+    ]
+) }}
+
+-- Persisted per-customer order aggregates. Incremental runs only recompute customers
+-- with an order placed or updated in the run window, from that customer's orders alone.
+
+WITH touched_customers AS (
+    SELECT DISTINCT o.customer_id
+    FROM {{ ref('stg_orders') }} o
+    {% if is_window_run() %}
+    WHERE {{ partition_window('o.order_date', var('order_update_lag_days')) }}
+        AND {{ incremental_window(['o.order_date', 'o.updated_at']) }}
+    {% endif %}
+),
+
+completed_orders AS (
+    SELECT 
+        o.customer_id,
+        o.order_id,
+        o.order_date,
+        o.total_amount
+    FROM {{ ref('stg_orders') }} o
+    {% if is_window_run() %}
+    INNER JOIN touched_customers t ON o.customer_id = t.customer_id
+    {% endif %}
+    WHERE o.order_status = 'completed'
+)
+
+SELECT 
+    t.customer_id,
+    COUNT(DISTINCT c.order_id) AS total_orders,
+    COALESCE(SUM(c.total_amount), 0) AS total_spent,
+    COALESCE(AVG(c.total_amount), 0) AS avg_order_value,
+    MIN(c.order_date) AS first_order_date,
+    MAX(c.order_date) AS last_order_date,
+    CURRENT_TIMESTAMP AS metrics_updated_at
+FROM touched_customers t
+LEFT JOIN completed_orders c ON t.customer_id = c.customer_id
+GROUP BY t.customer_id
@@ -1,102 +1,169 @@
+{#- History cannot be rebuilt from raw.customers, which only keeps the latest row per
+    customer, so dbt never drops this table. -#}
 {{ config(
-    materialized='table',
-    unique_key='customer_key',
+    materialized='incremental',
+    incremental_strategy='delete+insert',
+    unique_key='customer_version_key',
+    full_refresh=false,
+    on_schema_change='append_new_columns',
     indexes=[
-      {'columns': ['customer_id'], 'unique': True},
+      {'columns': ['customer_version_key'], 'unique': True},
+      {'columns': ['customer_id', 'valid_from']},
       {'columns': ['customer_segment']},
       {'columns': ['registration_date']}
+    ],
+    post_hook=[
+      "CREATE UNIQUE INDEX IF NOT EXISTS {{ this.identifier }}_is_current_idx
+       ON {{ this }} (customer_id) INCLUDE (customer_key, customer_version_key) WHERE is_current"
     ]
 ) }}
 
-WITH customer_metrics AS (
-    SELECT 
-        c.customer_id,
-        COUNT(DISTINCT o.order_id) AS total_orders,
-        COALESCE(SUM(o.total_amount), 0) AS total_spent,
-        COALESCE(AVG(o.total_amount), 0) AS avg_order_value,
-        MIN(o.order_date) AS first_order_date,
-        MAX(o.order_date) AS last_order_date,
-        CURRENT_DATE - MAX(o.order_date) AS days_since_last_order
+{#- Attributes whose change opens a new version -#}
+{%- set tracked_columns = [
+    'first_name', 'last_name', 'email', 'phone', 'address', 'city', 'state', 'zip_code',
+    'country', 'registration_date', 'customer_segment', 'birth_date', 'gender'
+] -%}
+
+{#- Versions of a customer are numbered from 1; each gets its own surrogate key from the
+    customer's key map entry and the version number -#}
+{%- set max_versions = 1000000 -%}
+
+{%- set version_columns = [
+    'customer_version_key', 'version_number', 'customer_key', 'customer_id', 'first_name', 'last_name', 'full_name', 'email', 'phone',
+    'address', 'city', 'state', 'zip_code', 'country', 'registration_date', 'customer_segment',
+    'birth_date', 'gender', 'age_group', 'age', 'days_since_registration',
+    'total_orders', 'total_spent', 'avg_order_value', 'first_order_date', 'last_order_date',
+    'value_segment', 'attribute_hash'
+] -%}
+
+WITH incoming AS (
+    SELECT
+        -- Durable surrogate key from the persistent key map, shared by every version
+        km.customer_key,
+        c.*,
+        MD5(CONCAT_WS('|'
+            {%- for column in tracked_columns %}, COALESCE(c.{{ column }}::TEXT, ''){% endfor %}
+        )) AS attribute_hash
     FROM {{ ref('stg_customers') }} c
-    LEFT JOIN {{ ref('stg_orders') }} o 
-        ON c.customer_id = o.customer_id 
-        AND o.order_status = 'completed'
-    GROUP BY c.customer_id
+    INNER JOIN {{ ref('key_map_customers') }} km ON c.customer_id = km.customer_id
+    {% if is_window_run() %}
+    -- Customers reloaded since the last build, or whose order metrics moved since then
+    WHERE c.loaded_at > (SELECT MAX(source_loaded_at) FROM {{ this }})
+        OR c.customer_id IN (
+            SELECT customer_id
+            FROM {{ ref('customer_order_metrics') }}
+            WHERE metrics_updated_at > (SELECT MAX(dbt_updated_at) FROM {{ this }})
+        )
+    {% endif %}
 ),
 
-customer_lifetime_value AS (
-    SELECT 
-        customer_id,
-        CASE 
-            WHEN total_orders = 0 THEN 0
-            WHEN days_since_last_order IS NULL THEN total_spent
-            WHEN days_since_last_order <= 90 THEN 
-                total_spent * (1 + (total_orders * 0.1))
-            ELSE total_spent * 0.8
-        END AS customer_lifetime_value
-    FROM customer_metrics
+changes AS (
+    SELECT
+        i.*,
+        {% if is_incremental() %}
+        cv.valid_from AS previous_valid_from,
+        cv.version_number AS previous_version_number,
+        cv.attribute_hash IS DISTINCT FROM i.attribute_hash AS is_changed
+        {% else %}
+        NULL::TIMESTAMP AS previous_valid_from,
+        NULL::INTEGER AS previous_version_number,
+        TRUE AS is_changed
+        {% endif %}
+    FROM incoming i
+    {% if is_incremental() %}
+    LEFT JOIN {{ this }} cv
+        ON i.customer_key = cv.customer_key
+        AND cv.is_current = TRUE
+    {% endif %}
 ),
 
-final AS (
-    SELECT 
-        -- Generate surrogate key
-        {{ dbt_utils.generate_surrogate_key(['c.customer_id']) }} AS customer_key,
-        
-        -- Customer attributes
-        c.customer_id,
-        c.first_name,
-        c.last_name,
-        c.full_name,
-        c.email,
-        c.phone,
-        c.address,
-        c.city,
-        c.state,
-        c.zip_code,
-        c.country,
-        c.registration_date,
-        c.customer_segment,
-        c.birth_date,
-        c.gender,
-        c.age_group,
-        c.age,
-        c.days_since_registration,
-        
-        -- Customer metrics
+current_versions AS (
+    -- A new current version for new or changed customers; unchanged customers keep
+    -- their current version with type 1 order metrics refreshed
+    SELECT
+        ch.customer_key::BIGINT * {{ max_versions }} + v.version_number AS customer_version_key,
+        v.version_number,
+        ch.customer_key,
+        ch.customer_id,
+        ch.first_name,
+        ch.last_name,
+        ch.full_name,
+        ch.email,
+        ch.phone,
+        ch.address,
+        ch.city,
+        ch.state,
+        ch.zip_code,
+        ch.country,
+        ch.registration_date,
+        ch.customer_segment,
+        ch.birth_date,
+        ch.gender,
+        ch.age_group,
+        ch.age,
+        ch.days_since_registration,
+
+        -- Customer metrics, maintained incrementally in customer_order_metrics;
+        -- recency-dependent fields are derived in dim_customers_current
         COALESCE(m.total_orders, 0) AS total_orders,
         COALESCE(m.total_spent, 0) AS total_spent,
         COALESCE(m.avg_order_value, 0) AS avg_order_value,
         m.first_order_date,
         m.last_order_date,
-        m.days_since_last_order,
-        COALESCE(clv.customer_lifetime_value, 0) AS customer_lifetime_value,
-        
-        -- Customer status
-        CASE 
-            WHEN m.total_orders = 0 THEN 'Prospect'
-            WHEN m.days_since_last_order <= 30 THEN 'Active'
-            WHEN m.days_since_last_order <= 90 THEN 'At Risk'
-            ELSE 'Churned'
-        END AS customer_status,
-        
-        CASE 
+
+        CASE
             WHEN m.total_spent >= 1000 THEN 'High Value'
             WHEN m.total_spent >= 500 THEN 'Medium Value'
             WHEN m.total_spent > 0 THEN 'Low Value'
             ELSE 'No Value'
         END AS value_segment,
-        
+
+        ch.attribute_hash,
+
         -- SCD Type 2 fields
-        c.loaded_at AS valid_from,
-        NULL AS valid_to,
+        CASE WHEN ch.is_changed THEN ch.loaded_at ELSE ch.previous_valid_from END AS valid_from,
+        NULL::TIMESTAMP AS valid_to,
         TRUE AS is_current,
-        
+
         -- Metadata
-        c.dbt_updated_at
-        
-    FROM {{ ref('stg_customers') }} c
-    LEFT JOIN customer_metrics m ON c.customer_id = m.customer_id
-    LEFT JOIN customer_lifetime_value clv ON c.customer_id = clv.customer_id
+        ch.loaded_at AS source_loaded_at,
+        ch.dbt_updated_at
+
+    FROM changes ch
+    CROSS JOIN LATERAL (
+        SELECT CASE
+            WHEN ch.is_changed THEN COALESCE(ch.previous_version_number, 0) + 1
+            ELSE ch.previous_version_number
+        END AS version_number
+    ) v
+    LEFT JOIN {{ ref('customer_order_metrics') }} m ON ch.customer_id = m.customer_id
 )
 
-SELECT * FROM final
\ No newline at end of file
+{% if is_incremental() %}
+,
+
+closed_versions AS (
+    -- The version each changed customer had so far, closed where the new one starts
+    SELECT
+        {% for column in version_columns -%}
+        cv.{{ column }},
+        {% endfor -%}
+        cv.valid_from,
+        ch.loaded_at AS valid_to,
+        FALSE AS is_current,
+        cv.source_loaded_at,
+        CURRENT_TIMESTAMP AS dbt_updated_at
+    FROM changes ch
+    INNER JOIN {{ this }} cv
+        ON ch.customer_key = cv.customer_key
+        AND cv.is_current = TRUE
+    WHERE ch.is_changed
+)
+
+SELECT * FROM current_versions
+UNION ALL
+SELECT * FROM closed_versions
+{% else %}
+
+SELECT * FROM current_versions
+{% endif %}
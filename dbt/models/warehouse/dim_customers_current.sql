@@ -0,0 +1,11 @@
+{{ config(
+    materialized='view'
+) }}
+
+-- Current customer rows with their recency-dependent metrics computed at query time
+
+SELECT 
+    dc.*,
+    {{ customer_recency_columns('dc.total_orders', 'dc.total_spent', 'dc.last_order_date') }}
+FROM {{ ref('dim_customers') }} dc
+WHERE dc.is_current = TRUE
@@ -0,0 +1,38 @@
+{{ config(
+    materialized='incremental',
+    incremental_strategy='delete+insert',
+    unique_key='session_date',
+    indexes=[
+      {'columns': ['session_date', 'device_type'], 'unique': True}
+    ]
+) }}
+
+-- Daily page_view -> add_to_cart -> purchase funnel by device. Incremental runs recompute
+-- the days whose sessions fact_sessions may have rebuilt, back to the start of the earliest
+-- session it re-read.
+
+SELECT 
+    session_date,
+    device_type,
+    COUNT(*) AS sessions,
+    COUNT(*) FILTER (WHERE reached_page_view) AS page_view_sessions,
+    COUNT(*) FILTER (WHERE reached_add_to_cart) AS add_to_cart_sessions,
+    COUNT(*) FILTER (WHERE reached_purchase) AS purchase_sessions,
+    
+    -- Step conversion rates
+    ROUND(COUNT(*) FILTER (WHERE reached_add_to_cart) * 100.0 
+          / NULLIF(COUNT(*) FILTER (WHERE reached_page_view), 0), 2) AS view_to_cart_rate,
+    ROUND(COUNT(*) FILTER (WHERE reached_purchase) * 100.0 
+          / NULLIF(COUNT(*) FILTER (WHERE reached_add_to_cart), 0), 2) AS cart_to_purchase_rate,
+    ROUND(COUNT(*) FILTER (WHERE reached_purchase) * 100.0 
+          / NULLIF(COUNT(*) FILTER (WHERE reached_page_view), 0), 2) AS view_to_purchase_rate,
+    
+    SUM(events) AS events,
+    ROUND(AVG(duration_seconds), 1) AS avg_session_seconds,
+    CURRENT_TIMESTAMP AS dbt_updated_at
+FROM {{ ref('fact_sessions') }}
+{% if is_window_run() %}
+WHERE session_date BETWEEN ({{ session_rebuild_start(ref('fact_sessions')) }})::DATE
+                       AND '{{ var("end_date") }}'::DATE
+{% endif %}
+GROUP BY session_date, device_type
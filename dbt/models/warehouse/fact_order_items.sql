@@ -1,20 +1,33 @@
 {{ config(
-    materialized="table",
-    unique_key="order_item_key"
+    materialized="incremental",
+    incremental_strategy="delete+insert",
+    unique_key="order_item_id",
+    on_schema_change="append_new_columns",
+    indexes=[
+      {"columns": ["order_item_key"], "unique": True},
+      {"columns": ["order_key"]}
+    ]
 ) }}
 
 WITH order_items_enriched AS (
     SELECT 
         oi.*,
+        km.order_item_key,
         fo.order_key,
         oi.product_id as product_key
     FROM {{ ref("stg_order_items") }} oi
+    INNER JOIN {{ ref("key_map_order_items") }} km 
+        ON oi.order_item_id = km.order_item_id
     LEFT JOIN {{ ref("fact_orders") }} fo 
         ON oi.order_id = fo.order_id
+    {% if is_window_run() %}
+    -- Items created in the window, plus every item of an order rebuilt in it
+    WHERE {{ incremental_window(["oi.created_at", "fo.order_date", "fo.updated_at"]) }}
+    {% endif %}
 )
 
 SELECT 
-    {{ dbt_utils.generate_surrogate_key(["order_item_id"]) }} AS order_item_key,
+    order_item_key,
     order_item_id,
     order_key,
     product_key,
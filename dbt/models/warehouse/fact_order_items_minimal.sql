@@ -6,16 +6,19 @@
 WITH order_items_enriched AS (
     SELECT 
         oi.*,
+        km.order_item_key,
         fo.order_key,
         oi.product_id as product_key  -- Temporarily use product_id directly
     FROM {{ ref('stg_order_items') }} oi
+    INNER JOIN {{ ref('key_map_order_items') }} km 
+        ON oi.order_item_id = km.order_item_id
     LEFT JOIN {{ ref('fact_orders') }} fo 
         ON oi.order_id = fo.order_id
 )
 
 SELECT 
-    -- Generate surrogate key
-    {{ dbt_utils.generate_surrogate_key(['order_item_id']) }} AS order_item_key,
+    -- Integer surrogate key from the persistent key map
+    order_item_key,
     
     -- Business keys
     order_item_id,
@@ -1,34 +1,56 @@
+{#- warehouse.fact_orders is created partitioned by month in warehouse-init.sql, so dbt must
+    never drop it: full_refresh is disabled and the full_reload var re-upserts every order instead.
+    Its primary key and indexes are created there as well; dbt only applies an indexes config
+    to relations it creates.
+    Deletes are restricted to the window's partitions, allowing for updates arriving up to
+    order_update_lag_days after the order date. -#}
 {{ config(
-    materialized='table',
-    unique_key='order_key',
-    indexes=[
-      {'columns': ['order_id'], 'unique': True},
-      {'columns': ['customer_key']},
-      {'columns': ['date_key']},
-      {'columns': ['order_date']}
-    ]
+    materialized='incremental',
+    incremental_strategy='delete+insert',
+    unique_key='order_id',
+    on_schema_change='append_new_columns',
+    full_refresh=false,
+    incremental_predicates=[] if var('full_reload') else [
+      partition_window('order_date', var('order_update_lag_days'))
+    ],
+    pre_hook="{{ ensure_window_partitions(this, var('order_update_lag_days')) }}",
+    post_hook="{{ split_default_partition(this) }}"
 ) }}
 
 WITH order_enriched AS (
     SELECT 
         o.*,
+        km.order_key,
         dc.customer_key,
+        dc.customer_version_key,
         dd.date_key
     FROM {{ ref('stg_orders') }} o
+    INNER JOIN {{ ref('key_map_orders') }} km 
+        ON o.order_id = km.order_id
+    -- The customer version valid when the order was placed; the first version also
+    -- covers orders from before the customer was first loaded
     LEFT JOIN {{ ref('dim_customers') }} dc 
         ON o.customer_id = dc.customer_id 
-        AND dc.is_current = TRUE
+        AND (dc.version_number = 1 OR COALESCE(o.created_at, o.order_date::TIMESTAMP) >= dc.valid_from)
+        AND (dc.valid_to IS NULL OR COALESCE(o.created_at, o.order_date::TIMESTAMP) < dc.valid_to)
     LEFT JOIN {{ ref('dim_date') }} dd 
         ON o.order_date = dd.date_actual
+    {% if is_window_run() %}
+    -- Only orders placed or updated within the run's date window are rebuilt; the
+    -- order_date bound lets raw.orders partitions outside the window be skipped
+    WHERE {{ partition_window('o.order_date', var('order_update_lag_days')) }}
+        AND {{ incremental_window(['o.order_date', 'o.updated_at']) }}
+    {% endif %}
 )
 
 SELECT 
-    -- Generate surrogate key
-    {{ dbt_utils.generate_surrogate_key(['order_id']) }} AS order_key,
+    -- Integer surrogate key from the persistent key map
+    order_key,
     
     -- Business keys
     order_id,
     customer_key,
+    customer_version_key,
     date_key,
     
     -- Order attributes
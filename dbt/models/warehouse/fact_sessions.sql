@@ -0,0 +1,114 @@
+{#- Sessions are rebuilt from the run window plus session_lookback_days of earlier events,
+    reaching back further to the start of any session still open at that edge, so a session that
+    started before the window and continued into it is rebuilt whole. Session ids derive from the
+    visitor and start time, so the rebuilt version replaces the earlier one; sessions that new
+    events merged into an earlier one are deleted afterwards. -#}
+{{ config(
+    materialized='incremental',
+    incremental_strategy='delete+insert',
+    unique_key='session_id',
+    on_schema_change='append_new_columns',
+    post_hook="{{ delete_superseded_sessions(this) }}",
+    indexes=[
+      {'columns': ['session_id'], 'unique': True},
+      {'columns': ['session_date']},
+      {'columns': ['visitor_key', 'session_start']},
+      {'columns': ['customer_key']}
+    ]
+) }}
+
+WITH events AS (
+    SELECT 
+        event_id,
+        visitor_key,
+        customer_id,
+        event_type,
+        event_timestamp,
+        device_type,
+        referrer,
+        page_url,
+        -- A gap longer than session_timeout_minutes since the visitor's previous event starts a session
+        CASE 
+            WHEN event_timestamp - LAG(event_timestamp) OVER visitor_events
+                 <= INTERVAL '{{ var("session_timeout_minutes") }} minutes' THEN 0
+            ELSE 1
+        END AS is_session_start
+    FROM {{ ref('stg_web_events') }}
+    {% if is_window_run() %}
+    WHERE event_timestamp >= {{ session_rebuild_start(this) }}
+        AND event_timestamp < '{{ var("end_date") }}'::DATE + 1
+    {% endif %}
+    WINDOW visitor_events AS (PARTITION BY visitor_key ORDER BY event_timestamp, event_id)
+),
+
+numbered_events AS (
+    SELECT 
+        *,
+        SUM(is_session_start) OVER (
+            PARTITION BY visitor_key ORDER BY event_timestamp, event_id
+            ROWS UNBOUNDED PRECEDING
+        ) AS session_number
+    FROM events
+),
+
+sessions AS (
+    SELECT 
+        visitor_key,
+        session_number,
+        MAX(customer_id) AS customer_id,
+        MIN(event_timestamp) AS session_start,
+        MAX(event_timestamp) AS session_end,
+        COUNT(*) AS events,
+        COUNT(*) FILTER (WHERE event_type = 'page_view') AS page_views,
+        COUNT(*) FILTER (WHERE event_type = 'add_to_cart') AS add_to_carts,
+        COUNT(*) FILTER (WHERE event_type = 'purchase') AS purchases,
+        MIN(event_timestamp) FILTER (WHERE event_type = 'page_view') AS first_page_view_at,
+        MIN(event_timestamp) FILTER (WHERE event_type = 'add_to_cart') AS first_add_to_cart_at,
+        MIN(event_timestamp) FILTER (WHERE event_type = 'purchase') AS first_purchase_at,
+        (ARRAY_AGG(device_type ORDER BY event_timestamp, event_id))[1] AS device_type,
+        (ARRAY_AGG(referrer ORDER BY event_timestamp, event_id))[1] AS landing_referrer,
+        (ARRAY_AGG(page_url ORDER BY event_timestamp, event_id))[1] AS landing_page_url
+    FROM numbered_events
+    GROUP BY visitor_key, session_number
+)
+
+SELECT 
+    MD5(s.visitor_key || '|' || s.session_start::TEXT) AS session_id,
+    s.visitor_key,
+    dc.customer_key,
+    s.session_start::DATE AS session_date,
+    s.session_start,
+    s.session_end,
+    EXTRACT(EPOCH FROM s.session_end - s.session_start)::INTEGER AS duration_seconds,
+    s.device_type,
+    s.landing_referrer,
+    s.landing_page_url,
+    
+    -- Activity
+    s.events,
+    s.page_views,
+    s.add_to_carts,
+    s.purchases,
+    
+    -- Ordered funnel: each step counts only if it follows the previous one
+    s.first_page_view_at IS NOT NULL AS reached_page_view,
+    s.first_add_to_cart_at >= s.first_page_view_at IS TRUE AS reached_add_to_cart,
+    (s.first_add_to_cart_at >= s.first_page_view_at 
+        AND s.first_purchase_at >= s.first_add_to_cart_at) IS TRUE AS reached_purchase,
+    CASE 
+        WHEN (s.first_add_to_cart_at >= s.first_page_view_at 
+              AND s.first_purchase_at >= s.first_add_to_cart_at) IS TRUE THEN 3
+        WHEN (s.first_add_to_cart_at >= s.first_page_view_at) IS TRUE THEN 2
+        WHEN s.first_page_view_at IS NOT NULL THEN 1
+        ELSE 0
+    END AS funnel_step,
+    
+    CURRENT_TIMESTAMP AS dbt_updated_at
+    
+FROM sessions s
+LEFT JOIN {{ ref('dim_customers_current') }} dc ON s.customer_id = dc.customer_id
+{% if is_window_run() %}
+-- Sessions ending before the window were complete in an earlier run; those reaching back
+-- past the re-read events may also be missing their first events
+WHERE s.session_end >= '{{ var("start_date") }}'::DATE
+{% endif %}
@@ -0,0 +1,11 @@
+{{ config(
+    materialized='incremental',
+    full_refresh=false,
+    indexes=[
+      {'columns': ['customer_id'], 'unique': True},
+      {'columns': ['customer_key'], 'unique': True}
+    ]
+) }}
+
+-- Persistent customer_id -> customer_key map; keys are only ever appended, never renumbered
+{{ assign_surrogate_keys(ref('stg_customers'), 'customer_id', 'customer_key') }}
@@ -0,0 +1,11 @@
+{{ config(
+    materialized='incremental',
+    full_refresh=false,
+    indexes=[
+      {'columns': ['order_item_id'], 'unique': True},
+      {'columns': ['order_item_key'], 'unique': True}
+    ]
+) }}
+
+-- Persistent order_item_id -> order_item_key map; keys are only ever appended, never renumbered
+{{ assign_surrogate_keys(ref('stg_order_items'), 'order_item_id', 'order_item_key') }}
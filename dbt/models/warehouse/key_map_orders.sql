@@ -0,0 +1,11 @@
+{{ config(
+    materialized='incremental',
+    full_refresh=false,
+    indexes=[
+      {'columns': ['order_id'], 'unique': True},
+      {'columns': ['order_key'], 'unique': True}
+    ]
+) }}
+
+-- Persistent order_id -> order_key map; keys are only ever appended, never renumbered
+{{ assign_surrogate_keys(ref('stg_orders'), 'order_id', 'order_key') }}
@@ -35,7 +35,7 @@ WITH customer_orders AS (
         COUNT(fo.order_id) AS frequency,
         SUM(fo.total_amount) AS monetary_value
         
-    FROM {{ ref('dim_customers') }} dc
+    FROM {{ ref('dim_customers_current') }} dc
     LEFT JOIN {{ ref('fact_orders') }} fo 
         ON dc.customer_key = fo.customer_key
         AND fo.order_status = 'completed'
@@ -7,6 +7,16 @@
     ]
 ) }}
 
+-- Daily rows come from the incrementally maintained agg_daily_sales and period rows from its
+-- agg_period_sales rollup, so a rebuild reads one row per day instead of every order and item.
+-- Distinct customers and products of a period cannot be summed from days: by default
+-- (distinct_count_mode 'approx') they are the rollup's merged HyperLogLog estimates; in
+-- 'exact' mode they are counted from the facts, one grouped scan per fact table for all grains.
+
+{% set exact_distincts = distinct_count_mode() == 'exact' %}
+-- depends_on: {{ ref('fact_orders') }}
+-- depends_on: {{ ref('fact_order_items') }}
+
 WITH daily_sales AS (
     SELECT 
         dd.date_key,
@@ -14,89 +24,139 @@ WITH daily_sales AS (
         'daily' AS report_period,
         
         -- Order metrics
-        COUNT(DISTINCT fo.order_id) AS total_orders,
-        COUNT(DISTINCT fo.customer_key) AS unique_customers,
+        COALESCE(s.total_orders, 0) AS total_orders,
+        COALESCE(s.unique_customers, 0) AS unique_customers,
         
         -- Revenue metrics
-        SUM(fo.total_amount) AS total_revenue,
-        SUM(fo.subtotal_amount) AS subtotal_revenue,
-        SUM(fo.tax_amount) AS total_tax,
-        SUM(fo.shipping_cost) AS total_shipping,
-        AVG(fo.total_amount) AS avg_order_value,
+        s.total_revenue,
+        s.subtotal_revenue,
+        s.total_tax,
+        s.total_shipping,
+        s.total_revenue / NULLIF(s.total_orders, 0) AS avg_order_value,
         
         -- Product metrics
-        SUM(foi.quantity) AS total_items_sold,
-        COUNT(DISTINCT foi.product_key) AS unique_products_sold,
+        COALESCE(s.total_items_sold, 0) AS total_items_sold,
+        COALESCE(s.unique_products_sold, 0) AS unique_products_sold,
         
         -- Payment method distribution
-        COUNT(CASE WHEN fo.payment_method = 'credit_card' THEN 1 END) AS credit_card_orders,
-        COUNT(CASE WHEN fo.payment_method = 'debit_card' THEN 1 END) AS debit_card_orders,
-        COUNT(CASE WHEN fo.payment_method = 'paypal' THEN 1 END) AS paypal_orders,
+        COALESCE(s.credit_card_orders, 0) AS credit_card_orders,
+        COALESCE(s.debit_card_orders, 0) AS debit_card_orders,
+        COALESCE(s.paypal_orders, 0) AS paypal_orders,
         
         -- Order status distribution
-        COUNT(CASE WHEN fo.order_status = 'completed' THEN 1 END) AS completed_orders,
-        COUNT(CASE WHEN fo.order_status = 'cancelled' THEN 1 END) AS cancelled_orders,
-        COUNT(CASE WHEN fo.order_status = 'returned' THEN 1 END) AS returned_orders,
+        COALESCE(s.completed_orders, 0) AS completed_orders,
+        COALESCE(s.cancelled_orders, 0) AS cancelled_orders,
+        COALESCE(s.returned_orders, 0) AS returned_orders,
         
         -- Time-based patterns
-        COUNT(CASE WHEN dd.is_weekend = TRUE THEN 1 END) AS weekend_orders,
-        COUNT(CASE WHEN dd.is_holiday = TRUE THEN 1 END) AS holiday_orders
+        CASE WHEN dd.is_weekend THEN COALESCE(s.total_orders, 0) ELSE 0 END AS weekend_orders,
+        CASE WHEN dd.is_holiday THEN COALESCE(s.total_orders, 0) ELSE 0 END AS holiday_orders
         
     FROM {{ ref('dim_date') }} dd
-    LEFT JOIN {{ ref('fact_orders') }} fo ON dd.date_key = fo.date_key
-    LEFT JOIN {{ ref('fact_order_items') }} foi ON fo.order_key = foi.order_key
+    LEFT JOIN {{ ref('agg_daily_sales') }} s ON dd.date_actual = s.order_date
     WHERE dd.date_actual >= '2022-01-01'
         AND dd.date_actual <= CURRENT_DATE
-    GROUP BY dd.date_key, dd.date_actual
 ),
 
-monthly_sales AS (
+{% if exact_distincts %}
+order_periods AS (
+    SELECT 
+        fo.order_key,
+        fo.customer_key,
+        DATE_TRUNC('month', fo.order_date)::DATE AS month_date,
+        DATE_TRUNC('quarter', fo.order_date)::DATE AS quarter_date,
+        DATE_TRUNC('year', fo.order_date)::DATE AS year_date
+    FROM {{ ref('fact_orders') }} fo
+    WHERE fo.order_date >= '2022-01-01'
+        AND fo.order_date <= CURRENT_DATE
+),
+
+period_customers AS (
+    SELECT 
+        CASE 
+            WHEN GROUPING(month_date) = 0 THEN 'monthly'
+            WHEN GROUPING(quarter_date) = 0 THEN 'quarterly'
+            ELSE 'yearly'
+        END AS report_period,
+        COALESCE(month_date, quarter_date, year_date) AS report_date,
+        COUNT(DISTINCT customer_key) AS unique_customers
+    FROM order_periods
+    GROUP BY GROUPING SETS ((month_date), (quarter_date), (year_date))
+),
+
+period_products AS (
+    SELECT 
+        CASE 
+            WHEN GROUPING(op.month_date) = 0 THEN 'monthly'
+            WHEN GROUPING(op.quarter_date) = 0 THEN 'quarterly'
+            ELSE 'yearly'
+        END AS report_period,
+        COALESCE(op.month_date, op.quarter_date, op.year_date) AS report_date,
+        COUNT(DISTINCT foi.product_key) AS unique_products_sold
+    FROM order_periods op
+    INNER JOIN {{ ref('fact_order_items') }} foi ON op.order_key = foi.order_key
+    GROUP BY GROUPING SETS ((op.month_date), (op.quarter_date), (op.year_date))
+),
+{% endif %}
+
+period_sales AS (
     SELECT 
-        MAX(dd.date_key) AS date_key,
-        DATE_TRUNC('month', dd.date_actual) AS report_date,
-        'monthly' AS report_period,
+        p.date_key,
+        p.report_date,
+        p.report_period,
         
         -- Order metrics
-        COUNT(DISTINCT fo.order_id) AS total_orders,
-        COUNT(DISTINCT fo.customer_key) AS unique_customers,
+        p.total_orders,
+        {% if exact_distincts %}
+        COALESCE(pc.unique_customers, 0) AS unique_customers,
+        {% else %}
+        p.approx_unique_customers AS unique_customers,
+        {% endif %}
         
         -- Revenue metrics
-        SUM(fo.total_amount) AS total_revenue,
-        SUM(fo.subtotal_amount) AS subtotal_revenue,
-        SUM(fo.tax_amount) AS total_tax,
-        SUM(fo.shipping_cost) AS total_shipping,
-        AVG(fo.total_amount) AS avg_order_value,
+        p.total_revenue,
+        p.subtotal_revenue,
+        p.total_tax,
+        p.total_shipping,
+        p.total_revenue / NULLIF(p.total_orders, 0) AS avg_order_value,
         
         -- Product metrics
-        SUM(foi.quantity) AS total_items_sold,
-        COUNT(DISTINCT foi.product_key) AS unique_products_sold,
+        p.total_items_sold,
+        {% if exact_distincts %}
+        COALESCE(pp.unique_products_sold, 0) AS unique_products_sold,
+        {% else %}
+        p.approx_unique_products_sold AS unique_products_sold,
+        {% endif %}
         
         -- Payment method distribution
-        COUNT(CASE WHEN fo.payment_method = 'credit_card' THEN 1 END) AS credit_card_orders,
-        COUNT(CASE WHEN fo.payment_method = 'debit_card' THEN 1 END) AS debit_card_orders,
-        COUNT(CASE WHEN fo.payment_method = 'paypal' THEN 1 END) AS paypal_orders,
+        p.credit_card_orders,
+        p.debit_card_orders,
+        p.paypal_orders,
         
         -- Order status distribution
-        COUNT(CASE WHEN fo.order_status = 'completed' THEN 1 END) AS completed_orders,
-        COUNT(CASE WHEN fo.order_status = 'cancelled' THEN 1 END) AS cancelled_orders,
-        COUNT(CASE WHEN fo.order_status = 'returned' THEN 1 END) AS returned_orders,
+        p.completed_orders,
+        p.cancelled_orders,
+        p.returned_orders,
         
         -- Time-based patterns
-        COUNT(CASE WHEN dd.is_weekend = TRUE THEN 1 END) AS weekend_orders,
-        COUNT(CASE WHEN dd.is_holiday = TRUE THEN 1 END) AS holiday_orders
+        p.weekend_orders,
+        p.holiday_orders
         
-    FROM {{ ref('dim_date') }} dd
-    LEFT JOIN {{ ref('fact_orders') }} fo ON dd.date_key = fo.date_key
-    LEFT JOIN {{ ref('fact_order_items') }} foi ON fo.order_key = foi.order_key
-    WHERE dd.date_actual >= '2022-01-01'
-        AND dd.date_actual <= CURRENT_DATE
-    GROUP BY DATE_TRUNC('month', dd.date_actual)
+    FROM {{ ref('agg_period_sales') }} p
+    {% if exact_distincts %}
+    LEFT JOIN period_customers pc 
+        ON p.report_period = pc.report_period AND p.report_date = pc.report_date
+    LEFT JOIN period_products pp 
+        ON p.report_period = pp.report_period AND p.report_date = pp.report_date
+    {% endif %}
+    WHERE p.report_date >= '2022-01-01'
+        AND p.report_date <= CURRENT_DATE
 ),
 
 combined_sales AS (
     SELECT * FROM daily_sales
     UNION ALL
-    SELECT * FROM monthly_sales
+    SELECT * FROM period_sales
 )
 
 SELECT 
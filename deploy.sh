@@ -106,7 +106,7 @@ generate_data() {
     mkdir -p data
     
     # Check if data exists
-    if [ ! -f data/customers.csv ]; then
+    if [ ! -f data/customers.csv ] && [ ! -d data/customers ]; then
         echo "📈 Generating sample e-commerce data..."
         
         # Check if data generation script exists
@@ -115,12 +115,12 @@ generate_data() {
             
             # Check if required Python packages are installed
             if python3 -c "import pandas, numpy, faker" 2>/dev/null; then
-                python3 generate_ecommerce_data.py
+                python3 generate_ecommerce_data.py --output-dir ../data
                 echo "✅ Sample data generated successfully"
             else
                 echo "📦 Installing required Python packages..."
                 pip3 install pandas numpy faker
-                python3 generate_ecommerce_data.py
+                python3 generate_ecommerce_data.py --output-dir ../data
                 echo "✅ Sample data generated successfully"
             fi
             
@@ -199,6 +199,10 @@ start_services() {
         --email admin@example.com \
         --password admin
     
+    # Pool bounding how many dbt model tasks run at once
+    echo "🧵 Creating dbt pool with ${DBT_THREADS:-4} slots..."
+    docker-compose run --rm airflow-webserver airflow pools set dbt "${DBT_THREADS:-4}" "Concurrent dbt model runs"
+    
     # Start Airflow services
     echo "🚀 Starting Airflow services..."
     docker-compose up -d airflow-webserver airflow-scheduler airflow-worker
@@ -236,6 +240,10 @@ init_dbt() {
     echo "📦 Installing dbt packages..."
     docker-compose exec -T airflow-webserver bash -c "cd /opt/airflow/dbt && dbt deps" || true
     
+    # Write target/manifest.json, from which the DAG renders one task per model
+    echo "🗺️ Parsing dbt project..."
+    docker-compose exec -T airflow-webserver bash -c "cd /opt/airflow/dbt && dbt parse" || echo "⚠️  dbt parse failed, the DAG will run dbt by layer"
+    
     # Run initial dbt setup
     echo "🔧 Running initial dbt models..."
     docker-compose exec -T airflow-webserver bash -c "cd /opt/airflow/dbt && dbt run --models staging" || echo "⚠️  Staging models failed, continuing..."
@@ -253,9 +261,9 @@ load_sample_data() {
     echo "📋 Copying data files to Airflow container..."
     docker-compose exec -T airflow-webserver mkdir -p /opt/airflow/data
     
-    # Copy each data file
-    for file in data/*.csv; do
-        if [ -f "$file" ]; then
+    # Copy each data file (or directory of shard part files)
+    for file in data/*; do
+        if [ -e "$file" ]; then
             filename=$(basename "$file")
             docker cp "$file" $(docker-compose ps -q airflow-webserver):/opt/airflow/data/
             echo "  ✅ Copied $filename"
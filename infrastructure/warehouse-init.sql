@@ -3,6 +3,109 @@ CREATE SCHEMA IF NOT EXISTS raw;
 CREATE SCHEMA IF NOT EXISTS staging;
 CREATE SCHEMA IF NOT EXISTS warehouse;
 CREATE SCHEMA IF NOT EXISTS marts;
+CREATE SCHEMA IF NOT EXISTS archive;
+CREATE SCHEMA IF NOT EXISTS monitoring;
+
+-- Monthly range partitioning helpers. Partitions are named <table>_pYYYYMM and
+-- every partitioned table has a <table>_default partition catching anything else.
+CREATE OR REPLACE FUNCTION public.create_monthly_partition(parent_table TEXT, partition_month DATE)
+RETURNS TEXT AS $$
+DECLARE
+    schema_name TEXT := split_part(parent_table, '.', 1);
+    table_name TEXT := split_part(parent_table, '.', 2);
+    partition_name TEXT := table_name || '_p' || to_char(partition_month, 'YYYYMM');
+    key_column TEXT := substring(pg_get_partkeydef(parent_table::regclass) FROM 'RANGE \((.*)\)');
+    month_start DATE := date_trunc('month', partition_month)::DATE;
+    month_end DATE := (date_trunc('month', partition_month) + INTERVAL '1 month')::DATE;
+BEGIN
+    IF to_regclass(format('%I.%I', schema_name, partition_name)) IS NOT NULL THEN
+        RETURN NULL;
+    END IF;
+
+    EXECUTE format('CREATE TABLE %I.%I (LIKE %s INCLUDING DEFAULTS)', schema_name, partition_name, parent_table);
+
+    -- Rows that landed in the default partition before this month existed move across
+    IF to_regclass(format('%I.%I', schema_name, table_name || '_default')) IS NOT NULL THEN
+        EXECUTE format(
+            'WITH moved AS (DELETE FROM %I.%I WHERE %s >= %L AND %s < %L RETURNING *) '
+            'INSERT INTO %I.%I SELECT * FROM moved',
+            schema_name, table_name || '_default', key_column, month_start, key_column, month_end,
+            schema_name, partition_name
+        );
+    END IF;
+
+    EXECUTE format(
+        'ALTER TABLE %s ATTACH PARTITION %I.%I FOR VALUES FROM (%L) TO (%L)',
+        parent_table, schema_name, partition_name, month_start, month_end
+    );
+    RETURN partition_name;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Create any missing monthly partitions between two dates; returns how many were created
+CREATE OR REPLACE FUNCTION public.ensure_monthly_partitions(parent_table TEXT, from_date DATE, through_date DATE)
+RETURNS INTEGER AS $$
+DECLARE
+    current_month DATE := date_trunc('month', from_date)::DATE;
+    created INTEGER := 0;
+BEGIN
+    WHILE current_month <= through_date LOOP
+        IF public.create_monthly_partition(parent_table, current_month) IS NOT NULL THEN
+            created := created + 1;
+        END IF;
+        current_month := (current_month + INTERVAL '1 month')::DATE;
+    END LOOP;
+    RETURN created;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Give every month found in the default partition its own partition; returns how many were created
+CREATE OR REPLACE FUNCTION public.split_default_partition(parent_table TEXT)
+RETURNS INTEGER AS $$
+DECLARE
+    key_column TEXT := substring(pg_get_partkeydef(parent_table::regclass) FROM 'RANGE \((.*)\)');
+    default_month DATE;
+    created INTEGER := 0;
+BEGIN
+    FOR default_month IN EXECUTE format(
+        'SELECT DISTINCT date_trunc(''month'', %s)::DATE FROM %s_default WHERE %s IS NOT NULL',
+        key_column, parent_table, key_column
+    ) LOOP
+        IF public.create_monthly_partition(parent_table, default_month) IS NOT NULL THEN
+            created := created + 1;
+        END IF;
+    END LOOP;
+    RETURN created;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Detach monthly partitions that end on or before cutoff and move them to archive_schema,
+-- where they can be dumped or dropped without touching the live table
+CREATE OR REPLACE FUNCTION public.detach_partitions_before(parent_table TEXT, cutoff DATE,
+                                                           archive_schema TEXT DEFAULT 'archive')
+RETURNS INTEGER AS $$
+DECLARE
+    schema_name TEXT := split_part(parent_table, '.', 1);
+    partition_name TEXT;
+    detached INTEGER := 0;
+BEGIN
+    FOR partition_name IN
+        SELECT c.relname
+        FROM pg_inherits i
+        JOIN pg_class c ON c.oid = i.inhrelid
+        WHERE i.inhparent = parent_table::regclass
+          AND c.relname ~ '_p[0-9]{6}$'
+        ORDER BY c.relname
+    LOOP
+        IF (to_date(right(partition_name, 6), 'YYYYMM') + INTERVAL '1 month')::DATE <= cutoff THEN
+            EXECUTE format('ALTER TABLE %s DETACH PARTITION %I.%I', parent_table, schema_name, partition_name);
+            EXECUTE format('ALTER TABLE %I.%I SET SCHEMA %I', schema_name, partition_name, archive_schema);
+            detached := detached + 1;
+        END IF;
+    END LOOP;
+    RETURN detached;
+END;
+$$ LANGUAGE plpgsql;
 
 -- Raw tables (landing zone)
 CREATE TABLE IF NOT EXISTS raw.customers (
@@ -56,7 +159,9 @@ CREATE TABLE IF NOT EXISTS raw.orders (
     updated_at TIMESTAMP,
     loaded_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
     file_name VARCHAR(255)
-);
+) PARTITION BY RANGE (order_date);
+
+CREATE TABLE IF NOT EXISTS raw.orders_default PARTITION OF raw.orders DEFAULT;
 
 CREATE TABLE IF NOT EXISTS raw.order_items (
     order_item_id INTEGER,
@@ -88,8 +193,72 @@ CREATE TABLE IF NOT EXISTS raw.web_events (
     city VARCHAR(100),
     loaded_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
     file_name VARCHAR(255)
+) PARTITION BY RANGE (event_timestamp);
+
+CREATE TABLE IF NOT EXISTS raw.web_events_default PARTITION OF raw.web_events DEFAULT;
+
+-- High-water marks for incremental raw loads
+CREATE TABLE IF NOT EXISTS raw.load_watermarks (
+    table_name VARCHAR(100) PRIMARY KEY,
+    watermark_column VARCHAR(100),
+    high_water_mark TIMESTAMP,
+    rows_loaded BIGINT,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+-- Size, mtime and SHA-256 of every loaded source file (see ecommerce_etl.manifest);
+-- loaded_through is the exclusive date bound of an incremental load, NULL when every
+-- row was loaded
+CREATE TABLE IF NOT EXISTS raw.load_manifest (
+    table_name VARCHAR(100),
+    file_path TEXT,
+    file_size BIGINT,
+    file_mtime_ns BIGINT,
+    content_hash CHAR(64),
+    loaded_through DATE,
+    loaded_at TIMESTAMP,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (table_name, file_path)
 );
 
+-- Outcome of every raw data quality check run (see ecommerce_etl.quality); checked_through
+-- is the newest loaded_at a check covered, where the next incremental check resumes
+CREATE TABLE IF NOT EXISTS monitoring.data_quality_results (
+    result_id BIGSERIAL PRIMARY KEY,
+    run_id VARCHAR(250),
+    check_name VARCHAR(100),
+    table_name VARCHAR(100),
+    scope VARCHAR(20),
+    rows_checked BIGINT,
+    failed_rows BIGINT,
+    passed BOOLEAN,
+    seconds NUMERIC(12,3),
+    checked_through TIMESTAMP,
+    checked_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE INDEX IF NOT EXISTS idx_data_quality_results_table ON monitoring.data_quality_results(table_name, checked_at);
+
+-- Wall time, throughput, memory and database round trips of every pipeline stage
+-- (see ecommerce_etl.instrumentation)
+CREATE TABLE IF NOT EXISTS monitoring.pipeline_stage_metrics (
+    metric_id BIGSERIAL PRIMARY KEY,
+    run_id VARCHAR(250),
+    stage VARCHAR(50),
+    table_name VARCHAR(100),
+    status VARCHAR(20),
+    started_at TIMESTAMP,
+    seconds NUMERIC(12,3),
+    rows BIGINT,
+    bytes BIGINT,
+    rows_per_sec NUMERIC(14,1),
+    peak_rss_mb NUMERIC(10,1),
+    round_trips INTEGER,
+    recorded_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE INDEX IF NOT EXISTS idx_pipeline_stage_metrics_stage ON monitoring.pipeline_stage_metrics(stage, table_name, started_at);
+
 -- Staging tables (cleaned and validated)
 CREATE TABLE IF NOT EXISTS staging.customers (
     customer_id INTEGER PRIMARY KEY,
@@ -131,31 +300,7 @@ CREATE TABLE IF NOT EXISTS staging.products (
 );
 
 -- Warehouse dimension tables
-CREATE TABLE IF NOT EXISTS warehouse.dim_customers (
-    customer_key SERIAL PRIMARY KEY,
-    customer_id INTEGER UNIQUE,
-    first_name VARCHAR(100),
-    last_name VARCHAR(100),
-    full_name VARCHAR(200),
-    email VARCHAR(255),
-    phone VARCHAR(50),
-    address TEXT,
-    city VARCHAR(100),
-    state VARCHAR(10),
-    zip_code VARCHAR(20),
-    country VARCHAR(50),
-    registration_date DATE,
-    customer_segment VARCHAR(50),
-    birth_date DATE,
-    gender VARCHAR(10),
-    age_group VARCHAR(20),
-    customer_lifetime_value DECIMAL(12,2),
-    total_orders INTEGER,
-    valid_from TIMESTAMP,
-    valid_to TIMESTAMP,
-    is_current BOOLEAN DEFAULT TRUE,
-    dbt_updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-);
+-- warehouse.dim_customers (SCD Type 2) is created and versioned incrementally by dbt
 
 CREATE TABLE IF NOT EXISTS warehouse.dim_products (
     product_key SERIAL PRIMARY KEY,
@@ -192,40 +337,39 @@ CREATE TABLE IF NOT EXISTS warehouse.dim_date (
     is_holiday BOOLEAN
 );
 
--- Warehouse fact table
+-- Warehouse fact table, partitioned by month of order_date. Columns match the
+-- fact_orders dbt model, which upserts into this table rather than recreating it.
 CREATE TABLE IF NOT EXISTS warehouse.fact_orders (
-    order_key SERIAL PRIMARY KEY,
+    order_key INTEGER NOT NULL,
     order_id INTEGER,
     customer_key INTEGER,
+    customer_version_key BIGINT,
     date_key INTEGER,
-    order_date DATE,
+    order_date DATE NOT NULL,
     order_status VARCHAR(50),
     payment_method VARCHAR(50),
     shipping_method VARCHAR(50),
+    order_value_tier TEXT,
+    day_of_week DOUBLE PRECISION,
+    hour_of_day DOUBLE PRECISION,
+    day_type TEXT,
+    month_period TEXT,
     shipping_cost DECIMAL(10,2),
     tax_amount DECIMAL(10,2),
     subtotal_amount DECIMAL(10,2),
     total_amount DECIMAL(10,2),
     currency VARCHAR(10),
+    tax_rate_percent NUMERIC,
+    shipping_rate_percent NUMERIC,
     created_at TIMESTAMP,
     updated_at TIMESTAMP,
-    FOREIGN KEY (customer_key) REFERENCES warehouse.dim_customers(customer_key),
-    FOREIGN KEY (date_key) REFERENCES warehouse.dim_date(date_key)
-);
+    dbt_updated_at TIMESTAMP WITH TIME ZONE,
+    PRIMARY KEY (order_key, order_date)
+) PARTITION BY RANGE (order_date);
 
-CREATE TABLE IF NOT EXISTS warehouse.fact_order_items (
-    order_item_key SERIAL PRIMARY KEY,
-    order_item_id INTEGER,
-    order_key INTEGER,
-    product_key INTEGER,
-    quantity INTEGER,
-    unit_price DECIMAL(10,2),
-    line_total DECIMAL(10,2),
-    discount_amount DECIMAL(10,2),
-    created_at TIMESTAMP,
-    FOREIGN KEY (order_key) REFERENCES warehouse.fact_orders(order_key),
-    FOREIGN KEY (product_key) REFERENCES warehouse.dim_products(product_key)
-);
+CREATE TABLE IF NOT EXISTS warehouse.fact_orders_default PARTITION OF warehouse.fact_orders DEFAULT;
+
+-- warehouse.fact_order_items is created and maintained incrementally by dbt
 
 -- Mart tables (business-ready aggregations)
 CREATE TABLE IF NOT EXISTS marts.customer_summary (
@@ -259,16 +403,41 @@ CREATE TABLE IF NOT EXISTS marts.product_performance (
 
 -- Indexes for performance
 CREATE INDEX IF NOT EXISTS idx_raw_customers_loaded_at ON raw.customers(loaded_at);
-CREATE INDEX IF NOT EXISTS idx_raw_orders_order_date ON raw.orders(order_date);
 CREATE INDEX IF NOT EXISTS idx_raw_order_items_order_id ON raw.order_items(order_id);
-CREATE INDEX IF NOT EXISTS idx_raw_web_events_timestamp ON raw.web_events(event_timestamp);
+CREATE INDEX IF NOT EXISTS idx_raw_customers_customer_id ON raw.customers(customer_id);
+CREATE INDEX IF NOT EXISTS idx_raw_products_product_id ON raw.products(product_id);
+CREATE INDEX IF NOT EXISTS idx_raw_orders_order_id ON raw.orders(order_id);
+CREATE INDEX IF NOT EXISTS idx_raw_orders_customer_id ON raw.orders(customer_id);
+CREATE INDEX IF NOT EXISTS idx_raw_order_items_order_item_id ON raw.order_items(order_item_id);
+CREATE INDEX IF NOT EXISTS idx_raw_web_events_event_id ON raw.web_events(event_id);
 CREATE INDEX IF NOT EXISTS idx_fact_orders_customer_key ON warehouse.fact_orders(customer_key);
+CREATE INDEX IF NOT EXISTS idx_fact_orders_customer_version_key ON warehouse.fact_orders(customer_version_key);
 CREATE INDEX IF NOT EXISTS idx_fact_orders_date_key ON warehouse.fact_orders(date_key);
-CREATE INDEX IF NOT EXISTS idx_fact_order_items_product_key ON warehouse.fact_order_items(product_key);
+CREATE INDEX IF NOT EXISTS idx_fact_orders_order_id ON warehouse.fact_orders(order_id);
+
+-- BRIN indexes on the time columns of append-mostly partitioned tables; a few pages per
+-- partition instead of a B-tree per row
+CREATE INDEX IF NOT EXISTS brin_raw_orders_order_date ON raw.orders USING BRIN (order_date);
+CREATE INDEX IF NOT EXISTS brin_raw_orders_updated_at ON raw.orders USING BRIN (updated_at);
+CREATE INDEX IF NOT EXISTS brin_raw_web_events_timestamp ON raw.web_events USING BRIN (event_timestamp);
+-- Incremental quality checks read rows by load time, which follows physical order
+CREATE INDEX IF NOT EXISTS brin_raw_products_loaded_at ON raw.products USING BRIN (loaded_at);
+CREATE INDEX IF NOT EXISTS brin_raw_orders_loaded_at ON raw.orders USING BRIN (loaded_at);
+CREATE INDEX IF NOT EXISTS brin_raw_order_items_loaded_at ON raw.order_items USING BRIN (loaded_at);
+CREATE INDEX IF NOT EXISTS brin_fact_orders_order_date ON warehouse.fact_orders USING BRIN (order_date);
+
+-- Monthly partitions for the generated history and the months ahead; loaders and
+-- the fact_orders model create later months as they need them
+SELECT public.ensure_monthly_partitions('raw.orders', '2022-01-01', CURRENT_DATE + 90);
+SELECT public.ensure_monthly_partitions('raw.web_events', '2022-01-01', CURRENT_DATE + 90);
+SELECT public.ensure_monthly_partitions('warehouse.fact_orders', '2022-01-01', CURRENT_DATE + 90);
 
 -- Grant permissions
 GRANT ALL PRIVILEGES ON ALL TABLES IN SCHEMA raw TO warehouse;
 GRANT ALL PRIVILEGES ON ALL TABLES IN SCHEMA staging TO warehouse;
 GRANT ALL PRIVILEGES ON ALL TABLES IN SCHEMA warehouse TO warehouse;
 GRANT ALL PRIVILEGES ON ALL TABLES IN SCHEMA marts TO warehouse;
+GRANT ALL PRIVILEGES ON SCHEMA archive TO warehouse;
+GRANT ALL PRIVILEGES ON ALL TABLES IN SCHEMA monitoring TO warehouse;
+GRANT USAGE ON ALL SEQUENCES IN SCHEMA monitoring TO warehouse;
 GRANT USAGE ON ALL SEQUENCES IN SCHEMA warehouse TO warehouse;
\ No newline at end of file
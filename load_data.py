@@ -2,82 +2,68 @@
 """
 Data loading script for e-commerce analytics pipeline
 """
-import pandas as pd
 import psycopg2
-from datetime import datetime
 import os
+import sys
+from datetime import datetime
 
-def load_csv_to_postgres(table_name, file_path):
-    """Load CSV data into PostgreSQL raw tables"""
-    print(f"Loading {table_name} from {file_path}...")
-    
-    # Read CSV file
-    df = pd.read_csv(file_path)
-    
-    # Add metadata columns
-    df['loaded_at'] = datetime.now()
-    df['file_name'] = os.path.basename(file_path)
-    
-    # Get PostgreSQL connection
-    conn = psycopg2.connect(
-        host='warehouse',
-        database='ecommerce_dw', 
-        user='warehouse',
-        password='warehouse'
-    )
-    
-    cursor = conn.cursor()
-    
-    # Truncate table
-    cursor.execute(f'TRUNCATE TABLE raw.{table_name}')
-    
-    # Insert data in chunks
-    chunk_size = 10000
-    total_rows = 0
-    
-    for i in range(0, len(df), chunk_size):
-        chunk = df.iloc[i:i+chunk_size]
-        
-        # Convert to list of tuples
-        data = [tuple(x) for x in chunk.values]
-        
-        # Create placeholders
-        placeholders = ', '.join(['%s'] * len(chunk.columns))
-        columns = ', '.join(chunk.columns)
-        
-        # Insert data
-        cursor.executemany(
-            f'INSERT INTO raw.{table_name} ({columns}) VALUES ({placeholders})',
-            data
-        )
-        
-        total_rows += len(chunk)
-        print(f"  Inserted {total_rows}/{len(df)} rows...")
-    
-    conn.commit()
-    cursor.close()
-    conn.close()
-    
-    print(f"✅ Loaded {len(df)} rows into raw.{table_name}")
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'airflow', 'plugins'))
+
+from ecommerce_etl.instrumentation import CountingCursor, measure_stage, publish_metrics, stats_metrics
+from ecommerce_etl.parallel_load import DEFAULT_WORKERS, load_tables_parallel
+from ecommerce_etl.sources import source_files
+
+WAREHOUSE_CONN = {
+    'host': 'warehouse',
+    'database': 'ecommerce_dw',
+    'user': 'warehouse',
+    'password': 'warehouse',
+    'cursor_factory': CountingCursor
+}
 
 def main():
     """Main function to load all data"""
     print("🚀 Starting data loading process...")
     
-    # Load all tables
+    # Load all tables (LOAD_MODE=incremental upserts past the stored watermarks)
     tables = ['customers', 'products', 'orders', 'order_items']
+    mode = os.environ.get('LOAD_MODE', 'full')
+    workers = int(os.environ.get('LOAD_WORKERS', DEFAULT_WORKERS))
+    
+    # Files unchanged since their last load are skipped (LOAD_SKIP_UNCHANGED=false reloads them)
+    skip_unchanged = os.environ.get('LOAD_SKIP_UNCHANGED', 'true').lower() == 'true'
     
+    files = {}
     for table in tables:
-        file_path = f'/opt/airflow/data/{table}.csv'
+        # <table>.csv, the CSV parts of a sharded run or month-partitioned Parquet
+        file_paths = source_files('/opt/airflow/data', table)
         
-        if not os.path.exists(file_path):
-            print(f"❌ File not found: {file_path}")
+        if not file_paths:
+            print(f"❌ No data files found for {table} in /opt/airflow/data")
             continue
-            
+        files[table] = file_paths
+    
+    # Tables and byte ranges of large files load concurrently over one connection pool
+    print(f"Loading {len(files)} tables with {workers} workers...")
+    run_id = f"load_data_{datetime.now():%Y%m%dT%H%M%S}"
+    try:
+        with measure_stage(WAREHOUSE_CONN, run_id, 'load') as timer:
+            results = load_tables_parallel(WAREHOUSE_CONN, files, workers=workers, mode=mode,
+                                           skip_unchanged=skip_unchanged)
+            timer.add(rows=sum(s['rows'] for s in results), bytes=sum(s['bytes'] for s in results))
+        for stats in results:
+            print(f"✅ Loaded {stats['rows']} rows into raw.{stats['table']} "
+                  f"in {stats['seconds']}s ({stats['rows_per_sec']} rows/sec, "
+                  f"{stats['rows_rejected']} rejected, {stats['files_skipped']} unchanged files skipped)")
+        
+        # Per-table metrics alongside the overall load stage
+        conn = psycopg2.connect(**WAREHOUSE_CONN)
         try:
-            load_csv_to_postgres(table, file_path)
-        except Exception as e:
-            print(f"❌ Error loading {table}: {e}")
+            publish_metrics(conn, run_id, [stats_metrics('load', s, timer.metrics['started_at']) for s in results])
+        finally:
+            conn.close()
+    except Exception as e:
+        print(f"❌ Error loading data: {e}")
     
     print("🎉 Data loading completed!")
 
@@ -0,0 +1,10 @@
+"""
+Put the shared loading package and the data generator on sys.path, as the DAG and scripts do
+"""
+import os
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+for path in ('airflow/plugins', 'data-generation'):
+    sys.path.insert(0, os.path.join(ROOT, path))
@@ -0,0 +1,36 @@
+from datetime import date, datetime, timedelta
+
+from ecommerce_etl.partitions import FUTURE_PARTITION_DAYS, ensure_future_partitions
+
+
+class RecordingCursor:
+    """Cursor stand-in that keeps the parameters of the last statement"""
+
+    def execute(self, sql, params=None):
+        self.sql, self.params = sql, params
+
+    def fetchone(self):
+        return (0,)
+
+
+def test_datetime_upper_bound_is_passed_as_date():
+    cursor = RecordingCursor()
+    ensure_future_partitions(cursor, 'orders', datetime(2024, 3, 15, 12, 30))
+
+    table, start, end = cursor.params
+    assert table == 'raw.orders'
+    assert type(start) is date and type(end) is date
+    assert end == date(2024, 3, 15) + timedelta(days=FUTURE_PARTITION_DAYS)
+
+
+def test_date_upper_bound_is_unchanged():
+    cursor = RecordingCursor()
+    ensure_future_partitions(cursor, 'web_events', date(2024, 3, 15))
+
+    assert cursor.params[2] == date(2024, 3, 15) + timedelta(days=FUTURE_PARTITION_DAYS)
+
+
+def test_unpartitioned_table_is_skipped():
+    cursor = RecordingCursor()
+    assert ensure_future_partitions(cursor, 'customers', datetime(2024, 3, 15)) == 0
+    assert not hasattr(cursor, 'params')
@@ -0,0 +1,28 @@
+import numpy as np
+from faker import Faker
+
+from value_factory import ValueFactory
+
+
+def make_factory(pool_size=1000):
+    Faker.seed(42)
+    np.random.seed(42)
+    return ValueFactory(Faker(), pool_size=pool_size)
+
+
+def test_emails_are_unique_beyond_the_pool_sizes():
+    ids = np.arange(1, 50001)
+    emails = make_factory().emails(ids)
+
+    assert len(emails) == len(ids)
+    # 1000 user names and a handful of domains alone give at most a few thousand addresses
+    assert len(set(emails)) / len(emails) == 1.0
+
+
+def test_emails_look_like_addresses():
+    emails = make_factory(pool_size=100).emails(np.arange(10, 20))
+
+    for customer_id, email in zip(range(10, 20), emails):
+        local, domain = email.split('@')
+        assert local.rsplit('.', 1)[1] == str(customer_id)
+        assert '.' in domain